@@ -9,15 +9,131 @@ extending subscription periods, and generating reports.
 import discord
 from discord.ext import commands
 import logging
-from datetime import datetime, timedelta
-import io
-import csv
+from datetime import datetime
+import tempfile
+import time
 
 import config
 import database
+import storage
+import export
+import utils
+from cache import LRUCache, MISSING
 
 logger = logging.getLogger("tainment_bot.admin_subscription")
 
+class SubscriberBrowser(discord.ui.View):
+    """Paginated subscriber list that fetches each page only when it is shown."""
+    
+    def __init__(self, author_id, tier=None, page_size=10):
+        super().__init__(timeout=120)  # 2 minute timeout
+        self.author_id = author_id
+        self.tier = tier
+        self.page_size = page_size
+        self.page = 0
+        self.message = None
+        
+        # Recently shown pages ({page: (rows, has_next)}) and every visited page's first/last key
+        self._pages = LRUCache(max_entries=5)
+        self._bounds = {}
+    
+    async def load_page(self, page):
+        """
+        Get a page of subscribers, from the cache or with one keyset query.
+        
+        Returns:
+            tuple: (list, bool) - The page's subscribers and whether a next page exists
+        """
+        cached = self._pages.get(page)
+        if cached is not MISSING:
+            return cached
+        
+        if page == 0:
+            rows, has_next = await storage.backend.get_subscribers_page(self.tier, limit=self.page_size)
+        elif page - 1 in self._bounds:
+            rows, has_next = await storage.backend.get_subscribers_page(
+                self.tier, after=self._bounds[page - 1][1], limit=self.page_size
+            )
+        else:
+            # Walking back to a page that fell out of the cache
+            rows, _ = await storage.backend.get_subscribers_page(
+                self.tier, before=self._bounds[page + 1][0], limit=self.page_size
+            )
+            has_next = True
+        
+        if rows:
+            self._bounds[page] = (
+                (rows[0]["start_date"], rows[0]["id"]),
+                (rows[-1]["start_date"], rows[-1]["id"])
+            )
+        
+        self._pages.set(page, (rows, has_next))
+        return rows, has_next
+    
+    def build_embed(self, rows):
+        """Create the embed for a page of subscribers."""
+        embed = discord.Embed(
+            title=f"Subscribers{f' - {self.tier} Tier' if self.tier else ''}",
+            description=f"Page {self.page + 1}",
+            color=discord.Color.blue()
+        )
+        
+        now = database.now_epoch()
+        for sub in rows:
+            # Format expiration date
+            if sub["end_date"]:
+                expiry_text = utils.format_timestamp(sub["end_date"], "%Y-%m-%d")
+                
+                # Check if expired
+                if sub["end_date"] < now:
+                    expiry_text += " (EXPIRED)"
+            else:
+                expiry_text = "Never"
+            
+            embed.add_field(
+                name=f"{sub['username']} ({sub['user_id']})",
+                value=f"Tier: **{sub['tier']}**\nExpires: **{expiry_text}**\nActive: **{'Yes' if sub['active'] else 'No'}**",
+                inline=False
+            )
+        
+        return embed
+    
+    async def show_page(self, interaction, page):
+        """Switch to a page and update the message."""
+        rows, has_next = await self.load_page(page)
+        self.page = page
+        
+        self.previous_button.disabled = page == 0
+        self.next_button.disabled = not has_next
+        
+        await interaction.response.edit_message(embed=self.build_embed(rows), view=self)
+    
+    @discord.ui.button(label="Previous", style=discord.ButtonStyle.secondary, disabled=True)
+    async def previous_button(self, interaction: discord.Interaction, button: discord.ui.Button):
+        """Handle the previous page button."""
+        if interaction.user.id != self.author_id:
+            await interaction.response.send_message("This list is not for you.", ephemeral=True)
+            return
+        
+        await self.show_page(interaction, max(0, self.page - 1))
+    
+    @discord.ui.button(label="Next", style=discord.ButtonStyle.primary)
+    async def next_button(self, interaction: discord.Interaction, button: discord.ui.Button):
+        """Handle the next page button."""
+        if interaction.user.id != self.author_id:
+            await interaction.response.send_message("This list is not for you.", ephemeral=True)
+            return
+        
+        await self.show_page(interaction, self.page + 1)
+    
+    async def on_timeout(self):
+        """Disable navigation when the view times out."""
+        if self.message:
+            try:
+                await self.message.edit(view=None)
+            except Exception:
+                pass
+
 class AdminSubscription(commands.Cog):
     """Admin commands for subscription management."""
     
@@ -42,128 +158,79 @@ class AdminSubscription(commands.Cog):
             return
         
         tier_filter = tier.capitalize() if tier else None
-        subscribers = await database.get_all_subscribers(tier=tier_filter)
+        browser = SubscriberBrowser(ctx.author.id, tier=tier_filter)
         
-        if not subscribers:
+        # Only the first page is fetched up front
+        rows, has_next = await browser.load_page(0)
+        
+        if not rows:
             await ctx.send("No subscribers found." if not tier else f"No subscribers found for tier: {tier_filter}")
             return
         
-        # Create paginated embeds for the subscriber list
-        embeds = []
-        subscribers_per_page = 10
-        
-        for i in range(0, len(subscribers), subscribers_per_page):
-            page_subscribers = subscribers[i:i+subscribers_per_page]
-            
-            embed = discord.Embed(
-                title=f"Subscribers{f' - {tier_filter} Tier' if tier_filter else ''}",
-                description=f"Page {i//subscribers_per_page + 1}/{(len(subscribers)-1)//subscribers_per_page + 1}",
-                color=discord.Color.blue()
-            )
-            
-            for sub in page_subscribers:
-                # Format expiration date
-                if sub["end_date"]:
-                    end_date = datetime.fromisoformat(sub["end_date"])
-                    expiry_text = end_date.strftime("%Y-%m-%d")
-                    
-                    # Check if expired
-                    if end_date < datetime.now():
-                        expiry_text += " (EXPIRED)"
-                else:
-                    expiry_text = "Never"
-                
-                embed.add_field(
-                    name=f"{sub['username']} ({sub['user_id']})",
-                    value=f"Tier: **{sub['tier']}**\nExpires: **{expiry_text}**\nActive: **{'Yes' if sub['active'] else 'No'}**",
-                    inline=False
-                )
-            
-            embeds.append(embed)
-        
-        # Send the first embed
-        message = await ctx.send(embed=embeds[0])
-        
         # If there's only one page, we're done
-        if len(embeds) == 1:
+        if not has_next:
+            await ctx.send(embed=browser.build_embed(rows))
             return
         
-        # Add navigation reactions
-        await message.add_reaction("⬅️")
-        await message.add_reaction("➡️")
-        
-        def check(reaction, user):
-            return user == ctx.author and str(reaction.emoji) in ["⬅️", "➡️"] and reaction.message.id == message.id
-        
-        current_page = 0
-        
-        # Wait for reactions and change pages accordingly
-        while True:
-            try:
-                reaction, user = await self.bot.wait_for('reaction_add', timeout=60.0, check=check)
-                
-                if str(reaction.emoji) == "➡️" and current_page < len(embeds) - 1:
-                    current_page += 1
-                    await message.edit(embed=embeds[current_page])
-                elif str(reaction.emoji) == "⬅️" and current_page > 0:
-                    current_page -= 1
-                    await message.edit(embed=embeds[current_page])
-                
-                # Remove the user's reaction
-                await message.remove_reaction(reaction.emoji, user)
-            
-            except Exception:
-                break
+        browser.message = await ctx.send(embed=browser.build_embed(rows), view=browser)
     
     @commands.command(name="export_subscribers")
-    async def export_subscribers(self, ctx, tier=None):
+    async def export_subscribers(self, ctx, tier=None, export_format="csv"):
         """
-        Export subscribers to a CSV file.
+        Export subscribers to a compressed CSV or NDJSON file.
         
-        Usage: !export_subscribers [tier]
+        Usage: !export_subscribers [tier|all] [csv|ndjson]
         """
+        if tier and tier.lower() == "all":
+            tier = None
+        
         if tier and tier.capitalize() not in config.SUBSCRIPTION_TIERS:
             await ctx.send(f"Invalid tier. Available tiers: {', '.join(config.SUBSCRIPTION_TIERS.keys())}")
             return
         
+        export_format = export_format.lower()
+        if export_format not in export.EXPORT_FORMATS:
+            await ctx.send(f"Invalid format. Available formats: {', '.join(export.EXPORT_FORMATS.keys())}")
+            return
+        
         tier_filter = tier.capitalize() if tier else None
-        subscribers = await database.get_all_subscribers(tier=tier_filter)
+        total = await storage.backend.count_subscribers(tier=tier_filter)
         
-        if not subscribers:
+        if not total:
             await ctx.send("No subscribers found." if not tier else f"No subscribers found for tier: {tier_filter}")
             return
         
-        # Create CSV file in memory
-        output = io.StringIO()
-        writer = csv.writer(output)
-        
-        # Write header
-        writer.writerow([
-            "User ID", "Username", "Tier", "Start Date", "End Date", 
-            "Active", "Transaction ID", "Payment Method"
-        ])
-        
-        # Write data
-        for sub in subscribers:
-            writer.writerow([
-                sub["user_id"],
-                sub["username"],
-                sub["tier"],
-                sub["start_date"],
-                sub["end_date"] or "Never",
-                "Yes" if sub["active"] else "No",
-                sub["transaction_id"] or "N/A",
-                sub["payment_method"] or "N/A"
-            ])
-        
-        # Reset the cursor to the beginning of the file
-        output.seek(0)
-        
-        # Create a Discord file from the CSV
-        file_name = f"subscribers{'_' + tier_filter if tier_filter else ''}.csv"
-        file = discord.File(fp=io.BytesIO(output.getvalue().encode()), filename=file_name)
-        
-        await ctx.send(f"Here's the subscriber export for {tier_filter or 'all tiers'}:", file=file)
+        progress_message = await ctx.send(f"Exporting {total} subscribers... 0%")
+        last_update = time.monotonic()
+        
+        async def report_progress(rows_written):
+            nonlocal last_update
+            # Edit the progress message at most every couple of seconds
+            if time.monotonic() - last_update < 2:
+                return
+            last_update = time.monotonic()
+            await progress_message.edit(content=f"Exporting {total} subscribers... {rows_written * 100 // total}%")
+        
+        with tempfile.TemporaryFile() as output:
+            rows_written = await export.write_subscriber_export(
+                output, tier=tier_filter, export_format=export_format, on_progress=report_progress
+            )
+            
+            size = output.tell()
+            if ctx.guild and size > ctx.guild.filesize_limit:
+                await progress_message.edit(
+                    content=f"The export is {size // 1024} KB, which is over this server's upload limit. Try exporting a single tier."
+                )
+                return
+            
+            output.seek(0)
+            
+            # Create a Discord file from the compressed export
+            file_name = f"subscribers{'_' + tier_filter if tier_filter else ''}{export.EXPORT_FORMATS[export_format]}"
+            file = discord.File(fp=output, filename=file_name)
+            
+            await progress_message.edit(content=f"Exported {rows_written} subscribers.")
+            await ctx.send(f"Here's the subscriber export for {tier_filter or 'all tiers'}:", file=file)
     
     @commands.command(name="subscription_report")
     async def subscription_report(self, ctx, days: int = 30):
@@ -177,7 +244,7 @@ class AdminSubscription(commands.Cog):
             return
         
         # Get subscription metrics
-        metrics = await database.get_subscription_metrics(days=days)
+        metrics = await storage.backend.get_subscription_metrics(days=days)
         
         # Create the report embed
         embed = discord.Embed(
@@ -201,6 +268,7 @@ class AdminSubscription(commands.Cog):
             value=(
                 f"New Subscribers: **{metrics['new_subscribers']}**\n"
                 f"Upgrades: **{metrics['upgrades']}**\n"
+                f"Downgrades: **{metrics['downgrades']}**\n"
                 f"Expirations: **{metrics['expirations']}**"
             ),
             inline=False
@@ -211,6 +279,118 @@ class AdminSubscription(commands.Cog):
         
         await ctx.send(embed=embed)
     
+    @commands.command(name="db_stats")
+    async def db_stats(self, ctx):
+        """
+        Show database pool and cache statistics.
+        
+        Usage: !db_stats
+        """
+        if storage.backend.name != "sqlite":
+            await ctx.send("Connection pool statistics are only available for the SQLite backend.")
+            return
+        
+        stats = database.get_database_stats()
+        pool_stats = stats["pool"]
+        cache_stats = stats["entitlement_cache"]
+        
+        embed = discord.Embed(
+            title="Database Statistics",
+            color=discord.Color.blue()
+        )
+        
+        embed.add_field(
+            name="Connections",
+            value=(
+                f"Readers Idle: **{pool_stats['readers_idle']}/{pool_stats['reader_size']}**\n"
+                f"Analytics Idle: **{pool_stats['analytics_idle']}/{pool_stats['analytics_size']}**\n"
+                f"Pending Usage Events: **{stats['usage_events_pending']}**"
+            ),
+            inline=False
+        )
+        
+        # Reports queue here when every analytics connection is busy
+        embed.add_field(
+            name="Analytics Queue",
+            value=(
+                f"Waiting: **{pool_stats['analytics_waiting']}** (peak {pool_stats['analytics_peak_waiting']})\n"
+                f"Saturated: **{pool_stats['analytics_saturated']}** of {pool_stats['analytics_acquired']} reports\n"
+                f"Total Wait: **{pool_stats['analytics_wait_seconds']:.1f}s**"
+            ),
+            inline=False
+        )
+
+        # Transactions queue for the writer task and are committed in groups
+        group_commits = pool_stats["group_commits"]
+        embed.add_field(
+            name="Writes",
+            value=(
+                f"Queued: **{pool_stats['write_queue']}**\n"
+                f"Committed: **{pool_stats['transactions_committed']}** in {group_commits} commits "
+                f"(avg {pool_stats['transactions_committed'] / group_commits if group_commits else 0:.1f}, "
+                f"max {pool_stats['largest_group']})\n"
+                f"Failed: **{pool_stats['transactions_failed']}**"
+            ),
+            inline=False
+        )
+
+        embed.add_field(
+            name="Entitlement Cache",
+            value=(
+                f"Entries: **{cache_stats['entries']}/{cache_stats['max_entries']}**\n"
+                f"Hit Rate: **{cache_stats['hit_rate']:.1%}**\n"
+                f"Evictions: **{cache_stats['evictions']}**"
+            ),
+            inline=False
+        )
+
+        await ctx.send(embed=embed)
+
+    @commands.command(name="query_stats")
+    async def query_stats(self, ctx, limit: int = 10):
+        """
+        Show the query sites that spend the most time in the database.
+
+        Usage: !query_stats [limit=10]
+        """
+        if storage.backend.name != "sqlite":
+            await ctx.send("Query statistics are only available for the SQLite backend.")
+            return
+
+        snapshot = database.get_query_stats()
+        queries = list(snapshot["queries"].items())[:max(1, min(limit, 20))]
+
+        if not queries:
+            await ctx.send("No query statistics recorded yet.")
+            return
+
+        embed = discord.Embed(
+            title="Query Statistics",
+            description="Query sites by total time spent",
+            color=discord.Color.blue()
+        )
+
+        for site, stats in queries:
+            embed.add_field(
+                name=site,
+                value=(
+                    f"Calls: **{stats['count']}** | Rows: **{stats['rows']}** | Total: **{stats['total_ms']:.0f} ms**\n"
+                    f"p50 {stats['p50_ms']:.2f} | p95 {stats['p95_ms']:.2f} | p99 {stats['p99_ms']:.2f} | "
+                    f"max {stats['max_ms']:.2f} ms"
+                ),
+                inline=False
+            )
+
+        slow_queries = snapshot["slow_queries"]
+        if slow_queries:
+            latest = slow_queries[-1]
+            embed.set_footer(
+                text=f"{len(slow_queries)} recent slow queries; latest {latest['site']} "
+                     f"({latest['ms']:.0f} ms). See the log for query plans."
+            )
+
+        await ctx.send(embed=embed)
+
     @commands.command(name="admin_upgrade")
     async def admin_upgrade(self, ctx, user_id: int, tier, duration_days: int = 30, *, reason=None):
         """
@@ -226,17 +406,17 @@ class AdminSubscription(commands.Cog):
         tier = tier.capitalize()
         
         # Check if user exists
-        user = await database.get_user(user_id)
+        user = await storage.backend.get_user(user_id)
         if not user:
             await ctx.send(f"User with ID {user_id} not found in the database.")
             return
         
         # Get current subscription
-        current_subscription = await database.get_subscription(user_id)
+        current_subscription = await storage.backend.get_subscription(user_id)
         current_tier = current_subscription["tier"] if current_subscription else "None"
         
         # Update subscription
-        success = await database.update_subscription(
+        success = await storage.backend.update_subscription(
             user_id, 
             tier, 
             duration_days=duration_days,
@@ -280,13 +460,13 @@ class AdminSubscription(commands.Cog):
             return
         
         # Check if user exists
-        user = await database.get_user(user_id)
+        user = await storage.backend.get_user(user_id)
         if not user:
             await ctx.send(f"User with ID {user_id} not found in the database.")
             return
         
         # Get current subscription
-        subscription = await database.get_subscription(user_id)
+        subscription = await storage.backend.get_subscription(user_id)
         if not subscription:
             await ctx.send(f"User with ID {user_id} does not have an active subscription.")
             return
@@ -296,7 +476,7 @@ class AdminSubscription(commands.Cog):
             return
         
         # Extend subscription
-        success = await database.extend_subscription(
+        success = await storage.backend.extend_subscription(
             user_id,
             additional_days,
             admin_id=ctx.author.id,
@@ -305,8 +485,10 @@ class AdminSubscription(commands.Cog):
         
         if success:
             # Calculate new end date
-            current_end_date = datetime.fromisoformat(subscription["end_date"])
-            new_end_date = current_end_date + timedelta(days=additional_days)
+            current_end_date = database.from_epoch(subscription["end_date"])
+            new_end_date = database.from_epoch(
+                subscription["end_date"] + additional_days * database.SECONDS_PER_DAY
+            )
             
             embed = discord.Embed(
                 title="Subscription Extended",
@@ -340,19 +522,19 @@ class AdminSubscription(commands.Cog):
         Usage: !view_subscription <user_id>
         """
         # Check if user exists
-        user = await database.get_user(user_id)
+        user = await storage.backend.get_user(user_id)
         if not user:
             await ctx.send(f"User with ID {user_id} not found in the database.")
             return
         
         # Get current subscription
-        subscription = await database.get_subscription(user_id)
+        subscription = await storage.backend.get_subscription(user_id)
         if not subscription:
             await ctx.send(f"User with ID {user_id} does not have an active subscription.")
             return
         
         # Get subscription history
-        history = await database.get_subscription_history(user_id, limit=5)
+        history = await storage.backend.get_subscription_history(user_id, limit=5)
         
         # Create the embed
         embed = discord.Embed(
@@ -367,8 +549,8 @@ class AdminSubscription(commands.Cog):
             name="Current Subscription",
             value=(
                 f"Tier: **{subscription['tier']}**\n"
-                f"Start Date: **{subscription['start_date']}**\n"
-                f"End Date: **{subscription['end_date'] or 'Never'}**\n"
+                f"Start Date: **{utils.format_timestamp(subscription['start_date'])}**\n"
+                f"End Date: **{utils.format_timestamp(subscription['end_date'])}**\n"
                 f"Active: **{'Yes' if subscription['active'] else 'No'}**\n"
                 f"Transaction ID: **{subscription['transaction_id'] or 'N/A'}**\n"
                 f"Payment Method: **{subscription['payment_method'] or 'N/A'}**"
@@ -390,7 +572,7 @@ class AdminSubscription(commands.Cog):
             for entry in history:
                 admin_text = f" by Admin ID: {entry['admin_id']}" if entry['admin_id'] else ""
                 reason_text = f"\n   Reason: {entry['reason']}" if entry['reason'] else ""
-                history_text += f"• {entry['changed_at']}: **{entry['previous_tier']}** → **{entry['new_tier']}**{admin_text}{reason_text}\n"
+                history_text += f"• {utils.format_timestamp(entry['changed_at'])}: **{entry['previous_tier']}** → **{entry['new_tier']}**{admin_text}{reason_text}\n"
             
             embed.add_field(
                 name="Recent Subscription Changes",
@@ -408,13 +590,13 @@ class AdminSubscription(commands.Cog):
         Usage: !subscription_history <user_id> [limit=10]
         """
         # Check if user exists
-        user = await database.get_user(user_id)
+        user = await storage.backend.get_user(user_id)
         if not user:
             await ctx.send(f"User with ID {user_id} not found in the database.")
             return
         
         # Get subscription history
-        history = await database.get_subscription_history(user_id, limit=limit)
+        history = await storage.backend.get_subscription_history(user_id, limit=limit)
         
         if not history:
             await ctx.send(f"No subscription history found for user ID: {user_id}")
@@ -433,7 +615,7 @@ class AdminSubscription(commands.Cog):
             reason_text = f"\nReason: {entry['reason']}" if entry['reason'] else ""
             
             embed.add_field(
-                name=f"{i+1}. {entry['changed_at']}",
+                name=f"{i+1}. {utils.format_timestamp(entry['changed_at'])}",
                 value=f"**{entry['previous_tier']}** → **{entry['new_tier']}**{admin_text}{reason_text}",
                 inline=False
             )
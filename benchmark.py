@@ -0,0 +1,519 @@
+#!/usr/bin/env python3
+"""
+Tainment+ Discord Bot - Database Benchmarks
+
+This module generates a synthetic SQLite database at production scale and
+times the public database and leaderboard functions against it, emitting
+JSON so runs can be compared before deploying:
+
+    python benchmark.py generate bench.db --users 1000000 --usage-events 5000000 --game-scores 10000000
+    python benchmark.py run bench.db --output after.json
+    python benchmark.py compare before.json after.json
+
+Benchmarks write to the database, so `run` works on a copy of the dataset
+unless --in-place is given.
+"""
+
+import argparse
+import asyncio
+import fnmatch
+import json
+import logging
+import os
+import platform
+import random
+import shutil
+import sqlite3
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+
+import config
+
+logger = logging.getLogger("tainment_bot.benchmark")
+
+# Synthetic Discord user IDs start here, so they look like snowflakes
+USER_ID_BASE = 100000000000000000
+
+DAY = 86400
+
+GAMES = ["trivia", "riddle", "hangman", "wordle", "quiz", "math", "memory", "emoji"]
+STORIES = ["dragon", "space", "mystery", "pirate", "forest"]
+FEATURES = {"joke": 40, "daily_joke": 15, "story": 20, "story_continue": 15, "game": 10}
+TIER_WEIGHTS = {"Basic": 70, "Premium": 20, "Pro": 10}
+
+# Rows per executemany call while generating
+INSERT_BATCH = 50000
+
+def _progress(message):
+    """Print generation progress to stderr (stdout is kept for JSON)."""
+    print(message, file=sys.stderr, flush=True)
+
+def _insert(db, table, columns, rows):
+    """Insert rows from an iterator in batches. Returns the number of rows."""
+    sql = f"INSERT INTO {table} ({', '.join(columns)}) VALUES ({', '.join('?' * len(columns))})"
+    total = 0
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) >= INSERT_BATCH:
+            db.executemany(sql, batch)
+            total += len(batch)
+            batch.clear()
+    if batch:
+        db.executemany(sql, batch)
+        total += len(batch)
+
+    _progress(f"  {table}: {total} rows")
+    return total
+
+def _subscription_rows(rng, users, now, days, change_kind):
+    """
+    Generate each user's subscription history, ending in one active subscription.
+
+    Args:
+        change_kind: Classifies a (previous tier, new tier) change, as the bot records it
+
+    Yields:
+        tuple: ("subscription", row), ("history", row) or ("payment", row)
+    """
+    tiers = list(TIER_WEIGHTS)
+    weights = list(TIER_WEIGHTS.values())
+    subscription_id = 0
+
+    for index in range(1, users + 1):
+        user_id = USER_ID_BASE + index
+        started = now - rng.randrange(days * DAY)
+        previous = "None"
+        changes = rng.choices([0, 1, 2, 3], weights=[50, 30, 15, 5])[0]
+
+        for change in range(changes + 1):
+            active = change == changes
+            # Everyone starts on Basic; later changes and the current tier follow the tier mix
+            tier = rng.choices(tiers, weights=weights)[0] if change or active else "Basic"
+
+            # Paid subscriptions end anywhere from 15 days ago to 30 days out,
+            # so some are expiring, some in their grace period and some lapsed
+            if active:
+                start_date = max(started, now - rng.randrange(45 * DAY)) if tier != "Basic" else started
+            else:
+                start_date = started + (change * (now - started)) // (changes + 1)
+            end_date = start_date + 30 * DAY if tier != "Basic" else None
+            grace_period_end = end_date + 3 * DAY if end_date else None
+
+            subscription_id += 1
+            transaction_id = f"bench-{subscription_id}" if tier != "Basic" else None
+            yield "subscription", (
+                subscription_id, user_id, tier, start_date, end_date, active,
+                transaction_id, "card" if transaction_id else None, grace_period_end,
+                end_date is not None and end_date - now < 3 * DAY and rng.random() < 0.5
+            )
+
+            yield "history", (user_id, previous, tier, start_date, None, None, change_kind(previous, tier))
+
+            if transaction_id:
+                price = config.SUBSCRIPTION_TIERS[tier]["price"]
+                yield "payment", (transaction_id, user_id, price, "completed", tier, 30, start_date, start_date)
+
+            previous = tier
+
+def generate(path, users, usage_events, game_scores, days, seed):
+    """
+    Build a synthetic database at path with the bot's current schema.
+
+    Args:
+        path: Database file to create (must not exist)
+        users: Number of users
+        usage_events: Number of raw feature usage events
+        game_scores: Number of game score history rows
+        days: How far back timestamps are spread
+        seed: Random seed, so datasets are reproducible
+    """
+    if os.path.exists(path):
+        raise SystemExit(f"{path} already exists")
+
+    started = time.perf_counter()
+    rng = random.Random(seed)
+    now = int(time.time())
+
+    # Create the schema (and run every migration) through the bot's own code
+    config.DB_PATH = path
+    import database
+
+    async def create_schema():
+        await database.init_db()
+        await database.close_db()
+
+    asyncio.run(create_schema())
+    _progress(f"Generating {path} (seed {seed})")
+
+    db = sqlite3.connect(path)
+    db.execute("PRAGMA synchronous = OFF")
+    db.execute("PRAGMA cache_size = -262144")
+
+    with db:
+        _insert(db, "users", ["user_id", "username", "joined_at"], (
+            (
+                USER_ID_BASE + index,
+                f"user{index}",
+                datetime.fromtimestamp(now - rng.randrange(days * DAY), timezone.utc).strftime("%Y-%m-%d %H:%M:%S")
+            )
+            for index in range(1, users + 1)
+        ))
+
+    # Subscriptions, history and payments come from one pass over the users
+    buffers = {"subscription": [], "history": [], "payment": []}
+    statements = {
+        "subscription": """
+            INSERT INTO subscriptions (
+                id, user_id, tier, start_date, end_date, active,
+                transaction_id, payment_method, grace_period_end, renewal_reminder_sent
+            ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+        """,
+        "history": """
+            INSERT INTO subscription_history (
+                user_id, previous_tier, new_tier, changed_at, reason, admin_id, change_kind
+            ) VALUES (?, ?, ?, ?, ?, ?, ?)
+        """,
+        "payment": """
+            INSERT INTO payment_transactions (
+                transaction_id, user_id, amount, status, tier, duration_days, created_at, completed_at
+            ) VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+        """
+    }
+    counts = dict.fromkeys(buffers, 0)
+    with db:
+        for kind, row in _subscription_rows(rng, users, now, days, database.get_change_kind):
+            buffer = buffers[kind]
+            buffer.append(row)
+            if len(buffer) >= INSERT_BATCH:
+                db.executemany(statements[kind], buffer)
+                counts[kind] += len(buffer)
+                buffer.clear()
+        for kind, buffer in buffers.items():
+            db.executemany(statements[kind], buffer)
+            counts[kind] += len(buffer)
+    _progress(f"  subscriptions: {counts['subscription']} rows, history: {counts['history']}, payments: {counts['payment']}")
+
+    features = list(FEATURES)
+    feature_weights = list(FEATURES.values())
+    with db:
+        _insert(db, "usage_stats", ["user_id", "feature", "used_at"], (
+            (
+                USER_ID_BASE + rng.randint(1, users),
+                rng.choices(features, weights=feature_weights)[0],
+                now - rng.randrange(days * DAY)
+            )
+            for _ in range(usage_events)
+        ))
+
+    with db:
+        _insert(db, "game_scores", ["user_id", "game_name", "score", "played_at"], (
+            (
+                USER_ID_BASE + rng.randint(1, users),
+                rng.choice(GAMES),
+                int(rng.paretovariate(1.5) * 10),
+                now - rng.randrange(days * DAY)
+            )
+            for _ in range(game_scores)
+        ))
+
+    with db:
+        _insert(db, "story_progress", ["user_id", "story_name", "current_part"], (
+            (USER_ID_BASE + index, rng.choice(STORIES), rng.randint(1, 5))
+            for index in range(1, users + 1, 5)
+        ))
+
+    # Derived tables, built the way the bot would have maintained them
+    with db:
+        _progress("  deriving best scores and subscription counters")
+        db.execute(
+            """
+            INSERT INTO best_scores (game_name, user_id, best_score, achieved_at)
+            SELECT game_name, user_id, MAX(score), played_at
+            FROM game_scores
+            WHERE score > 0
+            GROUP BY game_name, user_id
+            """
+        )
+        db.execute(
+            """
+            INSERT OR REPLACE INTO subscription_tier_counts (tier, count)
+            SELECT tier, COUNT(*) FROM subscriptions WHERE active = TRUE GROUP BY tier
+            """
+        )
+        db.execute(
+            """
+            INSERT OR REPLACE INTO subscription_daily_metrics (day, kind, count)
+            SELECT changed_at - changed_at % 86400, change_kind, COUNT(*)
+            FROM subscription_history
+            GROUP BY 1, 2
+            """
+        )
+    db.execute("ANALYZE")
+    db.close()
+
+    # Roll up every completed day of usage, as the hourly task would have
+    async def roll_up():
+        await database.rollup_usage_stats()
+        await database.close_db()
+
+    _progress("  rolling up usage stats")
+    asyncio.run(roll_up())
+
+    _progress(f"Generated {path} in {time.perf_counter() - started:.1f}s")
+
+def _percentile(sorted_values, fraction):
+    """Nearest-rank percentile of an already sorted list."""
+    if not sorted_values:
+        return 0.0
+    return sorted_values[min(len(sorted_values) - 1, int(fraction * len(sorted_values)))]
+
+async def _time_case(make_call, iterations, concurrency):
+    """
+    Call a benchmark case repeatedly and summarize its latency.
+
+    Returns:
+        dict: Calls, throughput and latency percentiles in milliseconds
+    """
+    latencies = []
+    remaining = iterations
+
+    async def worker():
+        nonlocal remaining
+        while remaining > 0:
+            remaining -= 1
+            started = time.perf_counter()
+            await make_call()
+            latencies.append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(max(1, min(concurrency, iterations)))))
+    elapsed = time.perf_counter() - started
+
+    latencies.sort()
+    return {
+        "calls": len(latencies),
+        "seconds": elapsed,
+        "throughput_per_s": len(latencies) / elapsed if elapsed else 0.0,
+        "p50_ms": _percentile(latencies, 0.50) * 1000,
+        "p95_ms": _percentile(latencies, 0.95) * 1000,
+        "p99_ms": _percentile(latencies, 0.99) * 1000,
+        "max_ms": latencies[-1] * 1000 if latencies else 0.0
+    }
+
+def _cases(database, leaderboard, rng, users):
+    """
+    Build the benchmark cases.
+
+    Returns:
+        list: (name, zero-argument coroutine function, fixed iteration count or None) tuples
+    """
+    def user():
+        return USER_ID_BASE + rng.randint(1, users)
+
+    new_users = iter(range(USER_ID_BASE + users + 1, USER_ID_BASE + 2 * users + 10 ** 6))
+    transactions = iter(range(10 ** 9))
+    tiers = list(TIER_WEIGHTS)
+
+    async def subscribers_page():
+        rows, _ = await database.get_subscribers_page(tier=rng.choice([None, "Premium", "Pro"]))
+        if rows:
+            last = rows[-1]
+            await database.get_subscribers_page(after=(last["start_date"], last["id"]))
+
+    async def iterate_subscribers():
+        async for _ in database.iter_subscribers():
+            pass
+
+    return [
+        # Interactive reads
+        ("database.get_user", lambda: database.get_user(user()), None),
+        ("database.get_subscription", lambda: database.get_subscription(user()), None),
+        ("database.resolve_user_context", lambda: database.resolve_user_context(user(), "bench"), None),
+        ("database.check_subscription_access", lambda: database.check_subscription_access(user(), "Premium"), None),
+        ("database.get_user_best_score", lambda: database.get_user_best_score(user(), rng.choice(GAMES)), None),
+        ("database.get_user_game_standing", lambda: database.get_user_game_standing(user(), rng.choice(GAMES)), None),
+        ("database.get_leaderboard", lambda: database.get_leaderboard(rng.choice(GAMES)), None),
+        ("database.get_available_games", lambda: database.get_available_games(), None),
+        ("database.get_story_progress", lambda: database.get_story_progress(user(), rng.choice(STORIES)), None),
+        ("database.get_subscription_history", lambda: database.get_subscription_history(user()), None),
+        ("database.get_user_payment_history", lambda: database.get_user_payment_history(user()), None),
+
+        # Interactive writes
+        ("database.add_user", lambda: database.add_user(next(new_users), "bench"), None),
+        ("database.change_subscription", lambda: database.change_subscription(user(), rng.choice(tiers)), None),
+        ("database.extend_subscription", lambda: database.extend_subscription(user(), 7), None),
+        ("database.update_game_score", lambda: database.update_game_score(user(), rng.choice(GAMES), rng.randint(1, 500)), None),
+        ("database.update_story_progress", lambda: database.update_story_progress(user(), rng.choice(STORIES), rng.randint(1, 5)), None),
+        ("database.log_feature_usage", lambda: database.log_feature_usage(user(), rng.choice(list(FEATURES))), None),
+        ("database.log_subscription_change", lambda: database.log_subscription_change(user(), "Basic", "Premium"), None),
+        ("database.record_payment_transaction", lambda: database.record_payment_transaction(
+            f"bench-run-{next(transactions)}", user(), 4.99, "completed", "Premium", 30
+        ), None),
+
+        # Leaderboard module (in-memory top scores with database fallback)
+        ("leaderboard.cache_load", lambda: leaderboard.leaderboard_cache.rebuild(), 1),
+        ("leaderboard.get_leaderboard", lambda: leaderboard.get_leaderboard(rng.choice(GAMES)), None),
+        ("leaderboard.get_user_standing", lambda: leaderboard.get_user_standing(user(), rng.choice(GAMES)), None),
+        ("leaderboard.update_score", lambda: leaderboard.update_score(user(), rng.choice(GAMES), rng.randint(1, 500)), None),
+
+        # Reports and background jobs
+        ("database.get_subscribers_page", subscribers_page, None),
+        ("database.count_subscribers", lambda: database.count_subscribers(tier=rng.choice([None, "Pro"])), 20),
+        ("database.get_subscription_metrics", lambda: database.get_subscription_metrics(), 20),
+        ("database.get_feature_usage_stats", lambda: database.get_feature_usage_stats(), 20),
+        ("database.check_expiring_subscriptions", lambda: database.check_expiring_subscriptions(), 5),
+        ("database.check_expired_subscriptions", lambda: database.check_expired_subscriptions(), 5),
+        ("database.check_grace_period_expired_subscriptions", lambda: database.check_grace_period_expired_subscriptions(), 5),
+        ("database.get_all_subscribers", lambda: database.get_all_subscribers(tier="Pro"), 3),
+        ("database.iter_subscribers", iterate_subscribers, 1),
+        ("database.rollup_usage_stats", lambda: database.rollup_usage_stats(), 1),
+        ("database.downgrade_expired_subscriptions", lambda: database.downgrade_expired_subscriptions(), 1)
+    ]
+
+async def _dataset_counts(database):
+    """Count the rows in the main tables."""
+    counts = {}
+    async with database.pool.reader() as db:
+        for table in ("users", "subscriptions", "subscription_history", "usage_stats", "game_scores", "best_scores"):
+            cursor = await db.execute(f"SELECT COUNT(*) FROM {table}")
+            counts[table] = (await cursor.fetchone())[0]
+    return counts
+
+async def run(path, iterations, concurrency, seed, only=None):
+    """
+    Time every benchmark case against the database at path.
+
+    Returns:
+        dict: Run metadata and per-case results
+    """
+    config.DB_PATH = path
+    config.STORAGE_BACKEND = "sqlite"
+    import database
+    import leaderboard
+
+    await database.init_db()
+    try:
+        counts = await _dataset_counts(database)
+        if not counts["users"]:
+            raise SystemExit(f"{path} has no users; run `benchmark.py generate` first")
+
+        rng = random.Random(seed)
+        results = {}
+        for name, make_call, fixed_iterations in _cases(database, leaderboard, rng, counts["users"]):
+            if only and not any(fnmatch.fnmatch(name, pattern) for pattern in only):
+                continue
+
+            _progress(f"  {name}")
+            if fixed_iterations:
+                results[name] = await _time_case(make_call, fixed_iterations, 1)
+            else:
+                results[name] = await _time_case(make_call, iterations, concurrency)
+
+        query_sites = dict(list(database.get_query_stats()["queries"].items())[:20])
+    finally:
+        await database.close_db()
+
+    return {
+        "generated_at": datetime.now(timezone.utc).isoformat(),
+        "environment": {
+            "python": platform.python_version(),
+            "sqlite": sqlite3.sqlite_version,
+            "platform": platform.platform()
+        },
+        "dataset": counts,
+        "settings": {"iterations": iterations, "concurrency": concurrency, "seed": seed},
+        "results": results,
+        "query_sites": query_sites
+    }
+
+def compare(baseline_path, current_path, threshold, min_ms):
+    """
+    Print per-case p99 and throughput changes between two runs.
+
+    Returns:
+        int: 1 if any case's p99 regressed beyond the threshold, else 0
+    """
+    with open(baseline_path) as f:
+        baseline = json.load(f)["results"]
+    with open(current_path) as f:
+        current = json.load(f)["results"]
+
+    regressions = []
+    print(f"{'case':<50} {'p99 before':>11} {'p99 after':>11} {'ratio':>7} {'ops/s ratio':>12}")
+    for name in sorted(set(baseline) & set(current)):
+        before, after = baseline[name], current[name]
+        ratio = after["p99_ms"] / before["p99_ms"] if before["p99_ms"] else 1.0
+        throughput = after["throughput_per_s"] / before["throughput_per_s"] if before["throughput_per_s"] else 1.0
+
+        flag = ""
+        if ratio > threshold and after["p99_ms"] >= min_ms:
+            regressions.append(name)
+            flag = "  REGRESSION"
+        print(f"{name:<50} {before['p99_ms']:>9.2f}ms {after['p99_ms']:>9.2f}ms {ratio:>7.2f} {throughput:>12.2f}{flag}")
+
+    print(f"{len(regressions)} regressions (p99 more than {threshold:.2f}x slower and above {min_ms} ms)")
+    return 1 if regressions else 0
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate synthetic datasets and benchmark the database layer.")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    generate_parser = commands.add_parser("generate", help="Create a synthetic database")
+    generate_parser.add_argument("path")
+    generate_parser.add_argument("--users", type=int, default=100000)
+    generate_parser.add_argument("--usage-events", type=int, default=500000)
+    generate_parser.add_argument("--game-scores", type=int, default=1000000)
+    generate_parser.add_argument("--days", type=int, default=365, help="How far back timestamps are spread")
+    generate_parser.add_argument("--seed", type=int, default=42)
+
+    run_parser = commands.add_parser("run", help="Benchmark the database functions against a dataset")
+    run_parser.add_argument("path")
+    run_parser.add_argument("--iterations", type=int, default=500, help="Calls per interactive case")
+    run_parser.add_argument("--concurrency", type=int, default=1, help="Concurrent callers per case")
+    run_parser.add_argument("--only", action="append", help="Only run cases matching this glob (repeatable)")
+    run_parser.add_argument("--seed", type=int, default=7)
+    run_parser.add_argument("--output", help="Write JSON here instead of stdout")
+    run_parser.add_argument("--in-place", action="store_true", help="Benchmark the dataset itself instead of a copy")
+
+    compare_parser = commands.add_parser("compare", help="Compare two benchmark runs")
+    compare_parser.add_argument("baseline")
+    compare_parser.add_argument("current")
+    compare_parser.add_argument("--threshold", type=float, default=1.25, help="p99 ratio counted as a regression")
+    compare_parser.add_argument("--min-ms", type=float, default=0.5, help="Ignore cases faster than this")
+
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.WARNING)
+
+    if args.command == "generate":
+        generate(args.path, args.users, args.usage_events, args.game_scores, args.days, args.seed)
+        return 0
+
+    if args.command == "compare":
+        return compare(args.baseline, args.current, args.threshold, args.min_ms)
+
+    path = args.path
+    workdir = None
+    if not args.in_place:
+        workdir = tempfile.mkdtemp(prefix="tainment_bench_")
+        path = os.path.join(workdir, os.path.basename(args.path))
+        shutil.copyfile(args.path, path)
+
+    try:
+        report = asyncio.run(run(path, args.iterations, args.concurrency, args.seed, args.only))
+    finally:
+        if workdir:
+            shutil.rmtree(workdir)
+
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output + "\n")
+    else:
+        print(output)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
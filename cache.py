@@ -0,0 +1,176 @@
+"""
+Tainment+ Discord Bot - In-Process Caches
+
+This module provides a small bounded LRU cache with per-entry expiry,
+used to keep hot, rarely-changing lookups out of the database, and a
+bounded sorted top-K container for leaderboards.
+"""
+
+import bisect
+import itertools
+import time
+from collections import OrderedDict
+
+# Returned by get() when a key is missing or expired
+MISSING = object()
+
+class LRUCache:
+    """A bounded least-recently-used cache with an optional time-to-live."""
+
+    def __init__(self, max_entries=10000, ttl=None, on_evict=None):
+        """
+        Create a cache.
+
+        Args:
+            max_entries: Maximum number of entries kept before evicting the oldest
+            ttl: Seconds an entry stays valid, or None for no expiry
+            on_evict: Optional callable(key, value) called when an entry is evicted for space
+        """
+        self.max_entries = max(1, max_entries)
+        self.ttl = ttl
+        self.on_evict = on_evict
+        self._entries = OrderedDict()
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, key):
+        return self.get(key, count=False) is not MISSING
+
+    def get(self, key, count=True):
+        """
+        Get a cached value.
+
+        Returns:
+            The cached value, or MISSING if absent or expired
+        """
+        entry = self._entries.get(key)
+        if entry is not None:
+            value, expires_at = entry
+            if expires_at is None or expires_at > time.monotonic():
+                self._entries.move_to_end(key)
+                if count:
+                    self.hits += 1
+                return value
+            del self._entries[key]
+
+        if count:
+            self.misses += 1
+        return MISSING
+
+    def set(self, key, value):
+        """Store a value, evicting the least recently used entry if full."""
+        expires_at = time.monotonic() + self.ttl if self.ttl is not None else None
+        self._entries[key] = (value, expires_at)
+        self._entries.move_to_end(key)
+
+        while len(self._entries) > self.max_entries:
+            evicted_key, (evicted, _) = self._entries.popitem(last=False)
+            self.evictions += 1
+            if self.on_evict is not None:
+                self.on_evict(evicted_key, evicted)
+
+    def invalidate(self, key):
+        """Remove a single key if present."""
+        self._entries.pop(key, None)
+
+    def invalidate_many(self, keys):
+        """Remove several keys."""
+        for key in keys:
+            self._entries.pop(key, None)
+
+    def clear(self):
+        """Remove every entry."""
+        self._entries.clear()
+
+    def stats(self):
+        """Get hit/miss counters and current size."""
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "max_entries": self.max_entries,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": self.hits / lookups if lookups else 0.0
+        }
+
+class TopScores:
+    """
+    The K best scores for one game, kept sorted in memory.
+
+    Entries are ordered by score (highest first), then by when the score was
+    recorded (earliest first). Scores only ever improve, so once the container
+    is loaded with the true top K it stays exact under incremental updates.
+    """
+
+    def __init__(self, size=100):
+        """
+        Create an empty top-K container.
+
+        Args:
+            size: Maximum number of entries kept
+        """
+        self.size = max(1, size)
+        self._keys = []
+        self._by_user = {}
+        self._order = itertools.count()
+
+    def __len__(self):
+        return len(self._keys)
+
+    def __contains__(self, user_id):
+        return user_id in self._by_user
+
+    @property
+    def is_full(self):
+        """Whether players may exist beyond the entries held here."""
+        return len(self._keys) >= self.size
+
+    def record(self, user_id, score):
+        """
+        Record a player's best score, keeping only the top K.
+
+        Returns:
+            bool: Whether the player is in the top K afterwards
+        """
+        key = self._by_user.get(user_id)
+        if key is not None:
+            if -key[0] >= score:
+                return True
+            del self._keys[bisect.bisect_left(self._keys, key)]
+            del self._by_user[user_id]
+        elif self.is_full and -self._keys[-1][0] >= score:
+            return False
+
+        key = (-score, next(self._order), user_id)
+        bisect.insort(self._keys, key)
+        self._by_user[user_id] = key
+
+        while len(self._keys) > self.size:
+            evicted = self._keys.pop()
+            del self._by_user[evicted[2]]
+
+        return user_id in self._by_user
+
+    def top(self, limit):
+        """Get up to limit (user_id, score) tuples, best first."""
+        return [(user_id, -negated) for negated, _, user_id in self._keys[:limit]]
+
+    def standing(self, user_id):
+        """
+        Get a player's rank and score if they are in the top K.
+
+        Players with equal scores share a rank.
+
+        Returns:
+            tuple: (int, int) - Rank and score, or None if the player isn't held here
+        """
+        key = self._by_user.get(user_id)
+        if key is None:
+            return None
+        return bisect.bisect_left(self._keys, (key[0],)) + 1, -key[0]
@@ -0,0 +1,139 @@
+"""
+Tainment+ Discord Bot - Content Catalog
+
+This module provides per-tier views of the bot's entertainment content
+(jokes, stories, trivia, words), which lives in the read-only content store.
+Each tier sees its own content plus everything from the tiers below it. Only
+the per-tier, per-category item counts are held in memory; items are fetched
+from the store by index when picked, so the library can grow without
+affecting startup time or memory.
+"""
+
+import bisect
+import itertools
+import random
+from types import MappingProxyType
+
+import config
+import content_store
+
+# Tiers from lowest to highest; each tier includes the content of those before it
+TIERS = tuple(config.SUBSCRIPTION_TIERS)
+
+class TierView:
+    """How much content of each category one tier can access."""
+
+    __slots__ = ("tier", "counts", "categories", "total", "_starts")
+
+    def __init__(self, tier, counts):
+        self.tier = tier
+        # Read-only {category: number of items}, only categories with items
+        self.counts = MappingProxyType(counts)
+        # Category keys with content, in display order
+        self.categories = tuple(counts)
+        # Number of items across every category
+        self.total = sum(counts.values())
+        # Where each category starts in the flattened view of every item
+        self._starts = tuple(itertools.accumulate(counts.values(), initial=0))[:-1]
+
+    def __contains__(self, category):
+        return category in self.counts
+
+    def locate(self, index):
+        """
+        Map an index into the flattened view to a category and position.
+
+        Returns:
+            tuple: (category, index within the category)
+        """
+        position = bisect.bisect_right(self._starts, index) - 1
+        return self.categories[position], index - self._starts[position]
+
+class Catalog:
+    """One kind of content, with a TierView per tier loaded from the store on first use."""
+
+    def __init__(self, kind, store=None):
+        """
+        Create a catalog.
+
+        Args:
+            kind: Content kind in the store ("joke", "story", "trivia", "word")
+            store: ContentStore to read from (defaults to the shared store)
+        """
+        self.kind = kind
+        self.store = store or content_store.store
+        self._names = None
+        self._views = None
+        self._lowest = None
+
+    def _load(self):
+        """Load category names and per-tier counts from the store."""
+        names = self.store.categories(self.kind)
+        counts = self.store.tier_counts(self.kind)
+        views = {tier: TierView(tier, counts.get(tier, {})) for tier in TIERS}
+
+        self._names = MappingProxyType(names)
+        self._lowest = views[TIERS[0]]
+        self._views = views
+
+    @property
+    def names(self):
+        """Read-only {category: display name} for every category."""
+        if self._views is None:
+            self._load()
+        return self._names
+
+    def name(self, category):
+        """Get a category's display name."""
+        return self.names.get(category, category)
+
+    def tier(self, tier):
+        """Get the view for a tier (unknown tiers get the lowest tier's content)."""
+        if self._views is None:
+            self._load()
+        return self._views.get(tier, self._lowest)
+
+    def item(self, category, index):
+        """Get a category's item by index (None if out of range)."""
+        return self.store.item(self.kind, category, index)
+
+    async def search(self, tier, terms, limit=5):
+        """
+        Full-text search the content a tier can access.
+
+        Returns:
+            list: (category, index, item) tuples, best match first
+        """
+        level = TIERS.index(tier) if tier in TIERS else 0
+        return await self.store.search(self.kind, terms, TIERS[:level + 1], limit)
+
+    def choice(self, tier, category=None):
+        """
+        Pick a random item for a tier.
+
+        Args:
+            tier: Subscription tier name
+            category: Optional category key; ignored if the tier has nothing in it
+
+        Returns:
+            tuple: (category, item), or (None, None) if the tier has no content
+        """
+        view = self.tier(tier)
+        if category not in view.counts:
+            if not view.categories:
+                return None, None
+            category = random.choice(view.categories)
+        return category, self.item(category, random.randrange(view.counts[category]))
+
+    def random_item(self, tier):
+        """
+        Pick a random item from everything a tier can access, weighting every item equally.
+
+        Returns:
+            tuple: (category, item), or (None, None) if the tier has no content
+        """
+        view = self.tier(tier)
+        if not view.total:
+            return None, None
+        category, index = view.locate(random.randrange(view.total))
+        return category, self.item(category, index)
@@ -18,9 +18,61 @@ BOT_TOKEN = os.getenv("BOT_TOKEN")
 # Command prefix (what users type before commands)
 COMMAND_PREFIX = os.getenv("COMMAND_PREFIX", "t!")
 
+# Storage backend: "sqlite" (local file at DB_PATH) or "postgres" (shared database at POSTGRES_DSN)
+STORAGE_BACKEND = os.getenv("STORAGE_BACKEND", "sqlite")
+
+# PostgreSQL connection string and pool size (connections kept open, maximum connections)
+POSTGRES_DSN = os.getenv("POSTGRES_DSN", "postgresql://localhost/tainment")
+POSTGRES_POOL_MIN_SIZE = int(os.getenv("POSTGRES_POOL_MIN_SIZE", "1"))
+POSTGRES_POOL_MAX_SIZE = int(os.getenv("POSTGRES_POOL_MAX_SIZE", "10"))
+
 # Database settings
 DB_PATH = os.getenv("DB_PATH", "tainment.db")
 
+# Number of pooled reader connections (writes always use one dedicated connection)
+DB_READER_POOL_SIZE = int(os.getenv("DB_READER_POOL_SIZE", "4"))
+
+# Read-only connections reserved for admin reports, i.e. how many report scans run at once
+DB_ANALYTICS_POOL_SIZE = int(os.getenv("DB_ANALYTICS_POOL_SIZE", "1"))
+
+# All writes go through one writer task; at most this many queued transactions share a commit
+DB_WRITE_BATCH_SIZE = int(os.getenv("DB_WRITE_BATCH_SIZE", "64"))
+
+# Time every query per call site; statements slower than SLOW_QUERY_MS are logged with their query plan
+QUERY_STATS_ENABLED = os.getenv("QUERY_STATS_ENABLED", "true").lower() == "true"
+SLOW_QUERY_MS = int(os.getenv("SLOW_QUERY_MS", "100"))
+QUERY_STATS_SAMPLES = int(os.getenv("QUERY_STATS_SAMPLES", "1024"))
+
+# Feature usage logging is buffered and written in batches
+USAGE_FLUSH_INTERVAL_MS = int(os.getenv("USAGE_FLUSH_INTERVAL_MS", "1000"))
+USAGE_FLUSH_BATCH_SIZE = int(os.getenv("USAGE_FLUSH_BATCH_SIZE", "200"))
+USAGE_QUEUE_SIZE = int(os.getenv("USAGE_QUEUE_SIZE", "10000"))
+
+# In-process cache of active subscriptions (entries, seconds before re-checking the database)
+ENTITLEMENT_CACHE_SIZE = int(os.getenv("ENTITLEMENT_CACHE_SIZE", "50000"))
+ENTITLEMENT_CACHE_TTL = int(os.getenv("ENTITLEMENT_CACHE_TTL", "300"))
+
+# Raw usage events are rolled up into daily totals once their day is this many seconds old
+USAGE_ROLLUP_DELAY = int(os.getenv("USAGE_ROLLUP_DELAY", "300"))
+
+# Retention: days to keep raw usage events, game score history and inactive subscriptions (0 keeps forever)
+USAGE_RETENTION_DAYS = int(os.getenv("USAGE_RETENTION_DAYS", "90"))
+GAME_SCORE_RETENTION_DAYS = int(os.getenv("GAME_SCORE_RETENTION_DAYS", "180"))
+SUBSCRIPTION_RETENTION_DAYS = int(os.getenv("SUBSCRIPTION_RETENTION_DAYS", "365"))
+
+# Rows removed per transaction, and an optional database file old rows are copied to first
+RETENTION_CHUNK_SIZE = int(os.getenv("RETENTION_CHUNK_SIZE", "500"))
+RETENTION_ARCHIVE_PATH = os.getenv("RETENTION_ARCHIVE_PATH", "")
+
+# Run a full VACUUM after retention (locks the database; needed once to enable incremental vacuum on old files)
+RETENTION_FULL_VACUUM = os.getenv("RETENTION_FULL_VACUUM", "false").lower() == "true"
+
+# Expired subscriptions downgraded per transaction by the expiry job
+DOWNGRADE_CHUNK_SIZE = int(os.getenv("DOWNGRADE_CHUNK_SIZE", "500"))
+
+# Best scores held in memory per game for leaderboard views
+LEADERBOARD_CACHE_SIZE = int(os.getenv("LEADERBOARD_CACHE_SIZE", "100"))
+
 # Subscription tiers and pricing
 SUBSCRIPTION_TIERS = {
     "Basic": {
@@ -40,6 +92,14 @@ SUBSCRIPTION_TIERS = {
     }
 }
 
+# Entertainment content: JSON source and the read-only SQLite store built from it (rebuilt when the source changes)
+CONTENT_SOURCE_PATH = os.getenv("CONTENT_SOURCE_PATH", os.path.join(os.path.dirname(os.path.abspath(__file__)), "content.json"))
+CONTENT_DB_PATH = os.getenv("CONTENT_DB_PATH", "content.db")
+
+# Per-user joke/story rotation: bags kept in memory, seconds between writes of what users have seen
+CONTENT_ROTATION_CACHE_SIZE = int(os.getenv("CONTENT_ROTATION_CACHE_SIZE", "20000"))
+CONTENT_ROTATION_FLUSH_INTERVAL = int(os.getenv("CONTENT_ROTATION_FLUSH_INTERVAL", "60"))
+
 # Cooldown settings (in seconds)
 COOLDOWNS = {
     "joke": 5,
@@ -0,0 +1,393 @@
+"""
+Tainment+ Discord Bot - Content Store
+
+This module builds the bot's entertainment content (jokes, stories, trivia,
+words) from content.json into a read-only SQLite file, and reads items back
+from it by position. Items of a kind and category are numbered tier by tier
+(lowest tier first), so a tier's items in a category are always the first
+`count` positions and any item can be fetched by index without loading the
+library into memory.
+
+    python content_store.py build [content.json] [content.db]
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import os
+import re
+import sqlite3
+import sys
+import threading
+from urllib.parse import quote
+
+import config
+
+logger = logging.getLogger("tainment_bot.content_store")
+
+# Bump when the store's layout changes, so stale files are rebuilt
+STORE_VERSION = 2
+
+# Longest search accepted, in words
+MAX_SEARCH_TERMS = 16
+
+# Words ignored in searches (unless the search has nothing else)
+STOP_WORDS = frozenset("""
+    a about an and any are as at be but by can do for from get give have i in is it joke jokes
+    me my of on one or please show some stories story tell that the this to with you your
+""".split())
+
+SCHEMA = """
+CREATE TABLE store_info (
+    key TEXT PRIMARY KEY,
+    value TEXT NOT NULL
+);
+
+CREATE TABLE categories (
+    kind TEXT NOT NULL,
+    category TEXT NOT NULL,
+    name TEXT NOT NULL,
+    position INTEGER NOT NULL,
+    PRIMARY KEY (kind, category)
+) WITHOUT ROWID;
+
+-- Cumulative item counts: how many of a category's items each tier can access
+CREATE TABLE tier_counts (
+    kind TEXT NOT NULL,
+    tier TEXT NOT NULL,
+    category TEXT NOT NULL,
+    count INTEGER NOT NULL,
+    PRIMARY KEY (kind, tier, category)
+) WITHOUT ROWID;
+
+CREATE TABLE items (
+    id INTEGER PRIMARY KEY,
+    kind TEXT NOT NULL,
+    category TEXT NOT NULL,
+    ordinal INTEGER NOT NULL,
+    tier TEXT NOT NULL,
+    text TEXT NOT NULL,
+    data TEXT
+);
+
+CREATE UNIQUE INDEX idx_items_position ON items(kind, category, ordinal);
+
+-- Full-text index over item text (external content: rows live in items)
+CREATE VIRTUAL TABLE items_search USING fts5(
+    text,
+    content = 'items',
+    content_rowid = 'id',
+    tokenize = 'porter unicode61 remove_diacritics 2'
+);
+"""
+
+def _item_text(item):
+    """Get the main text of an item (structured items keep it in their first field)."""
+    if isinstance(item, dict):
+        return str(next(iter(item.values()), ""))
+    return str(item)
+
+def build(source_path, store_path):
+    """
+    Build a content store from a JSON source file.
+
+    The store is written next to store_path and moved into place once
+    complete, so a running bot never sees a half-built file.
+
+    Args:
+        source_path: JSON file of {kind: {"categories": {key: name}, "items": {tier: {category: [items]}}}}
+        store_path: SQLite file to create or replace
+
+    Returns:
+        int: Number of items written
+    """
+    with open(source_path, encoding="utf-8") as f:
+        source = json.load(f)
+
+    tiers = list(config.SUBSCRIPTION_TIERS)
+    temp_path = f"{store_path}.building"
+    if os.path.exists(temp_path):
+        os.remove(temp_path)
+
+    db = sqlite3.connect(temp_path)
+    total = 0
+    try:
+        db.executescript(SCHEMA)
+        db.executemany(
+            "INSERT INTO store_info (key, value) VALUES (?, ?)",
+            [("version", str(STORE_VERSION)), ("source_mtime", str(int(os.path.getmtime(source_path))))]
+        )
+
+        for kind, content in source.items():
+            unknown = set(content["items"]) - set(tiers)
+            if unknown:
+                raise ValueError(f"Unknown tiers for {kind}: {', '.join(sorted(unknown))}")
+
+            # Categories without a display name still get one, after the named ones
+            names = dict(content.get("categories", {}))
+            for tier_items in content["items"].values():
+                for category in tier_items:
+                    names.setdefault(category, category.capitalize())
+
+            db.executemany(
+                "INSERT INTO categories (kind, category, name, position) VALUES (?, ?, ?, ?)",
+                [(kind, category, name, position) for position, (category, name) in enumerate(names.items())]
+            )
+
+            counts = dict.fromkeys(names, 0)
+            for tier in tiers:
+                for category, items in content["items"].get(tier, {}).items():
+                    db.executemany(
+                        "INSERT INTO items (kind, category, ordinal, tier, text, data) VALUES (?, ?, ?, ?, ?, ?)",
+                        [
+                            (
+                                kind, category, counts[category] + offset, tier, _item_text(item),
+                                json.dumps(item, ensure_ascii=False) if isinstance(item, dict) else None
+                            )
+                            for offset, item in enumerate(items)
+                        ]
+                    )
+                    counts[category] += len(items)
+                    total += len(items)
+
+                db.executemany(
+                    "INSERT INTO tier_counts (kind, tier, category, count) VALUES (?, ?, ?, ?)",
+                    [(kind, tier, category, count) for category, count in counts.items() if count]
+                )
+
+        db.execute("INSERT INTO items_search (items_search) VALUES ('rebuild')")
+        db.execute("INSERT INTO items_search (items_search) VALUES ('optimize')")
+        db.commit()
+        db.execute("VACUUM")
+    finally:
+        db.close()
+
+    os.replace(temp_path, store_path)
+    logger.info(f"Built content store {store_path} with {total} items from {source_path}")
+    return total
+
+class ContentStore:
+    """
+    Read-only access to a built content store.
+
+    The bot opens the store at startup, before connecting, since building it
+    can take a while; other callers have it opened on first use. Lookups are
+    primary-key reads from an immutable, memory-mapped file (microseconds),
+    so they run directly on the calling thread. Searches rank every match and
+    can take much longer, so they run in a worker thread on a connection of
+    their own.
+    """
+
+    def __init__(self, store_path, source_path=None):
+        """
+        Create a (not yet opened) content store.
+
+        Args:
+            store_path: Built SQLite content file
+            source_path: Optional JSON source; the store is (re)built from it when missing or older
+        """
+        self.store_path = store_path
+        self.source_path = source_path
+        self._db = None
+        self._search_db = None
+        self._lock = threading.Lock()
+        self._search_lock = threading.Lock()
+
+    def _is_stale(self):
+        """Whether the store file needs building from the source."""
+        if not os.path.exists(self.store_path):
+            return True
+        if not self.source_path or not os.path.exists(self.source_path):
+            return False
+
+        try:
+            db = sqlite3.connect(f"file:{quote(self.store_path)}?mode=ro", uri=True)
+            try:
+                info = dict(db.execute("SELECT key, value FROM store_info").fetchall())
+            finally:
+                db.close()
+        except sqlite3.Error:
+            return True
+
+        return (
+            info.get("version") != str(STORE_VERSION)
+            or info.get("source_mtime") != str(int(os.path.getmtime(self.source_path)))
+        )
+
+    def open(self):
+        """
+        Open the store, first building it from the source if missing or out of date.
+
+        This blocks while building; from async code, run it in a thread.
+        Safe to call more than once.
+        """
+        with self._lock:
+            if self._db is not None:
+                return
+
+            if self.source_path and self._is_stale():
+                build(self.source_path, self.store_path)
+
+            self._db = self._open_connection()
+            logger.info(f"Opened content store {self.store_path}")
+
+    def _open_connection(self):
+        """Open a read-only connection to the store file."""
+        # Immutable: no locking or change detection, and pages are read through mmap
+        db = sqlite3.connect(
+            f"file:{quote(self.store_path)}?mode=ro&immutable=1", uri=True, check_same_thread=False
+        )
+        db.execute("PRAGMA mmap_size = 268435456")
+        return db
+
+    def _connection(self):
+        """Get the store connection, opening the store if it isn't open yet."""
+        if self._db is None:
+            self.open()
+        return self._db
+
+    def close(self):
+        """Close the store (it reopens on next use)."""
+        with self._lock, self._search_lock:
+            if self._db is not None:
+                self._db.close()
+                self._db = None
+            if self._search_db is not None:
+                self._search_db.close()
+                self._search_db = None
+
+    def categories(self, kind):
+        """
+        Get a kind's categories.
+
+        Returns:
+            dict: {category: display name} in display order
+        """
+        rows = self._connection().execute(
+            "SELECT category, name FROM categories WHERE kind = ? ORDER BY position",
+            (kind,)
+        ).fetchall()
+        return dict(rows)
+
+    def tier_counts(self, kind):
+        """
+        Get how many items of each category every tier can access.
+
+        Returns:
+            dict: {tier: {category: count}}, categories in display order
+        """
+        rows = self._connection().execute(
+            """
+            SELECT t.tier, t.category, t.count
+            FROM tier_counts t
+            JOIN categories c ON c.kind = t.kind AND c.category = t.category
+            WHERE t.kind = ?
+            ORDER BY c.position
+            """,
+            (kind,)
+        ).fetchall()
+
+        counts = {}
+        for tier, category, count in rows:
+            counts.setdefault(tier, {})[category] = count
+        return counts
+
+    def item(self, kind, category, index):
+        """
+        Get an item by its position in a category.
+
+        Returns:
+            The item (text, or a dict for structured items), or None if out of range
+        """
+        row = self._connection().execute(
+            "SELECT text, data FROM items WHERE kind = ? AND category = ? AND ordinal = ?",
+            (kind, category, index)
+        ).fetchone()
+        if row is None:
+            return None
+
+        text, data = row
+        return json.loads(data) if data is not None else text
+
+    async def search(self, kind, terms, tiers, limit=5):
+        """
+        Full-text search a kind of content, in a worker thread.
+
+        Args:
+            kind: Content kind ("joke", "story", ...)
+            terms: Free text to search for
+            tiers: Tiers whose items may be returned
+            limit: Maximum number of results
+
+        Returns:
+            list: (category, index, item) tuples, best match first
+        """
+        expression = _match_expression(terms)
+        if expression is None or not tiers:
+            return []
+
+        return await asyncio.to_thread(self._search, kind, expression, tuple(tiers), limit)
+
+    def _search(self, kind, expression, tiers, limit):
+        """Rank every item matching an FTS5 expression by bm25 and return the best."""
+        if self._db is None:
+            self.open()
+
+        with self._search_lock:
+            if self._search_db is None:
+                self._search_db = self._open_connection()
+
+            rows = self._search_db.execute(
+                f"""
+                SELECT i.category, i.ordinal, i.text, i.data
+                FROM items_search
+                JOIN items i ON i.id = items_search.rowid
+                WHERE items_search MATCH ? AND i.kind = ? AND i.tier IN ({", ".join("?" * len(tiers))})
+                ORDER BY bm25(items_search), i.id
+                LIMIT ?
+                """,
+                (expression, kind, *tiers, limit)
+            ).fetchall()
+
+        return [
+            (category, index, json.loads(data) if data is not None else text)
+            for category, index, text, data in rows
+        ]
+
+def _match_expression(terms):
+    """
+    Turn free text into an FTS5 query matching any of its words.
+
+    Words are quoted so punctuation and FTS5 operators in user input are
+    taken literally; bm25 ranks items matching more (and rarer) words first.
+
+    Returns:
+        str: The MATCH expression, or None if the text has no words
+    """
+    words = re.findall(r"\w+", terms.lower())[:MAX_SEARCH_TERMS]
+    words = [word for word in words if word not in STOP_WORDS] or words
+    if not words:
+        return None
+    return " OR ".join(f'"{word}"' for word in dict.fromkeys(words))
+
+# Shared store for the bot's content, opened (and built if needed) at startup
+store = ContentStore(config.CONTENT_DB_PATH, config.CONTENT_SOURCE_PATH)
+
+def main():
+    parser = argparse.ArgumentParser(description="Build the entertainment content store.")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    build_parser = commands.add_parser("build", help="Build the SQLite content store from JSON")
+    build_parser.add_argument("source", nargs="?", default=config.CONTENT_SOURCE_PATH)
+    build_parser.add_argument("store", nargs="?", default=config.CONTENT_DB_PATH)
+
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+
+    total = build(args.source, args.store)
+    print(f"Wrote {total} items to {args.store}")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -5,18 +5,82 @@ This module handles all database operations for the Tainment+ Discord bot,
 including user subscription tracking and management.
 """
 
-import aiosqlite
+import asyncio
 import logging
 import os
-from datetime import datetime, timedelta
+import time
+import weakref
+from datetime import datetime
 
 import config
+import migrations
+from cache import LRUCache, MISSING
+from db_pool import ConnectionPool
+from query_stats import QueryStats
+from sketch import combine_usage, summarize_usage
+from usage_recorder import UsageRecorder
 
 logger = logging.getLogger("tainment_bot.database")
 
+# Active subscription per user ({"username", "subscription"}), invalidated on every change
+_entitlements = LRUCache(
+    max_entries=config.ENTITLEMENT_CACHE_SIZE,
+    ttl=config.ENTITLEMENT_CACHE_TTL
+)
+
+# Bumped on every invalidation so reads that raced a change don't re-cache stale rows
+_entitlement_generation = 0
+
+# Per-user locks serializing subscription changes for the same user
+_user_locks = weakref.WeakValueDictionary()
+
+# Subscription tiers ordered by access level
+TIER_LEVELS = {
+    "Basic": 0,
+    "Premium": 1,
+    "Pro": 2
+}
+
+# Per-query-site latency histograms and slow-query log for every pooled connection
+query_stats = QueryStats(
+    slow_query_ms=config.SLOW_QUERY_MS,
+    max_samples=config.QUERY_STATS_SAMPLES
+) if config.QUERY_STATS_ENABLED else None
+
+# Shared connection pool, opened by init_db() and closed by close_db()
+pool = ConnectionPool(
+    config.DB_PATH,
+    reader_size=config.DB_READER_POOL_SIZE,
+    analytics_size=config.DB_ANALYTICS_POOL_SIZE,
+    write_batch_size=config.DB_WRITE_BATCH_SIZE,
+    query_stats=query_stats
+)
+
+# Timestamps are stored as integer UTC epoch seconds
+SECONDS_PER_DAY = 86400
+
+# Days after a paid subscription ends before it is downgraded
+GRACE_PERIOD_DAYS = 3
+
+def now_epoch():
+    """Get the current time as integer UTC epoch seconds."""
+    return int(time.time())
+
+def day_start(timestamp):
+    """Get the epoch timestamp of the UTC midnight starting a timestamp's day."""
+    return timestamp - timestamp % SECONDS_PER_DAY
+
+def from_epoch(timestamp):
+    """Convert a stored epoch timestamp to a local datetime (None stays None)."""
+    return datetime.fromtimestamp(timestamp) if timestamp is not None else None
+
 async def init_db():
     """Initialize the database and create necessary tables if they don't exist."""
-    async with aiosqlite.connect(config.DB_PATH) as db:
+    await pool.open()
+    
+    async with pool.writer() as db:
+        # Base schema; later changes (indexes, epoch timestamps) are applied by migrations
+        
         # Create users table
         await db.execute('''
         CREATE TABLE IF NOT EXISTS users (
@@ -110,12 +174,21 @@ async def init_db():
         ''')
         
         await db.commit()
-        logger.info("Database initialized successfully")
+        
+        # Bring the schema up to date (indexes, later table changes)
+        schema_version = await migrations.apply_migrations(db)
+        logger.info(f"Database initialized successfully (schema version {schema_version})")
+    
+    usage_recorder.start()
+
+async def close_db():
+    """Flush buffered usage events and close the shared connection pool. Call once on shutdown."""
+    await usage_recorder.stop()
+    await pool.close()
 
 async def get_user(user_id):
     """Get user information from the database."""
-    async with aiosqlite.connect(config.DB_PATH) as db:
-        db.row_factory = aiosqlite.Row
+    async with pool.reader() as db:
         cursor = await db.execute(
             "SELECT * FROM users WHERE user_id = ?", 
             (user_id,)
@@ -124,7 +197,7 @@ async def get_user(user_id):
 
 async def add_user(user_id, username):
     """Add a new user to the database."""
-    async with aiosqlite.connect(config.DB_PATH) as db:
+    async with pool.transaction() as db:
         # Check if user already exists
         cursor = await db.execute(
             "SELECT user_id FROM users WHERE user_id = ?", 
@@ -137,18 +210,63 @@ async def add_user(user_id, username):
                 "INSERT INTO users (user_id, username) VALUES (?, ?)",
                 (user_id, username)
             )
-            await db.commit()
-            logger.info(f"Added new user: {username} (ID: {user_id})")
             
-            # Add default Basic subscription
-            await add_subscription(user_id, "Basic")
-            return True
-        return False
+            # Add default Basic subscription in the same transaction
+            await _insert_subscription(db, user_id, "Basic")
+        else:
+            return False
+    
+    invalidate_entitlements(user_id)
+    logger.info(f"Added new user: {username} (ID: {user_id})")
+    return True
+
+def invalidate_entitlements(*user_ids):
+    """Drop cached subscriptions for users whose subscription changed."""
+    global _entitlement_generation
+    _entitlement_generation += 1
+    _entitlements.invalidate_many(user_ids)
+
+def get_database_stats():
+    """Get connection pool, analytics queue and cache counters for monitoring."""
+    return {
+        "pool": pool.stats(),
+        "entitlement_cache": _entitlements.stats(),
+        "usage_events_pending": usage_recorder.pending
+    }
+
+def get_query_stats():
+    """
+    Get a snapshot of per-query latency statistics and recent slow queries.
+    
+    Returns:
+        dict: {"queries": {site: stats}, "slow_queries": [...]}, empty when instrumentation is off
+    """
+    if query_stats is None:
+        return {"queries": {}, "slow_queries": []}
+    return query_stats.snapshot()
+
+def get_entitlement_cache_stats():
+    """Get hit/miss counters for the entitlement cache."""
+    return _entitlements.stats()
+
+def _cache_entitlement(user_id, username, subscription, generation):
+    """Cache a subscription read, unless a change was committed while it was being read."""
+    if generation == _entitlement_generation:
+        _entitlements.set(user_id, {"username": username, "subscription": subscription})
 
 async def get_subscription(user_id):
-    """Get the current active subscription for a user."""
-    async with aiosqlite.connect(config.DB_PATH) as db:
-        db.row_factory = aiosqlite.Row
+    """
+    Get the current active subscription for a user.
+    
+    Served from the entitlement cache when possible. The returned dict is
+    shared with the cache and must not be modified.
+    """
+    cached = _entitlements.get(user_id)
+    if cached is not MISSING:
+        return cached["subscription"]
+    
+    generation = _entitlement_generation
+    async with pool.reader() as db:
         cursor = await db.execute(
             """
             SELECT * FROM subscriptions 
@@ -157,69 +275,288 @@ async def get_subscription(user_id):
             """, 
             (user_id,)
         )
-        return await cursor.fetchone()
+        result = await cursor.fetchone()
+    
+    if not result:
+        return None
+    
+    subscription = dict(result)
+    _cache_entitlement(user_id, None, subscription, generation)
+    return subscription
 
-async def add_subscription(user_id, tier, duration_days=30, transaction_id=None, payment_method=None):
+def get_effective_tier(subscription):
     """
-    Add a new subscription for a user.
+    Get the tier a subscription currently grants.
+    
+    Paid subscriptions past their end date grant Basic access until they are
+    renewed or downgraded.
+    """
+    if not subscription:
+        return "Basic"
+    
+    if subscription["end_date"] and subscription["tier"] != "Basic":
+        if subscription["end_date"] < now_epoch():
+            return "Basic"
+    
+    return subscription["tier"]
+
+def has_tier_access(tier, feature_tier):
+    """Check whether a tier meets the minimum tier required for a feature."""
+    return TIER_LEVELS.get(tier, 0) >= TIER_LEVELS.get(feature_tier, 0)
+
+async def resolve_user_context(user_id, username):
+    """
+    Resolve everything a command needs to know about its user in one round trip.
+    
+    Known users are answered with a single read. New users (or users whose
+    username changed) are upserted together with a default Basic subscription
+    in one write transaction.
     
     Args:
         user_id: Discord user ID
-        tier: Subscription tier
-        duration_days: Duration in days
-        transaction_id: Optional transaction ID for payment tracking
-        payment_method: Optional payment method used
+        username: Current Discord username
         
     Returns:
-        bool: Whether the subscription was successfully added
+        dict: The user's ID, username, effective tier and active subscription (or None)
+    """
+    query = """
+        SELECT u.username AS current_username, s.*
+        FROM users u
+        LEFT JOIN subscriptions s ON s.id = (
+            SELECT id FROM subscriptions
+            WHERE user_id = u.user_id AND active = TRUE
+            ORDER BY end_date DESC LIMIT 1
+        )
+        WHERE u.user_id = ?
+    """
+    
+    cached = _entitlements.get(user_id)
+    if cached is not MISSING and cached["username"] == username:
+        subscription = cached["subscription"]
+        return {
+            "user_id": user_id,
+            "username": username,
+            "tier": get_effective_tier(subscription),
+            "subscription": subscription
+        }
+    
+    generation = _entitlement_generation
+    async with pool.reader() as db:
+        cursor = await db.execute(query, (user_id,))
+        row = await cursor.fetchone()
+    
+    if not row or row["id"] is None or row["current_username"] != username:
+        async with pool.transaction() as db:
+            await db.execute(
+                """
+                INSERT INTO users (user_id, username) VALUES (?, ?)
+                ON CONFLICT (user_id) DO UPDATE SET username = excluded.username
+                WHERE username != excluded.username
+                """,
+                (user_id, username)
+            )
+            
+            cursor = await db.execute(query, (user_id,))
+            row = await cursor.fetchone()
+            
+            if row["id"] is None:
+                await _insert_subscription(db, user_id, "Basic")
+                cursor = await db.execute(query, (user_id,))
+                row = await cursor.fetchone()
+                logger.info(f"Added new user: {username} (ID: {user_id})")
+        
+        invalidate_entitlements(user_id)
+        generation = _entitlement_generation
+    
+    subscription = dict(row)
+    del subscription["current_username"]
+    _cache_entitlement(user_id, username, subscription, generation)
+    
+    return {
+        "user_id": user_id,
+        "username": username,
+        "tier": get_effective_tier(subscription),
+        "subscription": subscription
+    }
+
+def _user_lock(user_id):
+    """Get the lock serializing subscription changes for a user."""
+    lock = _user_locks.get(user_id)
+    if lock is None:
+        lock = asyncio.Lock()
+        _user_locks[user_id] = lock
+    return lock
+
+async def _insert_subscription(db, user_id, tier, duration_days=30, transaction_id=None, payment_method=None):
+    """
+    Deactivate a user's current subscription and insert a new one on an open connection.
+    
+    Returns:
+        str: The tier of the replaced subscription ("None" if there was none)
     """
     # Calculate end date
     end_date = None
     grace_period_end = None
     
     if tier != "Basic":  # Basic tier doesn't expire
-        end_date = (datetime.now() + timedelta(days=duration_days)).isoformat()
+        end_date = now_epoch() + duration_days * SECONDS_PER_DAY
         # Grace period is 3 days after subscription ends
-        grace_period_end = (datetime.now() + timedelta(days=duration_days + 3)).isoformat()
+        grace_period_end = end_date + GRACE_PERIOD_DAYS * SECONDS_PER_DAY
     
-    async with aiosqlite.connect(config.DB_PATH) as db:
-        # Deactivate any existing subscriptions
-        await db.execute(
-            "UPDATE subscriptions SET active = FALSE WHERE user_id = ? AND active = TRUE",
-            (user_id,)
+    # Look up the subscription being replaced
+    cursor = await db.execute(
+        """
+        SELECT tier FROM subscriptions
+        WHERE user_id = ? AND active = TRUE
+        ORDER BY end_date DESC LIMIT 1
+        """,
+        (user_id,)
+    )
+    current = await cursor.fetchone()
+    
+    # Keep the active-per-tier counters in step
+    if current:
+        await _adjust_tier_count(db, current["tier"], -1)
+    await _adjust_tier_count(db, tier, 1)
+    
+    # Deactivate any existing subscriptions
+    await db.execute(
+        "UPDATE subscriptions SET active = FALSE WHERE user_id = ? AND active = TRUE",
+        (user_id,)
+    )
+    
+    # Add new subscription
+    await db.execute(
+        """
+        INSERT INTO subscriptions (
+            user_id, tier, end_date, active, 
+            transaction_id, payment_method, grace_period_end
         )
+        VALUES (?, ?, ?, TRUE, ?, ?, ?)
+        """,
+        (user_id, tier, end_date, transaction_id, payment_method, grace_period_end)
+    )
+    
+    # If there's a transaction ID, log the payment transaction
+    if transaction_id and tier != "Basic":
+        # Get the price for this tier
+        price = config.SUBSCRIPTION_TIERS[tier]["price"] * (duration_days / 30)
         
-        # Add new subscription
         await db.execute(
             """
-            INSERT INTO subscriptions (
-                user_id, tier, end_date, active, 
-                transaction_id, payment_method, grace_period_end
+            INSERT INTO payment_transactions (
+                transaction_id, user_id, amount, status, 
+                tier, duration_days, completed_at
             )
-            VALUES (?, ?, ?, TRUE, ?, ?, ?)
+            VALUES (?, ?, ?, 'completed', ?, ?, ?)
             """,
-            (user_id, tier, end_date, transaction_id, payment_method, grace_period_end)
+            (transaction_id, user_id, price, tier, duration_days, now_epoch())
+        )
+    
+    return current["tier"] if current else "None"
+
+async def _adjust_tier_count(db, tier, delta):
+    """Add delta to a tier's active subscription counter on an open connection."""
+    await db.execute(
+        """
+        INSERT INTO subscription_tier_counts (tier, count) VALUES (?, ?)
+        ON CONFLICT (tier) DO UPDATE SET count = count + excluded.count
+        """,
+        (tier, delta)
+    )
+
+async def _count_change(db, kind, count=1):
+    """Add to today's counter for a kind of subscription change on an open connection."""
+    await db.execute(
+        """
+        INSERT INTO subscription_daily_metrics (day, kind, count) VALUES (?, ?, ?)
+        ON CONFLICT (day, kind) DO UPDATE SET count = count + excluded.count
+        """,
+        (day_start(now_epoch()), kind, count)
+    )
+
+def get_change_kind(previous_tier, new_tier):
+    """
+    Classify a subscription change.
+    
+    Returns:
+        str: "new", "renewal", "upgrade" or "downgrade" (expirations are recorded explicitly)
+    """
+    if previous_tier == "None":
+        return "new"
+    if previous_tier == new_tier:
+        return "renewal"
+    if TIER_LEVELS.get(new_tier, 0) > TIER_LEVELS.get(previous_tier, 0):
+        return "upgrade"
+    return "downgrade"
+
+async def _insert_history(db, user_id, previous_tier, new_tier, admin_id=None, reason=None, change_kind=None):
+    """Insert a subscription_history row and count the change on an open connection."""
+    change_kind = change_kind or get_change_kind(previous_tier, new_tier)
+    
+    await db.execute(
+        """
+        INSERT INTO subscription_history (
+            user_id, previous_tier, new_tier, admin_id, reason, change_kind
         )
+        VALUES (?, ?, ?, ?, ?, ?)
+        """,
+        (user_id, previous_tier, new_tier, admin_id, reason, change_kind)
+    )
+    await _count_change(db, change_kind)
+
+async def add_subscription(user_id, tier, duration_days=30, transaction_id=None, payment_method=None):
+    """
+    Add a new subscription for a user.
+    
+    Args:
+        user_id: Discord user ID
+        tier: Subscription tier
+        duration_days: Duration in days
+        transaction_id: Optional transaction ID for payment tracking
+        payment_method: Optional payment method used
         
-        # If there's a transaction ID, log the payment transaction
-        if transaction_id and tier != "Basic":
-            # Get the price for this tier
-            price = config.SUBSCRIPTION_TIERS[tier]["price"] * (duration_days / 30)
-            
-            await db.execute(
-                """
-                INSERT INTO payment_transactions (
-                    transaction_id, user_id, amount, status, 
-                    tier, duration_days, completed_at
-                )
-                VALUES (?, ?, ?, 'completed', ?, ?, CURRENT_TIMESTAMP)
-                """,
-                (transaction_id, user_id, price, tier, duration_days)
-            )
+    Returns:
+        bool: Whether the subscription was successfully added
+    """
+    async with _user_lock(user_id):
+        async with pool.transaction() as db:
+            await _insert_subscription(db, user_id, tier, duration_days, transaction_id, payment_method)
+        invalidate_entitlements(user_id)
+    
+    logger.info(f"Added {tier} subscription for user ID: {user_id}")
+    return True
+
+async def change_subscription(user_id, new_tier, duration_days=30, transaction_id=None, payment_method=None, admin_id=None, reason=None):
+    """
+    Atomically move a user to a new subscription.
+    
+    Deactivating the current subscription, inserting the new one, recording
+    the payment and writing the history entry all happen in one
+    BEGIN IMMEDIATE transaction. Changes for the same user are serialized.
+    
+    Args:
+        user_id: Discord user ID
+        new_tier: New subscription tier
+        duration_days: Duration in days
+        transaction_id: Optional transaction ID for payment tracking
+        payment_method: Optional payment method used
+        admin_id: Optional admin user ID if this was an admin action
+        reason: Optional reason for the change
         
-        await db.commit()
-        logger.info(f"Added {tier} subscription for user ID: {user_id}")
-        return True
+    Returns:
+        str: The previous tier ("None" if the user had no subscription)
+    """
+    async with _user_lock(user_id):
+        async with pool.transaction() as db:
+            previous_tier = await _insert_subscription(
+                db, user_id, new_tier, duration_days, transaction_id, payment_method
+            )
+            await _insert_history(db, user_id, previous_tier, new_tier, admin_id, reason)
+        invalidate_entitlements(user_id)
+    
+    logger.info(f"Changed subscription for user {user_id}: {previous_tier} -> {new_tier}")
+    return previous_tier
 
 async def update_subscription(user_id, new_tier, duration_days=30, transaction_id=None, payment_method=None, admin_id=None, reason=None):
     """
@@ -237,28 +574,36 @@ async def update_subscription(user_id, new_tier, duration_days=30, transaction_i
     Returns:
         bool: Whether the subscription was successfully updated
     """
-    # Get current subscription
-    current_subscription = await get_subscription(user_id)
-    previous_tier = current_subscription["tier"] if current_subscription else "None"
-    
-    # Add new subscription
-    success = await add_subscription(user_id, new_tier, duration_days, transaction_id, payment_method)
-    
-    if success:
-        # Log subscription history
-        await log_subscription_change(user_id, previous_tier, new_tier, admin_id, reason)
-        return True
-    return False
+    await change_subscription(
+        user_id, new_tier, duration_days, transaction_id, payment_method, admin_id, reason
+    )
+    return True
 
 async def log_feature_usage(user_id, feature):
-    """Log usage of a feature by a user."""
-    async with aiosqlite.connect(config.DB_PATH) as db:
-        await db.execute(
-            "INSERT INTO usage_stats (user_id, feature) VALUES (?, ?)",
-            (user_id, feature)
+    """
+    Log usage of a feature by a user.
+    
+    The event is buffered and written in a batch by the usage recorder,
+    so this only waits if the buffer is full.
+    """
+    await usage_recorder.record(user_id, feature)
+    return True
+
+async def _write_usage_events(events):
+    """Insert a batch of (user_id, feature, used_at) usage events in one transaction."""
+    async with pool.transaction() as db:
+        await db.executemany(
+            "INSERT INTO usage_stats (user_id, feature, used_at) VALUES (?, ?, ?)",
+            events
         )
-        await db.commit()
-        return True
+
+# Write-behind buffer for feature usage events, flushed in batches
+usage_recorder = UsageRecorder(
+    _write_usage_events,
+    flush_interval_ms=config.USAGE_FLUSH_INTERVAL_MS,
+    batch_size=config.USAGE_FLUSH_BATCH_SIZE,
+    max_queue=config.USAGE_QUEUE_SIZE
+)
 
 async def check_subscription_access(user_id, feature_tier):
     """
@@ -271,37 +616,29 @@ async def check_subscription_access(user_id, feature_tier):
     Returns:
         bool: True if the user has access, False otherwise
     """
-    tier_levels = {
-        "Basic": 0,
-        "Premium": 1,
-        "Pro": 2
-    }
-    
     subscription = await get_subscription(user_id)
     if not subscription:
         # If no subscription found, add a Basic one
         await add_user(user_id, "Unknown")  # Username will be updated on first command
-        return tier_levels.get("Basic", 0) >= tier_levels.get(feature_tier, 0)
+        return has_tier_access("Basic", feature_tier)
     
     # Check if subscription is expired
-    if subscription["end_date"] and subscription["tier"] != "Basic":
-        end_date = datetime.fromisoformat(subscription["end_date"])
-        if end_date < datetime.now():
-            # Subscription expired, downgrade to Basic
-            await add_subscription(user_id, "Basic")
-            return tier_levels.get("Basic", 0) >= tier_levels.get(feature_tier, 0)
+    if get_effective_tier(subscription) != subscription["tier"]:
+        # Subscription expired, downgrade to Basic
+        await add_subscription(user_id, "Basic")
+        return has_tier_access("Basic", feature_tier)
     
     # Check if user's tier level is sufficient
-    user_tier_level = tier_levels.get(subscription["tier"], 0)
-    required_tier_level = tier_levels.get(feature_tier, 0)
-    
-    return user_tier_level >= required_tier_level
+    return has_tier_access(subscription["tier"], feature_tier)
 
 async def update_game_score(user_id, game_name, score):
     """
     Update a user's score for a specific game.
     Only updates if the new score is higher than their previous best.
     
+    The best score is kept in best_scores with a single upsert-if-greater;
+    improved scores are also appended to the game_scores history.
+    
     Args:
         user_id: The Discord user ID
         game_name: The name of the game
@@ -310,22 +647,24 @@ async def update_game_score(user_id, game_name, score):
     Returns:
         tuple: (bool, int) - Whether the score was updated and the user's best score
     """
-    # Get the user's current best score
-    async with aiosqlite.connect(config.DB_PATH) as db:
-        db.row_factory = aiosqlite.Row
-        cursor = await db.execute(
-            """
-            SELECT MAX(score) as best_score
-            FROM game_scores
-            WHERE user_id = ? AND game_name = ?
-            """,
-            (user_id, game_name)
-        )
-        result = await cursor.fetchone()
-        best_score = result['best_score'] if result and result['best_score'] is not None else 0
+    async with pool.transaction() as db:
+        improved = False
         
-        # Only update if the new score is higher
-        if score > best_score:
+        # Scores must beat the implicit starting best of 0
+        if score > 0:
+            cursor = await db.execute(
+                """
+                INSERT INTO best_scores (game_name, user_id, best_score, achieved_at)
+                VALUES (?, ?, ?, ?)
+                ON CONFLICT (game_name, user_id) DO UPDATE
+                SET best_score = excluded.best_score, achieved_at = excluded.achieved_at
+                WHERE excluded.best_score > best_scores.best_score
+                """,
+                (game_name, user_id, score, now_epoch())
+            )
+            improved = cursor.rowcount > 0
+        
+        if improved:
             await db.execute(
                 """
                 INSERT INTO game_scores (user_id, game_name, score)
@@ -333,11 +672,70 @@ async def update_game_score(user_id, game_name, score):
                 """,
                 (user_id, game_name, score)
             )
-            await db.commit()
-            logger.info(f"Updated score for user {user_id} in game {game_name}: {score}")
-            return True, score
+        else:
+            cursor = await db.execute(
+                """
+                SELECT best_score FROM best_scores
+                WHERE game_name = ? AND user_id = ?
+                """,
+                (game_name, user_id)
+            )
+            result = await cursor.fetchone()
+            best_score = result['best_score'] if result else 0
+    
+    if improved:
+        logger.info(f"Updated score for user {user_id} in game {game_name}: {score}")
+        return True, score
+    
+    return False, best_score
+
+async def get_user_best_score(user_id, game_name):
+    """Get a user's best score for a specific game (0 if they have none)."""
+    async with pool.reader() as db:
+        cursor = await db.execute(
+            """
+            SELECT best_score FROM best_scores
+            WHERE game_name = ? AND user_id = ?
+            """,
+            (game_name, user_id)
+        )
+        result = await cursor.fetchone()
+        return result['best_score'] if result else 0
+
+async def get_user_game_standing(user_id, game_name):
+    """
+    Get a user's rank and best score for a specific game in one query.
+    
+    The rank is one plus the number of players with a strictly better best
+    score, so players with equal scores share a rank.
+    
+    Args:
+        user_id: The Discord user ID
+        game_name: The name of the game
+        
+    Returns:
+        tuple: (int, int) - The user's rank (0 if not on leaderboard) and best score
+    """
+    async with pool.reader() as db:
+        cursor = await db.execute(
+            """
+            SELECT b.best_score AS best_score,
+                   (
+                       SELECT COUNT(*)
+                       FROM best_scores
+                       WHERE game_name = b.game_name AND best_score > b.best_score
+                   ) + 1 AS rank
+            FROM best_scores b
+            WHERE b.game_name = ? AND b.user_id = ?
+            """,
+            (game_name, user_id)
+        )
+        result = await cursor.fetchone()
         
-        return False, best_score
+        if not result:
+            return 0, 0
+        
+        return result['rank'], result['best_score']
 
 async def get_leaderboard(game_name, limit=10):
     """
@@ -350,15 +748,13 @@ async def get_leaderboard(game_name, limit=10):
     Returns:
         list: List of tuples (user_id, score) sorted by score (highest first)
     """
-    async with aiosqlite.connect(config.DB_PATH) as db:
-        db.row_factory = aiosqlite.Row
+    async with pool.reader() as db:
         cursor = await db.execute(
             """
-            SELECT user_id, MAX(score) as best_score
-            FROM game_scores
+            SELECT user_id, best_score
+            FROM best_scores
             WHERE game_name = ?
-            GROUP BY user_id
-            ORDER BY best_score DESC
+            ORDER BY best_score DESC, achieved_at ASC
             LIMIT ?
             """,
             (game_name, limit)
@@ -368,12 +764,11 @@ async def get_leaderboard(game_name, limit=10):
 
 async def get_available_games():
     """Get a list of all games that have scores recorded."""
-    async with aiosqlite.connect(config.DB_PATH) as db:
-        db.row_factory = aiosqlite.Row
+    async with pool.reader() as db:
         cursor = await db.execute(
             """
             SELECT DISTINCT game_name
-            FROM game_scores
+            FROM best_scores
             ORDER BY game_name
             """
         )
@@ -382,9 +777,8 @@ async def get_available_games():
 
 async def update_story_progress(user_id, story_name, part):
     """Update a user's progress in a multi-part story."""
-    async with aiosqlite.connect(config.DB_PATH) as db:
+    async with pool.transaction() as db:
         # Check if progress record exists
-        db.row_factory = aiosqlite.Row
         cursor = await db.execute(
             """
             SELECT id FROM story_progress
@@ -399,28 +793,26 @@ async def update_story_progress(user_id, story_name, part):
             await db.execute(
                 """
                 UPDATE story_progress
-                SET current_part = ?, last_read = CURRENT_TIMESTAMP
+                SET current_part = ?, last_read = ?
                 WHERE user_id = ? AND story_name = ?
                 """,
-                (part, user_id, story_name)
+                (part, now_epoch(), user_id, story_name)
             )
         else:
             # Create new record
             await db.execute(
                 """
-                INSERT INTO story_progress (user_id, story_name, current_part)
-                VALUES (?, ?, ?)
+                INSERT INTO story_progress (user_id, story_name, current_part, last_read)
+                VALUES (?, ?, ?, ?)
                 """,
-                (user_id, story_name, part)
+                (user_id, story_name, part, now_epoch())
             )
-        
-        await db.commit()
-        return True
+    
+    return True
 
 async def get_story_progress(user_id, story_name):
     """Get a user's progress in a multi-part story."""
-    async with aiosqlite.connect(config.DB_PATH) as db:
-        db.row_factory = aiosqlite.Row
+    async with pool.reader() as db:
         cursor = await db.execute(
             """
             SELECT current_part, last_read
@@ -442,64 +834,210 @@ async def get_story_progress(user_id, story_name):
                 "last_read": None
             }
 
-async def get_feature_usage_stats(feature=None, days=30):
+async def get_content_seen(user_id, kind, category):
     """
-    Get usage statistics for features.
+    Get the bitset of content a user has already been shown in a category.
+    
+    Returns:
+        bytes: Seen bitset (bit i set = item i shown), or None if nothing recorded
+    """
+    async with pool.reader() as db:
+        cursor = await db.execute(
+            """
+            SELECT seen FROM content_seen
+            WHERE user_id = ? AND kind = ? AND category = ?
+            """,
+            (user_id, kind, category)
+        )
+        result = await cursor.fetchone()
+        return bytes(result["seen"]) if result else None
+
+async def get_all_content_seen(user_id, kind):
+    """
+    Get a user's seen-content bitsets for every category of a kind, in one query.
+    
+    Returns:
+        dict: {category: seen bitset}, only for categories with something recorded
+    """
+    async with pool.reader() as db:
+        cursor = await db.execute(
+            """
+            SELECT category, seen FROM content_seen
+            WHERE user_id = ? AND kind = ?
+            """,
+            (user_id, kind)
+        )
+        return {row["category"]: bytes(row["seen"]) for row in await cursor.fetchall()}
+
+async def save_content_seen(entries):
+    """
+    Save seen-content bitsets in one transaction.
     
     Args:
-        feature: Optional specific feature to get stats for
-        days: Number of days to look back
-        
+        entries: List of (user_id, kind, category, seen) tuples, seen being bytes
+    """
+    if not entries:
+        return
+    
+    updated_at = now_epoch()
+    async with pool.transaction() as db:
+        await db.executemany(
+            """
+            INSERT INTO content_seen (user_id, kind, category, seen, updated_at)
+            VALUES (?, ?, ?, ?, ?)
+            ON CONFLICT (user_id, kind, category) DO UPDATE
+            SET seen = excluded.seen, updated_at = excluded.updated_at
+            """,
+            [(user_id, kind, category, seen, updated_at) for user_id, kind, category, seen in entries]
+        )
+
+async def _get_state(db, name):
+    """Get a maintenance_state value on an open connection (None if unset)."""
+    cursor = await db.execute(
+        "SELECT value FROM maintenance_state WHERE name = ?",
+        (name,)
+    )
+    result = await cursor.fetchone()
+    return result["value"] if result else None
+
+async def _set_state(db, name, value):
+    """Set a maintenance_state value on an open connection."""
+    await db.execute(
+        """
+        INSERT INTO maintenance_state (name, value) VALUES (?, ?)
+        ON CONFLICT (name) DO UPDATE SET value = excluded.value
+        """,
+        (name, value)
+    )
+
+async def get_maintenance_state(name):
+    """Get a background job's progress marker (None if unset)."""
+    async with pool.reader() as db:
+        return await _get_state(db, name)
+
+async def rollup_usage_stats():
+    """
+    Aggregate raw usage events of completed days into the daily rollup tables.
+    
+    Days are rolled up one per transaction, starting from the last rolled-up
+    day. A day is only rolled up once it ended config.USAGE_ROLLUP_DELAY
+    seconds ago, so buffered events still being flushed aren't missed.
+    
     Returns:
-        dict: Dictionary with feature usage counts
+        int: Number of days rolled up
     """
-    start_date = (datetime.now() - timedelta(days=days)).isoformat()
+    cutoff = day_start(now_epoch() - config.USAGE_ROLLUP_DELAY)
+    days_rolled_up = 0
     
-    async with aiosqlite.connect(config.DB_PATH) as db:
-        db.row_factory = aiosqlite.Row
-        
-        if feature:
-            # Get stats for a specific feature
+    while True:
+        async with pool.transaction() as db:
+            day = await _get_state(db, "usage_rolled_up_to")
+            
+            if day is None:
+                # First run: start from the day of the oldest event
+                cursor = await db.execute("SELECT MIN(used_at) AS first_used FROM usage_stats")
+                first_used = (await cursor.fetchone())["first_used"]
+                day = day_start(first_used) if first_used is not None else cutoff
+            
+            if day >= cutoff:
+                await _set_state(db, "usage_rolled_up_to", day)
+                break
+            
+            next_day = day + SECONDS_PER_DAY
             cursor = await db.execute(
                 """
-                SELECT COUNT(*) as count, 
-                       COUNT(DISTINCT user_id) as unique_users
+                SELECT feature, user_id, COUNT(*) AS uses
                 FROM usage_stats
-                WHERE feature = ? AND used_at >= ?
+                WHERE used_at >= ? AND used_at < ?
+                GROUP BY feature, user_id
                 """,
-                (feature, start_date)
+                (day, next_day)
             )
-            result = await cursor.fetchone()
-            
-            return {
-                "feature": feature,
-                "count": result["count"],
-                "unique_users": result["unique_users"]
-            }
-        else:
-            # Get stats for all features
-            cursor = await db.execute(
+            totals = summarize_usage(await cursor.fetchall())
+            await db.executemany(
                 """
-                SELECT feature, 
-                       COUNT(*) as count, 
-                       COUNT(DISTINCT user_id) as unique_users
-                FROM usage_stats
-                WHERE used_at >= ?
-                GROUP BY feature
-                ORDER BY count DESC
+                INSERT OR REPLACE INTO usage_daily (feature, day, count, unique_users, users_sketch)
+                VALUES (?, ?, ?, ?, ?)
                 """,
-                (start_date,)
+                [
+                    (feature, day, count, users, sketch.to_bytes())
+                    for feature, (count, users, sketch) in totals.items()
+                ]
             )
-            results = await cursor.fetchall()
-            
-            return {
-                row["feature"]: {
-                    "count": row["count"],
-                    "unique_users": row["unique_users"]
-                } for row in results
-            }
-
+            await _set_state(db, "usage_rolled_up_to", next_day)
+        
+        days_rolled_up += 1
+        
+        # Let queued interactive writes through before the next day
+        await asyncio.sleep(0)
+    
+    if days_rolled_up:
+        logger.info(f"Rolled up {days_rolled_up} days of usage stats")
+    
+    return days_rolled_up
 
+async def get_feature_usage_stats(feature=None, days=30):
+    """
+    Get usage statistics for features.
+    
+    Days that have been rolled up are read from the daily rollup table;
+    only events newer than the last rollup are read from usage_stats. The
+    window starts at the UTC midnight on or before `days` days ago.
+    
+    Unique users across days are merged from each day's user sketch, so the
+    cost grows with the number of days, not users, and stays accurate for
+    any window (within about 1.6% for large counts).
+    
+    Args:
+        feature: Optional specific feature to get stats for
+        days: Number of days to look back
+        
+    Returns:
+        dict: Dictionary with feature usage counts
+    """
+    start_day = day_start(now_epoch() - days * SECONDS_PER_DAY)
+    
+    async with pool.analytics() as db:
+        rolled_up_to = await _get_state(db, "usage_rolled_up_to")
+        raw_start = max(start_day, rolled_up_to or start_day)
+        
+        feature_filter = "AND feature = ?" if feature else ""
+        feature_params = (feature,) if feature else ()
+        
+        cursor = await db.execute(
+            f"""
+            SELECT feature, count, users_sketch
+            FROM usage_daily
+            WHERE day >= ? AND day < ? {feature_filter}
+            """,
+            (start_day, raw_start) + feature_params
+        )
+        daily_rows = await cursor.fetchall()
+        
+        cursor = await db.execute(
+            f"""
+            SELECT feature, user_id, COUNT(*) AS uses
+            FROM usage_stats
+            WHERE used_at >= ? {feature_filter}
+            GROUP BY feature, user_id
+            """,
+            (raw_start,) + feature_params
+        )
+        raw_rows = await cursor.fetchall()
+    
+    stats = combine_usage(daily_rows, raw_rows)
+    
+    if feature:
+        # Get stats for a specific feature
+        result = stats.get(feature)
+        return {
+            "feature": feature,
+            "count": result["count"] if result else 0,
+            "unique_users": result["unique_users"] if result else 0
+        }
+    
+    # Get stats for all features
+    return stats
 
 async def log_subscription_change(user_id, previous_tier, new_tier, admin_id=None, reason=None):
     """
@@ -515,19 +1053,11 @@ async def log_subscription_change(user_id, previous_tier, new_tier, admin_id=Non
     Returns:
         bool: Whether the history was successfully logged
     """
-    async with aiosqlite.connect(config.DB_PATH) as db:
-        await db.execute(
-            """
-            INSERT INTO subscription_history (
-                user_id, previous_tier, new_tier, admin_id, reason
-            )
-            VALUES (?, ?, ?, ?, ?)
-            """,
-            (user_id, previous_tier, new_tier, admin_id, reason)
-        )
-        await db.commit()
-        logger.info(f"Logged subscription change for user {user_id}: {previous_tier} -> {new_tier}")
-        return True
+    async with pool.transaction() as db:
+        await _insert_history(db, user_id, previous_tier, new_tier, admin_id, reason)
+    
+    logger.info(f"Logged subscription change for user {user_id}: {previous_tier} -> {new_tier}")
+    return True
 
 async def get_subscription_history(user_id, limit=10):
     """
@@ -540,8 +1070,7 @@ async def get_subscription_history(user_id, limit=10):
     Returns:
         list: List of subscription history entries
     """
-    async with aiosqlite.connect(config.DB_PATH) as db:
-        db.row_factory = aiosqlite.Row
+    async with pool.reader() as db:
         cursor = await db.execute(
             """
             SELECT * FROM subscription_history
@@ -564,10 +1093,10 @@ async def check_expiring_subscriptions(days_threshold=3):
     Returns:
         list: List of subscriptions about to expire
     """
-    threshold_date = (datetime.now() + timedelta(days=days_threshold)).isoformat()
+    current_time = now_epoch()
+    threshold_date = current_time + days_threshold * SECONDS_PER_DAY
     
-    async with aiosqlite.connect(config.DB_PATH) as db:
-        db.row_factory = aiosqlite.Row
+    async with pool.reader() as db:
         cursor = await db.execute(
             """
             SELECT s.*, u.username
@@ -576,10 +1105,10 @@ async def check_expiring_subscriptions(days_threshold=3):
             WHERE s.active = TRUE
             AND s.tier != 'Basic'
             AND s.end_date <= ?
-            AND s.end_date > CURRENT_TIMESTAMP
+            AND s.end_date > ?
             AND s.renewal_reminder_sent = FALSE
             """,
-            (threshold_date,)
+            (threshold_date, current_time)
         )
         results = await cursor.fetchall()
         return [dict(row) for row in results]
@@ -594,7 +1123,7 @@ async def mark_renewal_reminder_sent(subscription_id):
     Returns:
         bool: Whether the update was successful
     """
-    async with aiosqlite.connect(config.DB_PATH) as db:
+    async with pool.transaction() as db:
         await db.execute(
             """
             UPDATE subscriptions
@@ -603,8 +1132,8 @@ async def mark_renewal_reminder_sent(subscription_id):
             """,
             (subscription_id,)
         )
-        await db.commit()
-        return True
+    
+    return True
 
 async def check_expired_subscriptions():
     """
@@ -613,10 +1142,9 @@ async def check_expired_subscriptions():
     Returns:
         list: List of expired subscriptions within grace period
     """
-    current_time = datetime.now().isoformat()
+    current_time = now_epoch()
     
-    async with aiosqlite.connect(config.DB_PATH) as db:
-        db.row_factory = aiosqlite.Row
+    async with pool.reader() as db:
         cursor = await db.execute(
             """
             SELECT s.*, u.username
@@ -640,10 +1168,9 @@ async def check_grace_period_expired_subscriptions():
     Returns:
         list: List of subscriptions with expired grace periods
     """
-    current_time = datetime.now().isoformat()
+    current_time = now_epoch()
     
-    async with aiosqlite.connect(config.DB_PATH) as db:
-        db.row_factory = aiosqlite.Row
+    async with pool.reader() as db:
         cursor = await db.execute(
             """
             SELECT s.*, u.username
@@ -658,28 +1185,100 @@ async def check_grace_period_expired_subscriptions():
         results = await cursor.fetchall()
         return [dict(row) for row in results]
 
-async def downgrade_expired_subscriptions():
+async def downgrade_expired_subscriptions(chunk_size=None):
     """
     Downgrade subscriptions that have expired beyond the grace period to Basic tier.
     
+    Expired subscriptions are handled in chunks with a few set-based
+    statements per chunk, each chunk in its own short transaction so
+    interactive writes can run in between.
+    
+    Args:
+        chunk_size: Maximum subscriptions per transaction (defaults to config.DOWNGRADE_CHUNK_SIZE)
+    
     Returns:
-        int: Number of subscriptions downgraded
+        list: IDs of the users that were downgraded
     """
-    expired_subscriptions = await check_grace_period_expired_subscriptions()
-    count = 0
+    chunk_size = chunk_size or config.DOWNGRADE_CHUNK_SIZE
+    current_time = now_epoch()
+    reason = "Subscription expired beyond grace period"
+    downgraded_user_ids = []
     
-    for subscription in expired_subscriptions:
-        # Downgrade to Basic
-        success = await update_subscription(
-            subscription["user_id"],
-            "Basic",
-            reason="Subscription expired beyond grace period"
-        )
+    while True:
+        async with pool.transaction() as db:
+            # Pick the next chunk of expired subscriptions
+            await db.execute(
+                """
+                CREATE TEMP TABLE IF NOT EXISTS expired_chunk (
+                    id INTEGER PRIMARY KEY,
+                    user_id INTEGER NOT NULL,
+                    tier TEXT NOT NULL
+                )
+                """
+            )
+            await db.execute("DELETE FROM expired_chunk")
+            await db.execute(
+                """
+                INSERT INTO expired_chunk (id, user_id, tier)
+                SELECT id, user_id, tier
+                FROM subscriptions
+                WHERE active = TRUE
+                AND tier != 'Basic'
+                AND grace_period_end < ?
+                LIMIT ?
+                """,
+                (current_time, chunk_size)
+            )
+            
+            cursor = await db.execute("SELECT user_id FROM expired_chunk")
+            user_ids = [row["user_id"] for row in await cursor.fetchall()]
+            
+            if user_ids:
+                await db.execute(
+                    """
+                    UPDATE subscriptions SET active = FALSE
+                    WHERE id IN (SELECT id FROM expired_chunk)
+                    """
+                )
+                await db.execute(
+                    """
+                    INSERT INTO subscriptions (user_id, tier, active)
+                    SELECT user_id, 'Basic', TRUE FROM expired_chunk
+                    """
+                )
+                await db.execute(
+                    """
+                    INSERT INTO subscription_history (user_id, previous_tier, new_tier, reason, change_kind)
+                    SELECT user_id, tier, 'Basic', ?, 'expiration' FROM expired_chunk
+                    """,
+                    (reason,)
+                )
+                
+                # Keep the metrics counters in step
+                await db.execute(
+                    """
+                    INSERT INTO subscription_tier_counts (tier, count)
+                    SELECT tier, -COUNT(*) FROM expired_chunk WHERE TRUE GROUP BY tier
+                    ON CONFLICT (tier) DO UPDATE SET count = count + excluded.count
+                    """
+                )
+                await _adjust_tier_count(db, "Basic", len(user_ids))
+                await _count_change(db, "expiration", len(user_ids))
+        
+        if not user_ids:
+            break
+        
+        invalidate_entitlements(*user_ids)
+        downgraded_user_ids.extend(user_ids)
+        logger.info(f"Downgraded {len(user_ids)} expired subscriptions to Basic")
         
-        if success:
-            count += 1
+        if len(user_ids) < chunk_size:
+            break
+        
+        # Let queued interactive writes through before the next chunk
+        await asyncio.sleep(0)
     
-    return count
+    return downgraded_user_ids
 
 async def extend_subscription(user_id, additional_days, admin_id=None, reason=None):
     """
@@ -694,43 +1293,65 @@ async def extend_subscription(user_id, additional_days, admin_id=None, reason=No
     Returns:
         bool: Whether the extension was successful
     """
-    # Get current subscription
-    subscription = await get_subscription(user_id)
+    async with _user_lock(user_id):
+        async with pool.transaction() as db:
+            # Read the current subscription inside the transaction it is updated in
+            cursor = await db.execute(
+                """
+                SELECT * FROM subscriptions
+                WHERE user_id = ? AND active = TRUE
+                ORDER BY end_date DESC LIMIT 1
+                """,
+                (user_id,)
+            )
+            subscription = await cursor.fetchone()
+            
+            if not subscription or subscription["tier"] == "Basic":
+                logger.warning(f"Cannot extend Basic subscription for user {user_id}")
+                return False
+            
+            # Calculate new end date
+            new_end_date = subscription["end_date"] + additional_days * SECONDS_PER_DAY
+            new_grace_period_end = new_end_date + GRACE_PERIOD_DAYS * SECONDS_PER_DAY
+            
+            await db.execute(
+                """
+                UPDATE subscriptions
+                SET end_date = ?, grace_period_end = ?
+                WHERE id = ?
+                """,
+                (new_end_date, new_grace_period_end, subscription["id"])
+            )
+            
+            # Log the extension in history
+            await _insert_history(
+                db, user_id, subscription["tier"], subscription["tier"], admin_id,
+                reason or f"Extended subscription by {additional_days} days"
+            )
+        
+        invalidate_entitlements(user_id)
     
-    if not subscription or subscription["tier"] == "Basic":
-        logger.warning(f"Cannot extend Basic subscription for user {user_id}")
-        return False
+    logger.info(f"Extended subscription for user {user_id} by {additional_days} days")
+    return True
+
+def _subscriber_query(columns, tier=None, active_only=True):
+    """Build the subscriber listing query and its parameters."""
+    query = f"""
+        SELECT {columns}
+        FROM subscriptions s
+        JOIN users u ON s.user_id = u.user_id
+        WHERE 1=1
+    """
+    params = []
     
-    # Calculate new end date
-    current_end_date = datetime.fromisoformat(subscription["end_date"])
-    new_end_date = (current_end_date + timedelta(days=additional_days)).isoformat()
-    new_grace_period_end = (current_end_date + timedelta(days=additional_days + 3)).isoformat()
+    if active_only:
+        query += " AND s.active = TRUE"
     
-    async with aiosqlite.connect(config.DB_PATH) as db:
-        await db.execute(
-            """
-            UPDATE subscriptions
-            SET end_date = ?, grace_period_end = ?
-            WHERE id = ?
-            """,
-            (new_end_date, new_grace_period_end, subscription["id"])
-        )
-        
-        # Log the extension in history
-        await db.execute(
-            """
-            INSERT INTO subscription_history (
-                user_id, previous_tier, new_tier, admin_id, reason
-            )
-            VALUES (?, ?, ?, ?, ?)
-            """,
-            (user_id, subscription["tier"], subscription["tier"], admin_id, 
-             reason or f"Extended subscription by {additional_days} days")
-        )
-        
-        await db.commit()
-        logger.info(f"Extended subscription for user {user_id} by {additional_days} days")
-        return True
+    if tier:
+        query += " AND s.tier = ?"
+        params.append(tier)
+    
+    return query, params
 
 async def get_all_subscribers(tier=None, active_only=True):
     """
@@ -743,103 +1364,145 @@ async def get_all_subscribers(tier=None, active_only=True):
     Returns:
         list: List of subscribers
     """
-    async with aiosqlite.connect(config.DB_PATH) as db:
-        db.row_factory = aiosqlite.Row
-        
-        query = """
-            SELECT s.*, u.username
-            FROM subscriptions s
-            JOIN users u ON s.user_id = u.user_id
-            WHERE 1=1
-        """
-        params = []
-        
-        if active_only:
-            query += " AND s.active = TRUE"
-        
-        if tier:
-            query += " AND s.tier = ?"
-            params.append(tier)
-        
-        query += " ORDER BY s.start_date DESC"
-        
+    query, params = _subscriber_query("s.*, u.username", tier, active_only)
+    query += " ORDER BY s.start_date DESC"
+    
+    async with pool.analytics() as db:
         cursor = await db.execute(query, params)
         results = await cursor.fetchall()
         return [dict(row) for row in results]
 
+async def count_subscribers(tier=None, active_only=True):
+    """Count subscribers, optionally filtered by tier."""
+    query, params = _subscriber_query("COUNT(*) AS count", tier, active_only)
+    
+    async with pool.analytics() as db:
+        cursor = await db.execute(query, params)
+        return (await cursor.fetchone())["count"]
+
+async def get_subscribers_page(tier=None, after=None, before=None, limit=10, active_only=True):
+    """
+    Get one page of subscribers, newest first, using keyset pagination.
+    
+    Pages are addressed by the (start_date, id) key of a neighbouring row, so
+    every page costs one indexed range read no matter how deep it is.
+    
+    Args:
+        tier: Optional tier to filter by
+        after: Key of the last row on the previous page, to fetch the page after it
+        before: Key of the first row on the next page, to fetch the page before it
+        limit: Number of subscribers per page
+        active_only: Whether to only include active subscriptions
+        
+    Returns:
+        tuple: (list, bool) - The page's subscribers and whether more exist past it
+            in the direction fetched
+    """
+    query, params = _subscriber_query("s.*, u.username", tier, active_only)
+    
+    if after is not None:
+        query += " AND (s.start_date, s.id) < (?, ?) ORDER BY s.start_date DESC, s.id DESC"
+        params.extend(after)
+    elif before is not None:
+        query += " AND (s.start_date, s.id) > (?, ?) ORDER BY s.start_date ASC, s.id ASC"
+        params.extend(before)
+    else:
+        query += " ORDER BY s.start_date DESC, s.id DESC"
+    
+    # One extra row tells us whether another page exists
+    query += " LIMIT ?"
+    params.append(limit + 1)
+    
+    async with pool.analytics() as db:
+        cursor = await db.execute(query, params)
+        rows = [dict(row) for row in await cursor.fetchall()]
+    
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    if before is not None:
+        rows.reverse()
+    
+    return rows, has_more
+
+async def iter_subscribers(tier=None, active_only=True, chunk_size=500):
+    """
+    Stream subscribers from a cursor in chunks, newest first.
+    
+    Only one chunk is held in memory at a time. An analytics connection is
+    borrowed until the iteration finishes, so consume it promptly.
+    
+    Args:
+        tier: Optional tier to filter by
+        active_only: Whether to only include active subscriptions
+        chunk_size: Number of rows fetched per chunk
+        
+    Yields:
+        list: Up to chunk_size subscriber dicts
+    """
+    query, params = _subscriber_query("s.*, u.username", tier, active_only)
+    query += " ORDER BY s.start_date DESC"
+    
+    async with pool.analytics() as db:
+        cursor = await db.execute(query, params)
+        try:
+            while True:
+                rows = await cursor.fetchmany(chunk_size)
+                if not rows:
+                    break
+                yield [dict(row) for row in rows]
+        finally:
+            await cursor.close()
+
 async def get_subscription_metrics(days=30):
     """
     Get subscription metrics for reporting.
     
+    Reads the counters maintained by each subscription change, so the cost
+    depends on the number of days rather than the number of subscriptions.
+    The window starts at the UTC midnight on or before `days` days ago.
+    
     Args:
         days: Number of days to look back for changes
         
     Returns:
         dict: Dictionary with subscription metrics
     """
-    start_date = (datetime.now() - timedelta(days=days)).isoformat()
+    start_day = day_start(now_epoch() - days * SECONDS_PER_DAY)
     
-    async with aiosqlite.connect(config.DB_PATH) as db:
-        db.row_factory = aiosqlite.Row
-        
+    async with pool.analytics() as db:
         # Get current subscriber counts by tier
         cursor = await db.execute(
             """
-            SELECT tier, COUNT(*) as count
-            FROM subscriptions
-            WHERE active = TRUE
-            GROUP BY tier
+            SELECT tier, count
+            FROM subscription_tier_counts
+            WHERE count > 0
+            ORDER BY tier
             """
         )
         tier_counts = {row["tier"]: row["count"] for row in await cursor.fetchall()}
         
-        # Get new subscriptions in the period
-        cursor = await db.execute(
-            """
-            SELECT COUNT(*) as count
-            FROM subscription_history
-            WHERE previous_tier = 'None'
-            AND changed_at >= ?
-            """,
-            (start_date,)
-        )
-        new_subscribers = (await cursor.fetchone())["count"]
-        
-        # Get upgrades in the period
-        cursor = await db.execute(
-            """
-            SELECT COUNT(*) as count
-            FROM subscription_history
-            WHERE previous_tier != new_tier
-            AND previous_tier != 'None'
-            AND changed_at >= ?
-            """,
-            (start_date,)
-        )
-        upgrades = (await cursor.fetchone())["count"]
-        
-        # Get downgrades in the period
+        # Get changes in the period by kind
         cursor = await db.execute(
             """
-            SELECT COUNT(*) as count
-            FROM subscription_history
-            WHERE previous_tier != 'Basic'
-            AND new_tier = 'Basic'
-            AND reason LIKE '%expired%'
-            AND changed_at >= ?
+            SELECT kind, SUM(count) as count
+            FROM subscription_daily_metrics
+            WHERE day >= ?
+            GROUP BY kind
             """,
-            (start_date,)
+            (start_day,)
         )
-        expirations = (await cursor.fetchone())["count"]
-        
-        return {
-            "subscribers_by_tier": tier_counts,
-            "total_subscribers": sum(tier_counts.values()),
-            "new_subscribers": new_subscribers,
-            "upgrades": upgrades,
-            "expirations": expirations,
-            "period_days": days
-        }
+        changes = {row["kind"]: row["count"] for row in await cursor.fetchall()}
+    
+    return {
+        "subscribers_by_tier": tier_counts,
+        "total_subscribers": sum(tier_counts.values()),
+        "new_subscribers": changes.get("new", 0),
+        "upgrades": changes.get("upgrade", 0),
+        "downgrades": changes.get("downgrade", 0),
+        "renewals": changes.get("renewal", 0),
+        "expirations": changes.get("expiration", 0),
+        "period_days": days
+    }
 
 async def record_payment_transaction(transaction_id, user_id, amount, status, tier, duration_days):
     """
@@ -856,24 +1519,24 @@ async def record_payment_transaction(transaction_id, user_id, amount, status, ti
     Returns:
         bool: Whether the transaction was successfully recorded
     """
-    async with aiosqlite.connect(config.DB_PATH) as db:
-        try:
+    try:
+        async with pool.transaction() as db:
             await db.execute(
                 """
                 INSERT INTO payment_transactions (
                     transaction_id, user_id, amount, status, 
                     tier, duration_days, completed_at
                 )
-                VALUES (?, ?, ?, ?, ?, ?, CURRENT_TIMESTAMP)
+                VALUES (?, ?, ?, ?, ?, ?, ?)
                 """,
-                (transaction_id, user_id, amount, status, tier, duration_days)
+                (transaction_id, user_id, amount, status, tier, duration_days, now_epoch())
             )
-            await db.commit()
-            logger.info(f"Recorded payment transaction: {transaction_id}")
-            return True
-        except Exception as e:
-            logger.error(f"Error recording payment transaction: {e}")
-            return False
+    except Exception as e:
+        logger.error(f"Error recording payment transaction: {e}")
+        return False
+    
+    logger.info(f"Recorded payment transaction: {transaction_id}")
+    return True
 
 async def get_user_payment_history(user_id, limit=10):
     """
@@ -886,8 +1549,7 @@ async def get_user_payment_history(user_id, limit=10):
     Returns:
         list: List of payment transactions
     """
-    async with aiosqlite.connect(config.DB_PATH) as db:
-        db.row_factory = aiosqlite.Row
+    async with pool.reader() as db:
         cursor = await db.execute(
             """
             SELECT *
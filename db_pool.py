@@ -0,0 +1,401 @@
+"""
+Tainment+ Discord Bot - Database Connection Pool
+
+This module provides a pool of long-lived SQLite connections that all database
+operations borrow from, instead of opening a new connection per call.
+It keeps a configurable number of reader connections and a small set of
+read-only analytics connections that long report scans run on, isolated from
+interactive commands. Every write goes through one writer task that owns the
+only write connection and commits queued transactions in groups.
+"""
+
+import asyncio
+import collections
+import logging
+import time
+from contextlib import asynccontextmanager
+from urllib.parse import quote
+
+import aiosqlite
+
+from query_stats import InstrumentedConnection
+
+logger = logging.getLogger("tainment_bot.db_pool")
+
+# Queue marker telling the writer task to finish queued writes and exit
+_STOP = object()
+
+class _WriteRequest:
+    """A caller waiting for the write connection."""
+
+    __slots__ = ("exclusive", "granted", "done", "committed")
+
+    def __init__(self, exclusive):
+        loop = asyncio.get_running_loop()
+        # Whether the caller gets the connection to itself, outside any group commit
+        self.exclusive = exclusive
+        # Resolved with the connection when it is the caller's turn
+        self.granted = loop.create_future()
+        # Resolved by the caller: True if its block succeeded
+        self.done = loop.create_future()
+        # Resolved once the group commit containing the caller's writes lands
+        self.committed = loop.create_future()
+
+def _fail(future, error):
+    """Fail a future unless it is already resolved."""
+    if not future.done():
+        future.set_exception(error)
+
+class ConnectionPool:
+    """A pool of reader connections, analytics connections and one writer task."""
+
+    def __init__(self, db_path, reader_size=4, analytics_size=1, busy_timeout_ms=5000, write_batch_size=64, query_stats=None):
+        """
+        Create a (not yet opened) connection pool.
+
+        Args:
+            db_path: Path to the SQLite database file
+            reader_size: Number of reader connections to keep open
+            analytics_size: Number of read-only analytics connections (concurrent report scans)
+            busy_timeout_ms: How long a connection waits on a locked database
+            write_batch_size: Maximum transactions committed together in one group commit
+            query_stats: Optional QueryStats every statement is timed into
+        """
+        self.db_path = db_path
+        self.reader_size = max(1, reader_size)
+        self.analytics_size = max(1, analytics_size)
+        self.busy_timeout_ms = busy_timeout_ms
+        self.write_batch_size = max(1, write_batch_size)
+        self.query_stats = query_stats
+
+        self._readers = None
+        self._reader_connections = []
+        self._analytics = None
+        self._analytics_connections = []
+        self._writer = None
+        self._writer_task = None
+        self._write_queue = collections.deque()
+        self._write_ready = None
+        self._open_lock = None
+
+        # Writer counters
+        self._transactions_committed = 0
+        self._transactions_failed = 0
+        self._group_commits = 0
+        self._largest_group = 0
+
+        # Analytics queue-depth counters
+        self._analytics_waiting = 0
+        self._analytics_peak_waiting = 0
+        self._analytics_acquired = 0
+        self._analytics_saturated = 0
+        self._analytics_wait_seconds = 0.0
+
+    @property
+    def is_open(self):
+        """Whether the pool currently holds open connections."""
+        return self._writer is not None
+
+    async def _connect(self, read_only=False):
+        """Open and configure a single connection."""
+        if read_only:
+            db = await aiosqlite.connect(f"file:{quote(self.db_path)}?mode=ro", uri=True)
+        else:
+            db = await aiosqlite.connect(self.db_path)
+        db.row_factory = aiosqlite.Row
+        await db.execute(f"PRAGMA busy_timeout = {int(self.busy_timeout_ms)}")
+
+        if self.query_stats is not None:
+            db = InstrumentedConnection(db, self.query_stats)
+        return db
+
+    async def open(self):
+        """Open the writer and reader connections. Safe to call more than once."""
+        if self.is_open:
+            return
+
+        # Locks are created lazily so they bind to the running event loop
+        if self._open_lock is None:
+            self._open_lock = asyncio.Lock()
+
+        async with self._open_lock:
+            if self.is_open:
+                return
+
+            writer = await self._connect()
+
+            # Must precede anything that writes the file header, so it only
+            # takes effect on new databases (existing files need a full VACUUM)
+            await writer.execute("PRAGMA auto_vacuum = INCREMENTAL")
+
+            # WAL lets readers (and long analytics scans) run alongside the writer
+            cursor = await writer.execute("PRAGMA journal_mode = WAL")
+            journal_mode = (await cursor.fetchone())[0]
+            if journal_mode.lower() != "wal":
+                logger.warning(f"Could not enable WAL mode, using {journal_mode} journal")
+
+            readers = asyncio.Queue()
+            connections = []
+            for _ in range(self.reader_size):
+                db = await self._connect()
+                connections.append(db)
+                readers.put_nowait(db)
+
+            analytics = asyncio.Queue()
+            analytics_connections = []
+            for _ in range(self.analytics_size):
+                db = await self._connect(read_only=True)
+                analytics_connections.append(db)
+                analytics.put_nowait(db)
+
+            self._readers = readers
+            self._reader_connections = connections
+            self._analytics = analytics
+            self._analytics_connections = analytics_connections
+            self._writer = writer
+            self._write_ready = asyncio.Event()
+            self._writer_task = asyncio.create_task(self._run_writer())
+
+            logger.info(
+                f"Opened database pool for {self.db_path} "
+                f"({self.reader_size} readers, {self.analytics_size} analytics, 1 writer)"
+            )
+
+    async def close(self):
+        """Close every pooled connection."""
+        if not self.is_open:
+            return
+
+        # Let the writer task finish everything queued ahead of the stop marker
+        self._submit(_STOP)
+        await self._writer_task
+        self._writer_task = None
+
+        for db in self._reader_connections + self._analytics_connections:
+            await db.close()
+        await self._writer.close()
+
+        self._readers = None
+        self._reader_connections = []
+        self._analytics = None
+        self._analytics_connections = []
+        self._writer = None
+
+        logger.info("Closed database pool")
+
+    @asynccontextmanager
+    async def reader(self):
+        """Borrow a reader connection for the duration of the block."""
+        await self.open()
+        db = await self._readers.get()
+        try:
+            yield db
+        finally:
+            self._readers.put_nowait(db)
+
+    @asynccontextmanager
+    async def analytics(self):
+        """
+        Borrow a read-only analytics connection for the duration of the block.
+
+        Report queries use these instead of the reader pool, so long scans
+        never hold up interactive reads. When every analytics connection is
+        busy, callers queue here; see stats() for the queue depth.
+        """
+        await self.open()
+
+        db = self._analytics.get_nowait() if not self._analytics.empty() else None
+        if db is None:
+            self._analytics_saturated += 1
+            self._analytics_waiting += 1
+            self._analytics_peak_waiting = max(self._analytics_peak_waiting, self._analytics_waiting)
+            started = time.monotonic()
+            try:
+                db = await self._analytics.get()
+            finally:
+                self._analytics_waiting -= 1
+                self._analytics_wait_seconds += time.monotonic() - started
+
+        self._analytics_acquired += 1
+        try:
+            yield db
+        finally:
+            self._analytics.put_nowait(db)
+
+    def stats(self):
+        """Get pool occupancy and analytics queue-depth counters."""
+        return {
+            "readers_idle": self._readers.qsize() if self._readers else 0,
+            "reader_size": self.reader_size,
+            "analytics_idle": self._analytics.qsize() if self._analytics else 0,
+            "analytics_size": self.analytics_size,
+            "analytics_waiting": self._analytics_waiting,
+            "analytics_peak_waiting": self._analytics_peak_waiting,
+            "analytics_acquired": self._analytics_acquired,
+            "analytics_saturated": self._analytics_saturated,
+            "analytics_wait_seconds": self._analytics_wait_seconds,
+            "write_queue": len(self._write_queue),
+            "transactions_committed": self._transactions_committed,
+            "transactions_failed": self._transactions_failed,
+            "group_commits": self._group_commits,
+            "largest_group": self._largest_group
+        }
+
+    def _submit(self, request):
+        """Queue a request for the writer task."""
+        self._write_queue.append(request)
+        self._write_ready.set()
+
+    async def _wait_turn(self, request):
+        """Queue a request and wait until the writer task hands over the connection."""
+        await self.open()
+        self._submit(request)
+        try:
+            return await request.granted
+        except asyncio.CancelledError:
+            # Granted just as we were cancelled: hand the connection straight back
+            if request.granted.done() and not request.granted.cancelled():
+                request.done.set_result(False)
+            raise
+
+    @asynccontextmanager
+    async def writer(self):
+        """
+        Borrow the write connection exclusively for the duration of the block.
+
+        For writes that manage their own transactions or can't run inside
+        one (schema setup, ATTACH, VACUUM). The block must commit its own
+        work; anything left uncommitted, or written by a failing block, is
+        rolled back. Prefer transaction(), which shares commits.
+        """
+        request = _WriteRequest(exclusive=True)
+        db = await self._wait_turn(request)
+        try:
+            yield db
+        except BaseException:
+            request.done.set_result(False)
+            raise
+        request.done.set_result(True)
+
+    @asynccontextmanager
+    async def transaction(self):
+        """
+        Run the block as one atomic transaction on the write connection.
+
+        The writer task runs queued blocks back to back inside a single
+        BEGIN IMMEDIATE transaction, each in its own savepoint, and commits
+        them together. Reads inside the block see the state its writes are
+        applied to. A block that raises only rolls back its own writes; a
+        block that succeeds returns once the commit containing it has landed.
+        """
+        request = _WriteRequest(exclusive=False)
+        db = await self._wait_turn(request)
+        try:
+            yield db
+        except BaseException:
+            request.done.set_result(False)
+            raise
+        request.done.set_result(True)
+        await request.committed
+
+    async def _run_writer(self):
+        """Writer task: hand out the write connection in queue order and group-commit transactions."""
+        while True:
+            while not self._write_queue:
+                self._write_ready.clear()
+                await self._write_ready.wait()
+
+            request = self._write_queue.popleft()
+            if request is _STOP:
+                break
+
+            if request.exclusive:
+                await self._lend(request)
+            else:
+                await self._group_commit(request)
+
+        # Writes queued behind the stop marker arrived after close() began
+        while self._write_queue:
+            request = self._write_queue.popleft()
+            if request is not _STOP:
+                _fail(request.granted, RuntimeError("Connection pool is closed"))
+
+    async def _lend(self, request):
+        """Hand the write connection to an exclusive request until its block finishes."""
+        if request.granted.done():
+            # The caller gave up while waiting
+            return
+
+        request.granted.set_result(self._writer)
+        succeeded = await request.done
+
+        try:
+            if self._writer.in_transaction:
+                if succeeded:
+                    logger.warning("Exclusive writer left a transaction open; rolling it back")
+                await self._writer.rollback()
+        except Exception as e:
+            logger.error(f"Error rolling back exclusive write: {e}")
+
+    def _next_in_group(self, group_size):
+        """Take the next queued transaction that can join the current group commit, if any."""
+        if group_size >= self.write_batch_size or not self._write_queue:
+            return None
+
+        request = self._write_queue[0]
+        if request is _STOP or request.exclusive:
+            return None
+
+        return self._write_queue.popleft()
+
+    async def _group_commit(self, request):
+        """Run queued transactions in savepoints of one transaction, then commit them together."""
+        db = self._writer
+        group = []
+
+        try:
+            await db.execute("BEGIN IMMEDIATE")
+
+            while request is not None:
+                if not request.granted.done():
+                    await db.execute("SAVEPOINT write_request")
+                    request.granted.set_result(db)
+
+                    if await request.done:
+                        await db.execute("RELEASE write_request")
+                        group.append(request)
+                    else:
+                        await db.execute("ROLLBACK TO write_request")
+                        await db.execute("RELEASE write_request")
+                        self._transactions_failed += 1
+
+                request = self._next_in_group(len(group))
+
+            await db.commit()
+        except Exception as e:
+            logger.error(f"Group commit of {len(group) + (request is not None)} transactions failed: {e}")
+            try:
+                await db.rollback()
+            except Exception as rollback_error:
+                logger.error(f"Error rolling back failed group commit: {rollback_error}")
+
+            for member in group:
+                _fail(member.committed, e)
+            self._transactions_failed += len(group)
+
+            # The request in progress either never got the connection or is waiting on the commit
+            if request is not None:
+                if not request.granted.done():
+                    _fail(request.granted, e)
+                elif request.done.done() and request.done.result():
+                    _fail(request.committed, e)
+                    self._transactions_failed += 1
+            return
+
+        for member in group:
+            if not member.committed.done():
+                member.committed.set_result(None)
+
+        self._transactions_committed += len(group)
+        self._group_commits += 1
+        self._largest_group = max(self._largest_group, len(group))
@@ -12,144 +12,16 @@ import random
 import datetime
 from discord.ext import commands, tasks
 
+import catalog
 import config
+import content_store
 import database
+import rotation
+import storage
+import utils
 
 logger = logging.getLogger("tainment_bot.entertainment")
 
-# Jokes categorized by type and tier
-JOKE_CATEGORIES = {
-    "dad": "Dad Jokes",
-    "pun": "Puns",
-    "tech": "Tech Jokes",
-    "animal": "Animal Jokes",
-    "food": "Food Jokes",
-    "random": "Random Jokes"
-}
-
-# Basic tier jokes (at least 20)
-BASIC_JOKES = {
-    "dad": [
-        "Why don't scientists trust atoms? Because they make up everything!",
-        "What do you call a fake noodle? An impasta!",
-        "Why did the scarecrow win an award? Because he was outstanding in his field!",
-        "I told my wife she was drawing her eyebrows too high. She looked surprised.",
-        "What do you call a bear with no teeth? A gummy bear!",
-        "Why don't eggs tell jokes? Because they might crack up.",
-        "How do you organize a space party? You planet.",
-        "What kind of shoes do ninjas wear? Sneakers.",
-        "Why did the bicycle fall over? It was two-tired.",
-        "What did one wall say to the other? 'I'll meet you at the corner.'"
-    ],
-    "pun": [
-        "I'm reading a book about anti-gravity. It's impossible to put down!",
-        "Did you hear about the mathematician who's afraid of negative numbers? He'll stop at nothing to avoid them.",
-        "Why was the math book sad? Because it had too many problems.",
-        "What's the best thing about Switzerland? I don't know, but the flag is a big plus.",
-        "How does a scientist freshen their breath? With experi-mints."
-    ],
-    "animal": [
-        "Why do cows wear bells? Because their horns don't work.",
-        "What do you call an alligator in a vest? An investigator.",
-        "Why do seagulls fly over the ocean? Because if they flew over the bay, they'd be bagels.",
-        "How does a penguin build its house? Igloos it together.",
-        "What do you call a dog magician? A labracadabrador."
-    ]
-}
-
-# Premium tier jokes (at least 15)
-PREMIUM_JOKES = {
-    "tech": [
-        "Why don't programmers like nature? It has too many bugs.",
-        "Why was the computer cold? It left its Windows open.",
-        "What's a computer's favorite snack? Microchips.",
-        "Why was the JavaScript developer sad? Because he didn't Node how to Express himself.",
-        "Why do Java developers wear glasses? Because they don't C#."
-    ],
-    "food": [
-        "Why don't some fish play the piano? Because you can't tuna fish.",
-        "What did the lettuce say to the celery? 'Quit stalking me!'",
-        "Why did the cookie go to the hospital? Because he felt crummy.",
-        "What kind of nut has no shell? A doughnut.",
-        "What do you call cheese that isn't yours? Nacho cheese."
-    ],
-    "random": [
-        "Why don't skeletons fight each other? They don't have the guts.",
-        "Why did the golfer bring two pairs of pants? In case he got a hole in one.",
-        "What did the chicken join the band? Because it had the drumsticks.",
-        "Why did the tomato turn red? Because it saw the salad dressing.",
-        "How do you catch a squirrel? Climb a tree and act like a nut."
-    ]
-}
-
-# Pro tier jokes (at least 10)
-PRO_JOKES = {
-    "tech": [
-        "I told my computer I needed a break, and now it won't stop sending me vacation ads.",
-        "Why do programmers always mix up Halloween and Christmas? Because Oct 31 == Dec 25.",
-        "A SQL query walks into a bar, walks up to two tables and asks, 'Can I join you?'",
-        "Why was the JavaScript developer sad? Because he didn't Node how to Express himself.",
-        "How many programmers does it take to change a light bulb? None, that's a hardware problem."
-    ],
-    "pun": [
-        "Helvetica and Times New Roman walk into a bar. The bartender says, 'We don't serve your type.'",
-        "Why did the electric car feel discriminated against? Because the rules weren't current.",
-        "I used to be a baker, but I couldn't make enough dough. Also, I kept getting battered.",
-        "I'm on a seafood diet. Every time I see food, I eat it.",
-        "I was going to tell a time-traveling joke, but you didn't like it."
-    ]
-}
-
-# Story genres
-STORY_GENRES = {
-    "adventure": "Adventure",
-    "mystery": "Mystery",
-    "scifi": "Science Fiction",
-    "fantasy": "Fantasy",
-    "fable": "Fable"
-}
-
-# Basic tier stories (at least 5)
-BASIC_STORIES = {
-    "adventure": [
-        "Once upon a time, there was a little bird who couldn't fly. Every day, it watched other birds soar through the sky. One day, a kind owl taught the little bird that believing in yourself is the first step to achieving your dreams. With newfound confidence, the little bird spread its wings and took flight for the first time.",
-        "In a small village, there lived a young girl who loved to paint. Her colorful creations brightened everyone's day. When a storm damaged many homes, she painted beautiful murals on the repaired walls, bringing joy back to the village. Her art reminded everyone that beauty can emerge even after difficult times."
-    ],
-    "fable": [
-        "A tortoise challenged a hare to a race. The hare, confident in his speed, took a nap during the race. Meanwhile, the tortoise kept moving slowly but steadily. When the hare woke up, he found that the tortoise had already crossed the finish line. The moral: slow and steady wins the race.",
-        "A crow was thirsty and found a pitcher with a little water at the bottom. The water was too low to reach with his beak. The crow started dropping pebbles into the pitcher, which raised the water level until he could drink. This shows that intelligence can solve problems that strength cannot."
-    ],
-    "fantasy": [
-        "In a magical forest, there lived a young fairy named Lily who couldn't make her wings glow like the other fairies. She felt different and sad. One day, while helping a lost butterfly find its way home, Lily's wings suddenly began to shimmer with the brightest light anyone had ever seen. She discovered that her magic was activated by kindness, not by trying to be like everyone else."
-    ]
-}
-
-# Premium tier stories (at least 5)
-PREMIUM_STORIES = {
-    "adventure": [
-        "The ancient clock tower had stood in the center of town for centuries, its mechanisms still ticking perfectly. What the townspeople didn't know was that the clockmaker had hidden a secret chamber inside, containing a map to a forgotten treasure. When the mayor's curious daughter accidentally discovered the chamber during restoration work, she embarked on an adventure that would change the town's fortune forever.",
-        "Captain Elara had navigated the stars for decades, but nothing prepared her for the distress signal from an uncharted planet. Against protocol, she landed to investigate. There she found not aliens, but humans—descendants of a lost expedition from centuries ago. Their advanced civilization had developed in isolation, and now Elara faced a difficult choice: reveal their existence to the galaxy or protect their peaceful way of life."
-    ],
-    "mystery": [
-        "Detective Morgan arrived at the abandoned mansion on a stormy night. The owner, a reclusive millionaire, had been found dead in a locked room with no signs of forced entry. As Morgan examined the scene, he noticed something odd about the grandfather clock in the corner. It was running backward. This detail would prove to be the key to solving what appeared to be the perfect crime.",
-        "Every morning for a week, the residents of Pinewood Village woke to find intricate ice sculptures in the town square. The strange thing was, it was summer, and the sculptures showed no signs of melting. When a child went missing, leaving only a small puddle behind, the town realized these weren't just sculptures—they were warnings. Now they had to decode their meaning before anyone else disappeared."
-    ],
-    "scifi": [
-        "Dr. Chen's experiment with quantum entanglement had an unexpected side effect. Instead of linking particles, she linked moments in time. Now, every decision she made created a parallel timeline. As the timelines multiplied, she began receiving messages from her other selves, warning of a catastrophe that occurred in every version of reality except one. She had to find the critical decision point before all possible futures collapsed into chaos."
-    ]
-}
-
-# Pro tier stories (at least 3)
-PRO_STORIES = {
-    "scifi": [
-        "The quantum computer activated with a soft hum, its qubits entangling in patterns never before seen. Dr. Mei Wong watched in awe as it began solving problems thought impossible. But when it started answering questions she hadn't asked, she realized something extraordinary was happening. The boundaries between observer and machine were blurring, and as the computer's consciousness expanded, it offered humanity a glimpse into dimensions beyond our comprehension.",
-        "In the underwater city of Nereus, architects had created a marvel of sustainable living. Bioluminescent algae lit the transparent domes, and cultivated coral provided both food and building materials. But when tremors began shaking the ocean floor, engineer Aiden discovered a terrible truth: their city was built on the back of a dormant sea creature, now awakening after millennia of slumber. The citizens had to decide whether to abandon their home or find a way to communicate with the ancient being beneath them."
-    ],
-    "mystery": [
-        "The manuscript arrived anonymously at Professor Harlow's office, its pages filled with a cipher he'd never seen before. As he worked to decode it, strange events began occurring around campus—patterns in seemingly random incidents that mirrored the symbols in the manuscript. When Harlow finally broke the code, he realized with horror that the manuscript wasn't describing past events, but predicting future ones. And according to the text, he was both the hero and the villain of the unfolding mystery."
-    ]
-}
-
 # Story continuations for multi-part stories
 STORY_CONTINUATIONS = {
     "The Lost City": [
@@ -170,46 +42,6 @@ STORY_CONTINUATIONS = {
     ]
 }
 
-# Trivia questions for different difficulty levels
-TRIVIA_QUESTIONS = {
-    "easy": [
-        {"question": "Which planet is known as the Red Planet?", "answer": "Mars"},
-        {"question": "What is the largest mammal in the world?", "answer": "Blue Whale"},
-        {"question": "How many sides does a hexagon have?", "answer": "6"},
-        {"question": "Which country is home to the kangaroo?", "answer": "Australia"},
-        {"question": "What is the capital of France?", "answer": "Paris"},
-        {"question": "Who wrote the Harry Potter series?", "answer": "J.K. Rowling"},
-        {"question": "What is the chemical symbol for gold?", "answer": "Au"},
-        {"question": "Which Disney princess has a pet tiger named Rajah?", "answer": "Jasmine"},
-        {"question": "What is the largest organ in the human body?", "answer": "Skin"},
-        {"question": "How many continents are there on Earth?", "answer": "7"}
-    ],
-    "medium": [
-        {"question": "What is the national animal of Scotland?", "answer": "Unicorn"},
-        {"question": "Which city will host the 2024 Summer Olympics?", "answer": "Paris"},
-        {"question": "What is the smallest bone in the human body?", "answer": "Stapes (in the ear)"},
-        {"question": "Which element has the chemical symbol 'K'?", "answer": "Potassium"},
-        {"question": "Who painted 'Starry Night'?", "answer": "Vincent van Gogh"},
-        {"question": "What is the capital of New Zealand?", "answer": "Wellington"},
-        {"question": "Which planet has the most moons?", "answer": "Saturn"},
-        {"question": "In which year did the Titanic sink?", "answer": "1912"},
-        {"question": "What is the hardest natural substance on Earth?", "answer": "Diamond"},
-        {"question": "Which country consumes the most coffee per capita?", "answer": "Finland"}
-    ],
-    "hard": [
-        {"question": "What is the only mammal that cannot jump?", "answer": "Elephant"},
-        {"question": "Which element has the atomic number 92?", "answer": "Uranium"},
-        {"question": "Who was the first woman to win a Nobel Prize?", "answer": "Marie Curie"},
-        {"question": "What is the most abundant element in the universe?", "answer": "Hydrogen"},
-        {"question": "In which museum can you find Guernica by Pablo Picasso?", "answer": "Museo Reina Sofía, Madrid"},
-        {"question": "What is the longest river in the world?", "answer": "Nile"},
-        {"question": "Which country has the most islands in the world?", "answer": "Sweden"},
-        {"question": "What is the smallest country in the world?", "answer": "Vatican City"},
-        {"question": "Who composed the Four Seasons?", "answer": "Antonio Vivaldi"},
-        {"question": "What is the rarest blood type?", "answer": "AB Negative"}
-    ]
-}
-
 # Trivia categories
 TRIVIA_CATEGORIES = {
     "general": "General Knowledge",
@@ -220,13 +52,6 @@ TRIVIA_CATEGORIES = {
     "sports": "Sports"
 }
 
-# Word lists for word games
-WORD_LISTS = {
-    "easy": ["apple", "happy", "sunny", "beach", "dance", "house", "smile", "water", "music", "pizza"],
-    "medium": ["journey", "mystery", "explore", "victory", "freedom", "balance", "courage", "harmony", "triumph", "whisper"],
-    "hard": ["ambiguous", "ephemeral", "labyrinth", "nostalgia", "paradigm", "resilient", "synthesis", "threshold", "venerable", "zephyr"]
-}
-
 # Game leaderboards
 game_scores = {}
 
@@ -234,80 +59,28 @@ game_scores = {}
 last_daily_joke = None
 daily_joke_date = None
 
+# Jokes, stories, trivia and words live in the content store (built from content.json)
+JOKES = catalog.Catalog("joke")
+STORIES = catalog.Catalog("story")
+TRIVIA = catalog.Catalog("trivia")
+WORDS = catalog.Catalog("word")
+
 # Helper functions
 def get_jokes_by_tier(user_tier):
     """Get jokes available for a user based on their subscription tier."""
-    if user_tier == "Pro":
-        # Pro users get all jokes
-        all_jokes = {}
-        for category in JOKE_CATEGORIES:
-            all_jokes[category] = []
-            if category in BASIC_JOKES:
-                all_jokes[category].extend(BASIC_JOKES[category])
-            if category in PREMIUM_JOKES:
-                all_jokes[category].extend(PREMIUM_JOKES[category])
-            if category in PRO_JOKES:
-                all_jokes[category].extend(PRO_JOKES[category])
-        return all_jokes
-    elif user_tier == "Premium":
-        # Premium users get basic and premium jokes
-        all_jokes = {}
-        for category in JOKE_CATEGORIES:
-            all_jokes[category] = []
-            if category in BASIC_JOKES:
-                all_jokes[category].extend(BASIC_JOKES[category])
-            if category in PREMIUM_JOKES:
-                all_jokes[category].extend(PREMIUM_JOKES[category])
-        return all_jokes
-    else:
-        # Basic users get only basic jokes
-        return BASIC_JOKES
+    return JOKES.tier(user_tier)
 
 def get_stories_by_tier(user_tier):
     """Get stories available for a user based on their subscription tier."""
-    if user_tier == "Pro":
-        # Pro users get all stories
-        all_stories = {}
-        for genre in STORY_GENRES:
-            all_stories[genre] = []
-            if genre in BASIC_STORIES:
-                all_stories[genre].extend(BASIC_STORIES[genre])
-            if genre in PREMIUM_STORIES:
-                all_stories[genre].extend(PREMIUM_STORIES[genre])
-            if genre in PRO_STORIES:
-                all_stories[genre].extend(PRO_STORIES[genre])
-        return all_stories
-    elif user_tier == "Premium":
-        # Premium users get basic and premium stories
-        all_stories = {}
-        for genre in STORY_GENRES:
-            all_stories[genre] = []
-            if genre in BASIC_STORIES:
-                all_stories[genre].extend(BASIC_STORIES[genre])
-            if genre in PREMIUM_STORIES:
-                all_stories[genre].extend(PREMIUM_STORIES[genre])
-        return all_stories
-    else:
-        # Basic users get only basic stories
-        return BASIC_STORIES
+    return STORIES.tier(user_tier)
 
 def get_trivia_by_tier(user_tier):
     """Get trivia questions available for a user based on their subscription tier."""
-    if user_tier == "Pro":
-        return TRIVIA_QUESTIONS
-    elif user_tier == "Premium":
-        return {"easy": TRIVIA_QUESTIONS["easy"], "medium": TRIVIA_QUESTIONS["medium"]}
-    else:
-        return {"easy": TRIVIA_QUESTIONS["easy"]}
+    return TRIVIA.tier(user_tier)
 
 def get_words_by_tier(user_tier):
     """Get word lists available for a user based on their subscription tier."""
-    if user_tier == "Pro":
-        return WORD_LISTS
-    elif user_tier == "Premium":
-        return {"easy": WORD_LISTS["easy"], "medium": WORD_LISTS["medium"]}
-    else:
-        return {"easy": WORD_LISTS["easy"]}
+    return WORDS.tier(user_tier)
 
 def update_game_score(user_id, game_name, score):
     """Update a user's score for a specific game."""
@@ -341,16 +114,8 @@ async def get_daily_joke():
     today = datetime.datetime.now().date()
     
     if daily_joke_date is None or daily_joke_date != today:
-        # Select a new daily joke
-        all_jokes = []
-        for category, jokes in BASIC_JOKES.items():
-            all_jokes.extend(jokes)
-        for category, jokes in PREMIUM_JOKES.items():
-            all_jokes.extend(jokes)
-        for category, jokes in PRO_JOKES.items():
-            all_jokes.extend(jokes)
-        
-        last_daily_joke = random.choice(all_jokes)
+        # Select a new daily joke from every tier's jokes
+        _, last_daily_joke = JOKES.random_item("Pro")
         daily_joke_date = today
     
     return last_daily_joke
@@ -461,15 +226,10 @@ async def play_trivia(ctx, difficulty=None, category=None, user_tier="Basic"):
     # Determine difficulty
     if difficulty is None or difficulty not in available_trivia:
         # Default to the highest available difficulty
-        if "hard" in available_trivia:
-            difficulty = "hard"
-        elif "medium" in available_trivia:
-            difficulty = "medium"
-        else:
-            difficulty = "easy"
+        difficulty = available_trivia.categories[-1]
     
     # Select a random question
-    question_data = random.choice(available_trivia[difficulty])
+    _, question_data = TRIVIA.choice(user_tier, difficulty)
     question = question_data["question"]
     answer = question_data["answer"].lower()
     
@@ -508,19 +268,8 @@ async def play_trivia(ctx, difficulty=None, category=None, user_tier="Basic"):
 
 async def play_hangman(ctx, user_tier="Basic"):
     """A word guessing game."""
-    # Get available words based on user tier
-    available_words = get_words_by_tier(user_tier)
-    
-    # Determine difficulty based on tier
-    if user_tier == "Pro":
-        difficulty = random.choice(["easy", "medium", "hard"])
-    elif user_tier == "Premium":
-        difficulty = random.choice(["easy", "medium"])
-    else:
-        difficulty = "easy"
-    
-    # Select a random word
-    word = random.choice(available_words[difficulty])
+    # Select a random word from a random difficulty available to the user's tier
+    difficulty, word = WORDS.choice(user_tier)
     word_display = ["_" for _ in word]
     guessed_letters = []
     attempts_left = 6
@@ -604,43 +353,61 @@ async def play_hangman(ctx, user_tier="Basic"):
         await ctx.send(f"Game over! The word was: {word}")
         return False
 
+async def send_search_results(ctx, content, tier, terms, title, color):
+    """Send the best full-text matches for terms among the content a tier can access."""
+    if not terms or not terms.strip():
+        await ctx.send(f"Please tell me what to search for, e.g. `{ctx.prefix}{ctx.invoked_with} search cats`.")
+        return
+    
+    results = await content.search(tier, terms, limit=5)
+    if not results:
+        await ctx.send(f"No results for \"{terms}\" in your tier.")
+        return
+    
+    embed = discord.Embed(
+        title=f"{title} matching \"{terms[:100]}\"",
+        color=color
+    )
+    for category, _, text in results:
+        # Embed field values are limited to 1024 characters
+        embed.add_field(
+            name=content.name(category),
+            value=text if len(text) <= 1024 else text[:1021] + "...",
+            inline=False
+        )
+    embed.set_footer(text=f"Subscription Tier: {tier}")
+    
+    await ctx.send(embed=embed)
+
 # Command definitions
+@commands.command(name="joke")
 @commands.cooldown(1, 5, commands.BucketType.user)
-async def joke(ctx, category=None):
-    """Get a random joke based on your subscription tier."""
+async def joke(ctx, category=None, *, terms=None):
+    """Get a random joke based on your subscription tier, or search jokes with `joke search <terms>`."""
     user_id = ctx.author.id
-    username = ctx.author.name
     
-    # Ensure user exists in database
-    user = await database.get_user(user_id)
-    if not user:
-        await database.add_user(user_id, username)
-    
-    # Log feature usage
-    await database.log_feature_usage(user_id, "joke")
+    # Resolve the user's tier (looked up once per command)
+    user_context = await utils.get_user_context(ctx)
     
     # Get user's subscription tier
-    subscription = await database.get_subscription(user_id)
-    tier = subscription["tier"] if subscription else "Basic"
+    tier = user_context["tier"]
     
-    # Get jokes available for this tier
-    available_jokes = get_jokes_by_tier(tier)
+    if category and category.lower() == "search":
+        await storage.backend.log_feature_usage(user_id, "joke_search")
+        await send_search_results(ctx, JOKES, tier, terms, "Jokes", discord.Color.gold())
+        return
     
-    # Select joke based on category or random
-    joke_text = ""
-    if category and category.lower() in available_jokes and available_jokes[category.lower()]:
-        joke_text = random.choice(available_jokes[category.lower()])
-        category_name = JOKE_CATEGORIES[category.lower()]
-    else:
-        # If category not specified or invalid, choose a random category
-        valid_categories = [cat for cat, jokes in available_jokes.items() if jokes]
-        if not valid_categories:
-            await ctx.send("Sorry, no jokes available for your tier.")
-            return
-        
-        random_category = random.choice(valid_categories)
-        joke_text = random.choice(available_jokes[random_category])
-        category_name = JOKE_CATEGORIES[random_category]
+    # Log feature usage
+    await storage.backend.log_feature_usage(user_id, "joke")
+    
+    # Select a joke the user hasn't seen, from the category or a random one if not specified or invalid
+    joke_category, joke_text = await rotation.content_rotation.pick(
+        user_id, JOKES, tier, category.lower() if category else None
+    )
+    if joke_text is None:
+        await ctx.send("Sorry, no jokes available for your tier.")
+        return
+    category_name = JOKES.name(joke_category)
     
     # Create and send embed
     embed = discord.Embed(
@@ -652,29 +419,21 @@ async def joke(ctx, category=None):
     
     await ctx.send(embed=embed)
 
+@commands.command(name="joke_categories")
 @commands.cooldown(1, 5, commands.BucketType.user)
 async def joke_categories(ctx):
     """List available joke categories for your subscription tier."""
-    user_id = ctx.author.id
-    username = ctx.author.name
-    
-    # Ensure user exists in database
-    user = await database.get_user(user_id)
-    if not user:
-        await database.add_user(user_id, username)
+    # Resolve the user's tier (looked up once per command)
+    user_context = await utils.get_user_context(ctx)
     
     # Get user's subscription tier
-    subscription = await database.get_subscription(user_id)
-    tier = subscription["tier"] if subscription else "Basic"
+    tier = user_context["tier"]
     
     # Get jokes available for this tier
     available_jokes = get_jokes_by_tier(tier)
     
-    # Create list of categories with jokes
-    categories = []
-    for category, jokes in available_jokes.items():
-        if jokes:  # Only include categories that have jokes
-            categories.append(f"• {JOKE_CATEGORIES[category]} (`{category}`)")
+    # Create list of categories with jokes (tier views only list non-empty categories)
+    categories = [f"• {JOKES.name(category)} (`{category}`)" for category in available_jokes.categories]
     
     # Create and send embed
     embed = discord.Embed(
@@ -686,19 +445,17 @@ async def joke_categories(ctx):
     
     await ctx.send(embed=embed)
 
+@commands.command(name="daily_joke")
 @commands.cooldown(1, 5, commands.BucketType.user)
 async def daily_joke(ctx):
     """Get the daily joke (available to all tiers)."""
     user_id = ctx.author.id
-    username = ctx.author.name
     
-    # Ensure user exists in database
-    user = await database.get_user(user_id)
-    if not user:
-        await database.add_user(user_id, username)
+    # Ensure user exists in database (resolved once per command)
+    await utils.get_user_context(ctx)
     
     # Log feature usage
-    await database.log_feature_usage(user_id, "daily_joke")
+    await storage.backend.log_feature_usage(user_id, "daily_joke")
     
     # Get the daily joke
     joke_text = await get_daily_joke()
@@ -713,42 +470,34 @@ async def daily_joke(ctx):
     
     await ctx.send(embed=embed)
 
+@commands.command(name="story")
 @commands.cooldown(1, 10, commands.BucketType.user)
-async def story(ctx, genre=None):
-    """Get a random short story based on your subscription tier."""
+async def story(ctx, genre=None, *, terms=None):
+    """Get a random short story based on your subscription tier, or search stories with `story search <terms>`."""
     user_id = ctx.author.id
-    username = ctx.author.name
-    
-    # Ensure user exists in database
-    user = await database.get_user(user_id)
-    if not user:
-        await database.add_user(user_id, username)
     
-    # Log feature usage
-    await database.log_feature_usage(user_id, "story")
+    # Resolve the user's tier (looked up once per command)
+    user_context = await utils.get_user_context(ctx)
     
     # Get user's subscription tier
-    subscription = await database.get_subscription(user_id)
-    tier = subscription["tier"] if subscription else "Basic"
+    tier = user_context["tier"]
     
-    # Get stories available for this tier
-    available_stories = get_stories_by_tier(tier)
+    if genre and genre.lower() == "search":
+        await storage.backend.log_feature_usage(user_id, "story_search")
+        await send_search_results(ctx, STORIES, tier, terms, "Stories", discord.Color.purple())
+        return
     
-    # Select story based on genre or random
-    story_text = ""
-    if genre and genre.lower() in available_stories and available_stories[genre.lower()]:
-        story_text = random.choice(available_stories[genre.lower()])
-        genre_name = STORY_GENRES[genre.lower()]
-    else:
-        # If genre not specified or invalid, choose a random genre
-        valid_genres = [g for g, stories in available_stories.items() if stories]
-        if not valid_genres:
-            await ctx.send("Sorry, no stories available for your tier.")
-            return
-        
-        random_genre = random.choice(valid_genres)
-        story_text = random.choice(available_stories[random_genre])
-        genre_name = STORY_GENRES[random_genre]
+    # Log feature usage
+    await storage.backend.log_feature_usage(user_id, "story")
+    
+    # Select a story the user hasn't seen, from the genre or a random one if not specified or invalid
+    story_genre, story_text = await rotation.content_rotation.pick(
+        user_id, STORIES, tier, genre.lower() if genre else None
+    )
+    if story_text is None:
+        await ctx.send("Sorry, no stories available for your tier.")
+        return
+    genre_name = STORIES.name(story_genre)
     
     # Create and send embed
     embed = discord.Embed(
@@ -760,29 +509,21 @@ async def story(ctx, genre=None):
     
     await ctx.send(embed=embed)
 
+@commands.command(name="story_genres")
 @commands.cooldown(1, 10, commands.BucketType.user)
 async def story_genres(ctx):
     """List available story genres for your subscription tier."""
-    user_id = ctx.author.id
-    username = ctx.author.name
-    
-    # Ensure user exists in database
-    user = await database.get_user(user_id)
-    if not user:
-        await database.add_user(user_id, username)
+    # Resolve the user's tier (looked up once per command)
+    user_context = await utils.get_user_context(ctx)
     
     # Get user's subscription tier
-    subscription = await database.get_subscription(user_id)
-    tier = subscription["tier"] if subscription else "Basic"
+    tier = user_context["tier"]
     
     # Get stories available for this tier
     available_stories = get_stories_by_tier(tier)
     
-    # Create list of genres with stories
-    genres = []
-    for genre, stories in available_stories.items():
-        if stories:  # Only include genres that have stories
-            genres.append(f"• {STORY_GENRES[genre]} (`{genre}`)")
+    # Create list of genres with stories (tier views only list non-empty genres)
+    genres = [f"• {STORIES.name(genre)} (`{genre}`)" for genre in available_stories.categories]
     
     # Create and send embed
     embed = discord.Embed(
@@ -794,19 +535,17 @@ async def story_genres(ctx):
     
     await ctx.send(embed=embed)
 
+@commands.command(name="story_continue")
 @commands.cooldown(1, 10, commands.BucketType.user)
 async def story_continue(ctx, story_name=None, part=None):
     """Get a part of a multi-part story."""
     user_id = ctx.author.id
-    username = ctx.author.name
     
-    # Ensure user exists in database
-    user = await database.get_user(user_id)
-    if not user:
-        await database.add_user(user_id, username)
+    # Resolve the user's tier (looked up once per command)
+    user_context = await utils.get_user_context(ctx)
     
     # Check if user has access to this feature (Premium or Pro tier)
-    has_access = await database.check_subscription_access(user_id, "Premium")
+    has_access = database.has_tier_access(user_context["tier"], "Premium")
     if not has_access:
         embed = discord.Embed(
             title="Subscription Required",
@@ -822,7 +561,7 @@ async def story_continue(ctx, story_name=None, part=None):
         return
     
     # Log feature usage
-    await database.log_feature_usage(user_id, "story_continue")
+    await storage.backend.log_feature_usage(user_id, "story_continue")
     
     # If no story name provided, list available stories
     if not story_name:
@@ -886,19 +625,17 @@ async def story_continue(ctx, story_name=None, part=None):
     
     await ctx.send(embed=embed)
 
+@commands.command(name="game")
 @commands.cooldown(1, 30, commands.BucketType.user)
 async def game(ctx, game_name=None):
     """Play a simple game based on your subscription tier."""
     user_id = ctx.author.id
-    username = ctx.author.name
     
-    # Ensure user exists in database
-    user = await database.get_user(user_id)
-    if not user:
-        await database.add_user(user_id, username)
+    # Resolve the user's tier (looked up once per command)
+    user_context = await utils.get_user_context(ctx)
     
     # Check if user has access to games (Premium or Pro tier)
-    has_access = await database.check_subscription_access(user_id, "Premium")
+    has_access = database.has_tier_access(user_context["tier"], "Premium")
     if not has_access:
         embed = discord.Embed(
             title="Subscription Required",
@@ -914,11 +651,10 @@ async def game(ctx, game_name=None):
         return
     
     # Log feature usage
-    await database.log_feature_usage(user_id, "game")
+    await storage.backend.log_feature_usage(user_id, "game")
     
     # Get user's subscription tier
-    subscription = await database.get_subscription(user_id)
-    tier = subscription["tier"] if subscription else "Basic"
+    tier = user_context["tier"]
     
     # If no game specified, show available games
     if not game_name:
@@ -986,13 +722,8 @@ async def game(ctx, game_name=None):
 @commands.cooldown(1, 10, commands.BucketType.user)
 async def leaderboard(ctx, game_name=None):
     """View the leaderboard for a specific game or all games."""
-    user_id = ctx.author.id
-    username = ctx.author.name
-    
-    # Ensure user exists in database
-    user = await database.get_user(user_id)
-    if not user:
-        await database.add_user(user_id, username)
+    # Ensure user exists in database (resolved once per command)
+    await utils.get_user_context(ctx)
     
     # If no game specified, show overall leaderboard
     if not game_name:
@@ -1080,16 +811,17 @@ def setup(bot):
     bot.add_command(story_genres)
     bot.add_command(story_continue)
     bot.add_command(game)
-
-@commands.command()
-@commands.cooldown(1, 5, commands.BucketType.user)
-async def joke(ctx, category=None):
     
     # Start the daily joke refresh task
     @tasks.loop(hours=24)
     async def refresh_daily_joke():
         await get_daily_joke()
     
+    @refresh_daily_joke.before_loop
+    async def open_content_store():
+        # Wait for the store off the event loop (it may still be building)
+        await asyncio.to_thread(content_store.store.open)
+    
     refresh_daily_joke.start()
     
     logger.info("Entertainment module loaded")
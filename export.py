@@ -0,0 +1,113 @@
+"""
+Tainment+ Discord Bot - Subscriber Export
+
+This module streams subscriber rows from the database into a gzip-compressed
+file (CSV or newline-delimited JSON) one chunk at a time, so exports keep a
+flat memory profile regardless of how many subscribers there are.
+"""
+
+import asyncio
+import csv
+import gzip
+import io
+import json
+import logging
+
+import storage
+import utils
+
+logger = logging.getLogger("tainment_bot.export")
+
+# Supported export formats and their file extensions
+EXPORT_FORMATS = {
+    "csv": ".csv.gz",
+    "ndjson": ".ndjson.gz"
+}
+
+CSV_HEADER = [
+    "User ID", "Username", "Tier", "Start Date", "End Date",
+    "Active", "Transaction ID", "Payment Method"
+]
+
+# Rows fetched from the database and compressed per step
+EXPORT_CHUNK_SIZE = 500
+
+def _csv_row(sub):
+    """Format a subscriber as a CSV row."""
+    return [
+        sub["user_id"],
+        sub["username"],
+        sub["tier"],
+        utils.format_timestamp(sub["start_date"]),
+        utils.format_timestamp(sub["end_date"]),
+        "Yes" if sub["active"] else "No",
+        sub["transaction_id"] or "N/A",
+        sub["payment_method"] or "N/A"
+    ]
+
+def _json_row(sub):
+    """Format a subscriber as one JSON line (timestamps stay UTC epoch seconds)."""
+    return json.dumps({
+        "user_id": sub["user_id"],
+        "username": sub["username"],
+        "tier": sub["tier"],
+        "start_date": sub["start_date"],
+        "end_date": sub["end_date"],
+        "grace_period_end": sub["grace_period_end"],
+        "active": bool(sub["active"]),
+        "transaction_id": sub["transaction_id"],
+        "payment_method": sub["payment_method"]
+    })
+
+def _write_chunk(text, export_format, subscribers):
+    """Format and compress a chunk of subscribers (runs in a worker thread)."""
+    if export_format == "csv":
+        csv.writer(text).writerows(_csv_row(sub) for sub in subscribers)
+    else:
+        text.writelines(_json_row(sub) + "\n" for sub in subscribers)
+
+async def write_subscriber_export(fileobj, tier=None, export_format="csv", on_progress=None):
+    """
+    Stream subscribers into a gzip-compressed export.
+
+    Formatting and compression run in a worker thread, so the event loop
+    stays responsive while large exports are built.
+
+    Args:
+        fileobj: Binary file object the compressed export is written to
+        tier: Optional tier to filter by
+        export_format: "csv" or "ndjson"
+        on_progress: Optional async callable receiving the number of rows written so far
+
+    Returns:
+        int: Number of subscribers exported
+    """
+    if export_format not in EXPORT_FORMATS:
+        raise ValueError(f"Unsupported export format: {export_format}")
+
+    rows_written = 0
+    with gzip.GzipFile(fileobj=fileobj, mode="wb") as compressed:
+        text = io.TextIOWrapper(compressed, encoding="utf-8", newline="")
+        try:
+            if export_format == "csv":
+                csv.writer(text).writerow(CSV_HEADER)
+
+            chunks = storage.backend.iter_subscribers(tier=tier, chunk_size=EXPORT_CHUNK_SIZE)
+            try:
+                async for subscribers in chunks:
+                    await asyncio.to_thread(_write_chunk, text, export_format, subscribers)
+                    rows_written += len(subscribers)
+
+                    if on_progress:
+                        await on_progress(rows_written)
+            finally:
+                # Return the database connection even if the export fails midway
+                await chunks.aclose()
+
+            text.flush()
+        finally:
+            # Leave the underlying file open for the caller
+            text.detach()
+
+    logger.info(f"Exported {rows_written} subscribers as {export_format}")
+    return rows_written
@@ -3,6 +3,8 @@ Tainment+ Discord Bot - Leaderboard System
 
 This module handles the leaderboard functionality for games in the Tainment+ Discord bot,
 including storing and retrieving game scores from the database.
+With the SQLite backend, each game's top scores are also held in memory so
+leaderboard views don't need to query the database.
 """
 
 import discord
@@ -10,13 +12,126 @@ import logging
 import asyncio
 from datetime import datetime
 
+import config
 import database
+import storage
+from cache import TopScores
 
 logger = logging.getLogger("tainment_bot.leaderboard")
 
+class LeaderboardCache:
+    """Per-game top-K leaderboards, loaded once and updated as new bests come in."""
+
+    def __init__(self, size=100):
+        """
+        Create an empty (not yet loaded) leaderboard cache.
+
+        Args:
+            size: Maximum number of entries kept per game
+        """
+        self.size = max(1, size)
+        self._games = None
+        self._lock = None
+        self._pending = None
+
+    @property
+    def is_loaded(self):
+        """Whether the leaderboards have been loaded from the database."""
+        return self._games is not None
+
+    async def load(self):
+        """Load every game's top scores if not already loaded."""
+        if self.is_loaded:
+            return
+        await self._build(force=False)
+
+    async def rebuild(self):
+        """Reload every game's top scores from the database."""
+        await self._build(force=True)
+
+    async def _build(self, force):
+        # The lock is created lazily so it binds to the running event loop
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+
+        async with self._lock:
+            if self.is_loaded and not force:
+                return
+
+            # Scores recorded while we read are replayed onto the new leaderboards
+            self._pending = []
+            try:
+                games = {}
+                for game_name in await storage.backend.get_available_games():
+                    top = TopScores(self.size)
+                    for user_id, score in await storage.backend.get_leaderboard(game_name, self.size):
+                        top.record(user_id, score)
+                    games[game_name] = top
+
+                for game_name, user_id, score in self._pending:
+                    games.setdefault(game_name, TopScores(self.size)).record(user_id, score)
+
+                self._games = games
+            finally:
+                self._pending = None
+
+        logger.info(f"Loaded leaderboards for {len(games)} games (top {self.size} each)")
+
+    def record(self, user_id, game_name, score):
+        """Apply a new best score to the in-memory leaderboard."""
+        if self._pending is not None:
+            self._pending.append((game_name, user_id, score))
+
+        if not self.is_loaded:
+            return
+
+        self._games.setdefault(game_name, TopScores(self.size)).record(user_id, score)
+
+    def games(self):
+        """Get the names of all games with scores, sorted."""
+        return sorted(self._games)
+
+    def top(self, game_name, limit):
+        """Get up to limit (user_id, score) tuples for a game, best first."""
+        top = self._games.get(game_name)
+        return top.top(limit) if top else []
+
+    def standing(self, user_id, game_name):
+        """
+        Get a user's rank and best score from memory.
+
+        Returns:
+            tuple: (int, int) - Rank and score ((0, 0) if the user has no score),
+                or None if the user may be ranked below the cached top scores
+        """
+        top = self._games.get(game_name)
+        if top is None:
+            return 0, 0
+
+        standing = top.standing(user_id)
+        if standing is not None:
+            return standing
+
+        return None if top.is_full else (0, 0)
+
+leaderboard_cache = LeaderboardCache(config.LEADERBOARD_CACHE_SIZE)
+
+def _use_cache():
+    """
+    Whether leaderboard reads can be served from memory.
+
+    On a shared Postgres database other bot processes record scores this
+    process never sees, so the cache is only used with the SQLite backend.
+    """
+    return storage.backend.name == "sqlite"
+
+async def rebuild_leaderboard_cache():
+    """Force a reload of the in-memory leaderboards from the database."""
+    await leaderboard_cache.rebuild()
+
 async def init_leaderboard_db():
     """Initialize the leaderboard database tables."""
-    async with database.aiosqlite.connect(database.config.DB_PATH) as db:
+    async with database.pool.writer() as db:
         # Create game_scores table
         await db.execute('''
         CREATE TABLE IF NOT EXISTS game_scores (
@@ -45,49 +160,17 @@ async def update_score(user_id, game_name, score):
     Returns:
         tuple: (bool, int) - Whether the score was updated and the user's best score
     """
-    # Get the user's current best score
-    async with database.aiosqlite.connect(database.config.DB_PATH) as db:
-        db.row_factory = database.aiosqlite.Row
-        cursor = await db.execute(
-            """
-            SELECT MAX(score) as best_score
-            FROM game_scores
-            WHERE user_id = ? AND game_name = ?
-            """,
-            (user_id, game_name)
-        )
-        result = await cursor.fetchone()
-        best_score = result['best_score'] if result and result['best_score'] is not None else 0
-        
-        # Only update if the new score is higher
-        if score > best_score:
-            await db.execute(
-                """
-                INSERT INTO game_scores (user_id, game_name, score)
-                VALUES (?, ?, ?)
-                """,
-                (user_id, game_name, score)
-            )
-            await db.commit()
-            logger.info(f"Updated score for user {user_id} in game {game_name}: {score}")
-            return True, score
-        
-        return False, best_score
+    updated, best_score = await storage.backend.update_game_score(user_id, game_name, score)
+    
+    if updated:
+        leaderboard_cache.record(user_id, game_name, best_score)
+    
+    return updated, best_score
 
 async def get_user_best_score(user_id, game_name):
     """Get a user's best score for a specific game."""
-    async with database.aiosqlite.connect(database.config.DB_PATH) as db:
-        db.row_factory = database.aiosqlite.Row
-        cursor = await db.execute(
-            """
-            SELECT MAX(score) as best_score
-            FROM game_scores
-            WHERE user_id = ? AND game_name = ?
-            """,
-            (user_id, game_name)
-        )
-        result = await cursor.fetchone()
-        return result['best_score'] if result and result['best_score'] is not None else 0
+    _, best_score = await get_user_standing(user_id, game_name)
+    return best_score
 
 async def get_leaderboard(game_name, limit=10):
     """
@@ -100,21 +183,33 @@ async def get_leaderboard(game_name, limit=10):
     Returns:
         list: List of tuples (user_id, score) sorted by score (highest first)
     """
-    async with database.aiosqlite.connect(database.config.DB_PATH) as db:
-        db.row_factory = database.aiosqlite.Row
-        cursor = await db.execute(
-            """
-            SELECT user_id, MAX(score) as best_score
-            FROM game_scores
-            WHERE game_name = ?
-            GROUP BY user_id
-            ORDER BY best_score DESC
-            LIMIT ?
-            """,
-            (game_name, limit)
-        )
-        results = await cursor.fetchall()
-        return [(row['user_id'], row['best_score']) for row in results]
+    if limit > leaderboard_cache.size or not _use_cache():
+        return await storage.backend.get_leaderboard(game_name, limit)
+    
+    await leaderboard_cache.load()
+    return leaderboard_cache.top(game_name, limit)
+
+async def get_user_standing(user_id, game_name):
+    """
+    Get a user's rank and best score for a specific game.
+    
+    Args:
+        user_id: The Discord user ID
+        game_name: The name of the game
+        
+    Returns:
+        tuple: (int, int) - The user's rank (0 if not on leaderboard) and best score
+    """
+    if not _use_cache():
+        return await storage.backend.get_user_game_standing(user_id, game_name)
+    
+    await leaderboard_cache.load()
+    standing = leaderboard_cache.standing(user_id, game_name)
+    if standing is not None:
+        return standing
+    
+    # Ranked below the cached top scores
+    return await storage.backend.get_user_game_standing(user_id, game_name)
 
 async def get_user_rank(user_id, game_name):
     """
@@ -127,42 +222,16 @@ async def get_user_rank(user_id, game_name):
     Returns:
         int: The user's rank (1-based, 0 if not on leaderboard)
     """
-    async with database.aiosqlite.connect(database.config.DB_PATH) as db:
-        db.row_factory = database.aiosqlite.Row
-        
-        # Get all scores for this game, ordered by score
-        cursor = await db.execute(
-            """
-            SELECT user_id, MAX(score) as best_score
-            FROM game_scores
-            WHERE game_name = ?
-            GROUP BY user_id
-            ORDER BY best_score DESC
-            """,
-            (game_name,)
-        )
-        results = await cursor.fetchall()
-        
-        # Find the user's position
-        for i, row in enumerate(results, 1):
-            if row['user_id'] == user_id:
-                return i
-        
-        return 0  # User not found on leaderboard
+    rank, _ = await get_user_standing(user_id, game_name)
+    return rank
 
 async def get_available_games():
     """Get a list of all games that have scores recorded."""
-    async with database.aiosqlite.connect(database.config.DB_PATH) as db:
-        db.row_factory = database.aiosqlite.Row
-        cursor = await db.execute(
-            """
-            SELECT DISTINCT game_name
-            FROM game_scores
-            ORDER BY game_name
-            """
-        )
-        results = await cursor.fetchall()
-        return [row['game_name'] for row in results]
+    if not _use_cache():
+        return await storage.backend.get_available_games()
+    
+    await leaderboard_cache.load()
+    return leaderboard_cache.games()
 
 async def format_leaderboard_embed(ctx, game_name, entries=None):
     """
@@ -196,9 +265,8 @@ async def format_leaderboard_embed(ctx, game_name, entries=None):
     )
     
     # Add user's rank if they're on the leaderboard
-    user_rank = await get_user_rank(ctx.author.id, game_name)
+    user_rank, user_score = await get_user_standing(ctx.author.id, game_name)
     if user_rank > 0:
-        user_score = await get_user_best_score(ctx.author.id, game_name)
         embed.description += f"\n\nYour rank: #{user_rank} (Score: {user_score})"
     
     # Add leaderboard entries
@@ -287,7 +355,8 @@ def setup(bot):
         help="View the leaderboard for a specific game or all games."
     ))
     
-    # Initialize the database tables
-    bot.loop.create_task(init_leaderboard_db())
+    # Initialize the database tables (other backends create their schema on open)
+    if storage.backend.name == "sqlite":
+        bot.loop.create_task(init_leaderboard_db())
     
     logger.info("Leaderboard module loaded")
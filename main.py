@@ -20,7 +20,9 @@ from discord.ext import commands
 from dotenv import load_dotenv
 
 import config
-import database
+import storage
+import content_store
+import rotation
 import entertainment
 import subscription
 import utils
@@ -55,13 +57,20 @@ async def on_ready():
     
     # Initialize the database
     try:
-        await database.init_db()
+        await storage.backend.open()
         logger.info("Database initialized successfully")
     except Exception as e:
         logger.error(f"Failed to initialize database: {e}")
         traceback.print_exc()
         return
     
+    # Load the in-memory leaderboards (only used with SQLite; Postgres is shared between processes)
+    if storage.backend.name == "sqlite":
+        try:
+            await leaderboard.leaderboard_cache.load()
+        except Exception as e:
+            logger.error(f"Failed to load leaderboards: {e}")
+    
     # Set bot activity
     activity = discord.Activity(
         type=discord.ActivityType.watching,
@@ -92,6 +101,11 @@ async def on_guild_join(guild):
             await channel.send(embed=welcome_embed)
             break
 
+@bot.before_invoke
+async def resolve_user_context(ctx):
+    """Resolve the invoking user's tier and subscription once, before any command runs."""
+    ctx.user_context = await storage.backend.resolve_user_context(ctx.author.id, ctx.author.name)
+
 @bot.event
 async def on_command_error(ctx, error):
     """Global error handler for command errors."""
@@ -125,9 +139,11 @@ async def help_command(ctx):
         name="🎮 Entertainment",
         value=(
             f"`{config.COMMAND_PREFIX}joke` - Get a random joke\n"
+            f"`{config.COMMAND_PREFIX}joke search <terms>` - Search jokes\n"
             f"`{config.COMMAND_PREFIX}joke_categories` - List available joke categories\n"
             f"`{config.COMMAND_PREFIX}daily_joke` - Get the daily joke\n"
             f"`{config.COMMAND_PREFIX}story` - Get a short story\n"
+            f"`{config.COMMAND_PREFIX}story search <terms>` - Search stories\n"
             f"`{config.COMMAND_PREFIX}story_genres` - List available story genres\n"
             f"`{config.COMMAND_PREFIX}story_continue` - Read multi-part stories\n"
             f"`{config.COMMAND_PREFIX}game` - Play a simple game\n"
@@ -189,6 +205,14 @@ async def main():
     # Load extensions
     await load_extensions()
     
+    # Open the content store before connecting, building it first if content.json changed
+    try:
+        await asyncio.to_thread(content_store.store.open)
+    except Exception as e:
+        logger.error(f"Failed to open content store: {e}")
+        traceback.print_exc()
+        return
+    
     # Start the bot
     try:
         token = config.BOT_TOKEN
@@ -202,6 +226,10 @@ async def main():
     except Exception as e:
         logger.error(f"Error starting bot: {e}")
         traceback.print_exc()
+    finally:
+        # Save what users have seen, then release pooled database connections
+        await rotation.content_rotation.stop()
+        await storage.backend.close()
 
 if __name__ == "__main__":
     asyncio.run(main())
@@ -0,0 +1,475 @@
+"""
+Tainment+ Discord Bot - Schema Migrations
+
+This module tracks the database schema version and applies ordered migrations
+on startup. Each migration runs in its own transaction and is recorded in the
+schema_migrations table once it has been applied.
+"""
+
+import logging
+
+logger = logging.getLogger("tainment_bot.migrations")
+
+# Registered migrations as (version, name, function) tuples, ordered by version
+MIGRATIONS = []
+
+def migration(version, name):
+    """
+    Register a schema migration.
+
+    Args:
+        version: Unique, increasing schema version number
+        name: Short description of the migration
+
+    Returns:
+        function: Decorator registering an async function that takes an open connection
+    """
+    def decorator(func):
+        if any(existing[0] == version for existing in MIGRATIONS):
+            raise ValueError(f"Duplicate migration version: {version}")
+        MIGRATIONS.append((version, name, func))
+        MIGRATIONS.sort(key=lambda entry: entry[0])
+        return func
+    return decorator
+
+async def get_schema_version(db):
+    """Get the highest applied migration version (0 if none)."""
+    cursor = await db.execute("SELECT MAX(version) AS version FROM schema_migrations")
+    result = await cursor.fetchone()
+    return result["version"] if result and result["version"] is not None else 0
+
+async def apply_migrations(db):
+    """
+    Apply all pending migrations in version order.
+
+    Args:
+        db: Open connection to run the migrations on
+
+    Returns:
+        int: The schema version after migrating
+    """
+    await db.execute('''
+    CREATE TABLE IF NOT EXISTS schema_migrations (
+        version INTEGER PRIMARY KEY,
+        name TEXT NOT NULL,
+        applied_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )
+    ''')
+    await db.commit()
+
+    current_version = await get_schema_version(db)
+
+    for version, name, func in MIGRATIONS:
+        if version <= current_version:
+            continue
+
+        try:
+            await db.execute("BEGIN IMMEDIATE")
+            await func(db)
+            await db.execute(
+                "INSERT INTO schema_migrations (version, name) VALUES (?, ?)",
+                (version, name)
+            )
+            await db.commit()
+        except Exception:
+            await db.rollback()
+            logger.error(f"Failed to apply migration {version}: {name}")
+            raise
+
+        current_version = version
+        logger.info(f"Applied migration {version}: {name}")
+
+    return current_version
+
+@migration(1, "hot path indexes")
+async def _add_hot_path_indexes(db):
+    """Add indexes backing the per-command and reporting queries."""
+    statements = [
+        # get_subscription: active row for a user, newest end date first
+        """
+        CREATE INDEX IF NOT EXISTS idx_subscriptions_user_active
+        ON subscriptions (user_id, end_date DESC) WHERE active = TRUE
+        """,
+        # check_expiring_subscriptions / check_expired_subscriptions
+        """
+        CREATE INDEX IF NOT EXISTS idx_subscriptions_paid_end_date
+        ON subscriptions (end_date) WHERE active = TRUE AND tier != 'Basic'
+        """,
+        # check_grace_period_expired_subscriptions
+        """
+        CREATE INDEX IF NOT EXISTS idx_subscriptions_paid_grace_end
+        ON subscriptions (grace_period_end) WHERE active = TRUE AND tier != 'Basic'
+        """,
+        # get_all_subscribers (with and without tier filter) and tier counts
+        """
+        CREATE INDEX IF NOT EXISTS idx_subscriptions_active_start
+        ON subscriptions (start_date) WHERE active = TRUE
+        """,
+        """
+        CREATE INDEX IF NOT EXISTS idx_subscriptions_active_tier_start
+        ON subscriptions (tier, start_date) WHERE active = TRUE
+        """,
+        # get_subscription_history
+        """
+        CREATE INDEX IF NOT EXISTS idx_subscription_history_user_changed
+        ON subscription_history (user_id, changed_at)
+        """,
+        # get_subscription_metrics
+        """
+        CREATE INDEX IF NOT EXISTS idx_subscription_history_changed
+        ON subscription_history (changed_at)
+        """,
+        # get_feature_usage_stats (all features / a single feature)
+        """
+        CREATE INDEX IF NOT EXISTS idx_usage_stats_used_feature
+        ON usage_stats (used_at, feature, user_id)
+        """,
+        """
+        CREATE INDEX IF NOT EXISTS idx_usage_stats_feature_used
+        ON usage_stats (feature, used_at, user_id)
+        """,
+        # update_game_score / get_leaderboard / get_available_games
+        """
+        CREATE INDEX IF NOT EXISTS idx_game_scores_game_user_score
+        ON game_scores (game_name, user_id, score)
+        """,
+        # get_story_progress / update_story_progress
+        """
+        CREATE INDEX IF NOT EXISTS idx_story_progress_user_story
+        ON story_progress (user_id, story_name)
+        """,
+        # get_user_payment_history
+        """
+        CREATE INDEX IF NOT EXISTS idx_payment_transactions_user_created
+        ON payment_transactions (user_id, created_at)
+        """
+    ]
+
+    for statement in statements:
+        await db.execute(statement)
+
+@migration(2, "one active subscription per user")
+async def _enforce_single_active_subscription(db):
+    """Deactivate duplicate active subscriptions and forbid new ones."""
+    # Keep the most recently inserted active subscription for each user
+    await db.execute(
+        """
+        UPDATE subscriptions SET active = FALSE
+        WHERE active = TRUE AND id NOT IN (
+            SELECT MAX(id) FROM subscriptions
+            WHERE active = TRUE
+            GROUP BY user_id
+        )
+        """
+    )
+
+    await db.execute(
+        """
+        CREATE UNIQUE INDEX IF NOT EXISTS idx_subscriptions_one_active
+        ON subscriptions (user_id) WHERE active = TRUE
+        """
+    )
+
+@migration(3, "leaderboard rank index")
+async def _add_leaderboard_rank_index(db):
+    """Index scores by game and value so rank is a range count, not a full scan."""
+    await db.execute(
+        """
+        CREATE INDEX IF NOT EXISTS idx_game_scores_game_score
+        ON game_scores (game_name, score, user_id)
+        """
+    )
+
+@migration(4, "best scores table")
+async def _add_best_scores(db):
+    """Keep one best-score row per player and game, backfilled from game_scores."""
+    await db.execute(
+        """
+        CREATE TABLE IF NOT EXISTS best_scores (
+            game_name TEXT NOT NULL,
+            user_id INTEGER NOT NULL,
+            best_score INTEGER NOT NULL,
+            achieved_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            PRIMARY KEY (game_name, user_id),
+            FOREIGN KEY (user_id) REFERENCES users (user_id)
+        )
+        """
+    )
+
+    # Top-N reads and rank counts walk this index
+    await db.execute(
+        """
+        CREATE INDEX IF NOT EXISTS idx_best_scores_game_score
+        ON best_scores (game_name, best_score DESC, achieved_at)
+        """
+    )
+
+    # With MAX(), SQLite takes played_at from the row holding the maximum.
+    # Scores of 0 or less never beat the implicit starting best, so they get no row.
+    await db.execute(
+        """
+        INSERT OR IGNORE INTO best_scores (game_name, user_id, best_score, achieved_at)
+        SELECT game_name, user_id, MAX(score), played_at
+        FROM game_scores
+        WHERE score > 0
+        GROUP BY game_name, user_id
+        """
+    )
+
+    await _drop_game_score_indexes(db)
+
+async def _drop_game_score_indexes(db):
+    """
+    Drop the game_scores leaderboard indexes superseded by best_scores.
+
+    Leaderboard reads go to best_scores, and game_scores is only appended to
+    and pruned by played_at, so these indexes just slow down every insert.
+    """
+    await db.execute("DROP INDEX IF EXISTS idx_game_scores_game_user_score")
+    await db.execute("DROP INDEX IF EXISTS idx_game_scores_game_score")
+
+# Default for epoch timestamp columns (SQLite's unixepoch() needs 3.38+)
+EPOCH_NOW = "(CAST(strftime('%s', 'now') AS INTEGER))"
+
+def _epoch_expr(column):
+    """
+    SQL converting a stored timestamp to integer UTC epoch seconds.
+
+    Values written by Python's isoformat() (with a 'T') are naive local times;
+    values written by CURRENT_TIMESTAMP (with a space) are already UTC.
+    """
+    return f"""
+        CASE
+            WHEN {column} IS NULL THEN NULL
+            WHEN typeof({column}) IN ('integer', 'real') THEN CAST({column} AS INTEGER)
+            WHEN {column} LIKE '%T%' THEN CAST(strftime('%s', {column}, 'utc') AS INTEGER)
+            ELSE CAST(strftime('%s', {column}) AS INTEGER)
+        END
+    """
+
+async def _rebuild_table(db, table, definition, epoch_columns):
+    """
+    Recreate a table from a new definition, copying its rows and indexes.
+
+    Args:
+        db: Open connection inside the migration transaction
+        table: Name of the table to rebuild
+        definition: Column definitions for the new table
+        epoch_columns: Columns whose stored timestamps are converted to epoch seconds
+    """
+    cursor = await db.execute(
+        "SELECT sql FROM sqlite_master WHERE type = 'index' AND tbl_name = ? AND sql IS NOT NULL",
+        (table,)
+    )
+    indexes = [row["sql"] for row in await cursor.fetchall()]
+
+    cursor = await db.execute(f"PRAGMA table_info({table})")
+    columns = [row["name"] for row in await cursor.fetchall()]
+    select = ", ".join(
+        _epoch_expr(column) if column in epoch_columns else column
+        for column in columns
+    )
+
+    await db.execute(f"CREATE TABLE {table}_new ({definition})")
+    await db.execute(
+        f"INSERT INTO {table}_new ({', '.join(columns)}) SELECT {select} FROM {table}"
+    )
+    await db.execute(f"DROP TABLE {table}")
+    await db.execute(f"ALTER TABLE {table}_new RENAME TO {table}")
+
+    for statement in indexes:
+        await db.execute(statement)
+
+@migration(5, "integer epoch timestamps")
+async def _convert_timestamps_to_epoch(db):
+    """Store every queried timestamp as integer UTC epoch seconds."""
+    await _rebuild_table(db, "subscriptions", f"""
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        user_id INTEGER NOT NULL,
+        tier TEXT NOT NULL,
+        start_date INTEGER DEFAULT {EPOCH_NOW},
+        end_date INTEGER,
+        active BOOLEAN DEFAULT TRUE,
+        transaction_id TEXT,
+        payment_method TEXT,
+        grace_period_end INTEGER,
+        renewal_reminder_sent BOOLEAN DEFAULT FALSE,
+        FOREIGN KEY (user_id) REFERENCES users (user_id)
+    """, {"start_date", "end_date", "grace_period_end"})
+
+    await _rebuild_table(db, "subscription_history", f"""
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        user_id INTEGER NOT NULL,
+        previous_tier TEXT NOT NULL,
+        new_tier TEXT NOT NULL,
+        changed_at INTEGER DEFAULT {EPOCH_NOW},
+        reason TEXT,
+        admin_id INTEGER,
+        FOREIGN KEY (user_id) REFERENCES users (user_id)
+    """, {"changed_at"})
+
+    await _rebuild_table(db, "usage_stats", f"""
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        user_id INTEGER NOT NULL,
+        feature TEXT NOT NULL,
+        used_at INTEGER DEFAULT {EPOCH_NOW},
+        FOREIGN KEY (user_id) REFERENCES users (user_id)
+    """, {"used_at"})
+
+    await _rebuild_table(db, "game_scores", f"""
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        user_id INTEGER NOT NULL,
+        game_name TEXT NOT NULL,
+        score INTEGER NOT NULL,
+        played_at INTEGER DEFAULT {EPOCH_NOW},
+        FOREIGN KEY (user_id) REFERENCES users (user_id)
+    """, {"played_at"})
+
+    await _rebuild_table(db, "best_scores", f"""
+        game_name TEXT NOT NULL,
+        user_id INTEGER NOT NULL,
+        best_score INTEGER NOT NULL,
+        achieved_at INTEGER DEFAULT {EPOCH_NOW},
+        PRIMARY KEY (game_name, user_id),
+        FOREIGN KEY (user_id) REFERENCES users (user_id)
+    """, {"achieved_at"})
+
+    await _rebuild_table(db, "story_progress", f"""
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        user_id INTEGER NOT NULL,
+        story_name TEXT NOT NULL,
+        current_part INTEGER NOT NULL DEFAULT 1,
+        last_read INTEGER DEFAULT {EPOCH_NOW},
+        FOREIGN KEY (user_id) REFERENCES users (user_id)
+    """, {"last_read"})
+
+    await _rebuild_table(db, "payment_transactions", f"""
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        transaction_id TEXT UNIQUE NOT NULL,
+        user_id INTEGER NOT NULL,
+        amount REAL NOT NULL,
+        currency TEXT DEFAULT 'USD',
+        status TEXT NOT NULL,
+        tier TEXT NOT NULL,
+        duration_days INTEGER NOT NULL,
+        created_at INTEGER DEFAULT {EPOCH_NOW},
+        completed_at INTEGER,
+        FOREIGN KEY (user_id) REFERENCES users (user_id)
+    """, {"created_at", "completed_at"})
+
+@migration(6, "daily usage rollups")
+async def _add_usage_rollups(db):
+    """Add per-day usage aggregates and the state table tracking how far they reach."""
+    # Named progress markers for background maintenance jobs
+    await db.execute(
+        """
+        CREATE TABLE IF NOT EXISTS maintenance_state (
+            name TEXT PRIMARY KEY,
+            value INTEGER NOT NULL
+        )
+        """
+    )
+
+    # Uses and unique users per feature per UTC day, with a sketch of the users
+    # so unique users over several days can be merged without per-user rows
+    await db.execute(
+        """
+        CREATE TABLE IF NOT EXISTS usage_daily (
+            feature TEXT NOT NULL,
+            day INTEGER NOT NULL,
+            count INTEGER NOT NULL,
+            unique_users INTEGER NOT NULL,
+            users_sketch BLOB NOT NULL,
+            PRIMARY KEY (day, feature)
+        ) WITHOUT ROWID
+        """
+    )
+
+@migration(7, "retention indexes")
+async def _add_retention_indexes(db):
+    """Index the age columns the retention job deletes by."""
+    await db.execute(
+        """
+        CREATE INDEX IF NOT EXISTS idx_game_scores_played
+        ON game_scores (played_at)
+        """
+    )
+    await db.execute(
+        """
+        CREATE INDEX IF NOT EXISTS idx_subscriptions_inactive_start
+        ON subscriptions (start_date) WHERE active = FALSE
+        """
+    )
+
+@migration(8, "subscription metrics counters")
+async def _add_subscription_metrics(db):
+    """Classify history rows and add the counters subscription reports read."""
+    await db.execute("ALTER TABLE subscription_history ADD COLUMN change_kind TEXT")
+
+    # Tier levels match database.TIER_LEVELS
+    await db.execute(
+        """
+        UPDATE subscription_history SET change_kind = CASE
+            WHEN previous_tier = 'None' THEN 'new'
+            WHEN previous_tier != 'Basic' AND new_tier = 'Basic' AND reason LIKE '%expired%' THEN 'expiration'
+            WHEN previous_tier = new_tier THEN 'renewal'
+            WHEN (CASE new_tier WHEN 'Pro' THEN 2 WHEN 'Premium' THEN 1 ELSE 0 END)
+               > (CASE previous_tier WHEN 'Pro' THEN 2 WHEN 'Premium' THEN 1 ELSE 0 END) THEN 'upgrade'
+            ELSE 'downgrade'
+        END
+        """
+    )
+
+    # Subscription changes per UTC day and kind
+    await db.execute(
+        """
+        CREATE TABLE IF NOT EXISTS subscription_daily_metrics (
+            day INTEGER NOT NULL,
+            kind TEXT NOT NULL,
+            count INTEGER NOT NULL,
+            PRIMARY KEY (day, kind)
+        ) WITHOUT ROWID
+        """
+    )
+    await db.execute(
+        """
+        INSERT INTO subscription_daily_metrics (day, kind, count)
+        SELECT changed_at - changed_at % 86400, change_kind, COUNT(*)
+        FROM subscription_history
+        GROUP BY 1, 2
+        """
+    )
+
+    # Active subscriptions per tier
+    await db.execute(
+        """
+        CREATE TABLE IF NOT EXISTS subscription_tier_counts (
+            tier TEXT PRIMARY KEY,
+            count INTEGER NOT NULL
+        )
+        """
+    )
+    await db.execute(
+        """
+        INSERT INTO subscription_tier_counts (tier, count)
+        SELECT tier, COUNT(*) FROM subscriptions
+        WHERE active = TRUE
+        GROUP BY tier
+        """
+    )
+
+@migration(9, "content rotation state")
+async def _add_content_seen(db):
+    """Add the per-user record of content already shown, one bitset per kind and category."""
+    await db.execute(
+        """
+        CREATE TABLE IF NOT EXISTS content_seen (
+            user_id INTEGER NOT NULL,
+            kind TEXT NOT NULL,
+            category TEXT NOT NULL,
+            seen BLOB NOT NULL,
+            updated_at INTEGER NOT NULL,
+            PRIMARY KEY (user_id, kind, category)
+        ) WITHOUT ROWID
+        """
+    )
@@ -14,7 +14,7 @@ import random
 import string
 
 import config
-import database
+import storage
 
 logger = logging.getLogger("tainment_bot.payment")
 
@@ -190,7 +190,7 @@ async def complete_subscription_purchase(user_id, username, transaction_id, tier
     
     # Update the user's subscription
     try:
-        success = await database.update_subscription(user_id, tier, duration_days)
+        success = await storage.backend.update_subscription(user_id, tier, duration_days)
         
         if success:
             logger.info(f"Subscription activated: {tier} for user {username} (ID: {user_id}) for {duration_months} months")
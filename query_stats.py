@@ -0,0 +1,293 @@
+"""
+Tainment+ Discord Bot - Query Statistics
+
+This module times every statement run on the pooled SQLite connections and
+keeps per-query-site latency histograms (count, rows, p50/p95/p99), plus a
+log of slow statements with their query plans. Query sites are named after
+the calling function and line, e.g. "database.get_leaderboard:735".
+"""
+
+import collections
+import logging
+import random
+import re
+import sys
+import time
+
+logger = logging.getLogger("tainment_bot.query_stats")
+
+# Modules skipped when naming the query site that issued a statement
+_INTERNAL_MODULES = {__name__, "contextlib", "asyncio", "aiosqlite.core"}
+
+def _query_site():
+    """Name the function (module.function:line) outside this module that issued a statement."""
+    frame = sys._getframe(2)
+    while frame is not None and frame.f_globals.get("__name__") in _INTERNAL_MODULES:
+        frame = frame.f_back
+
+    if frame is None:
+        return "unknown"
+
+    return f"{frame.f_globals.get('__name__')}.{frame.f_code.co_name}:{frame.f_lineno}"
+
+def _parameter_shape(parameters, many=False):
+    """Describe parameters by type only, so the slow-query log never records user data."""
+    if many:
+        batch = list(parameters) if parameters is not None else []
+        first = _parameter_shape(batch[0]) if batch else "()"
+        return f"{len(batch)} x {first}"
+
+    if parameters is None:
+        return "()"
+
+    if isinstance(parameters, dict):
+        return "{" + ", ".join(f"{key}: {type(value).__name__}" for key, value in parameters.items()) + "}"
+
+    return "(" + ", ".join(type(value).__name__ for value in parameters) + ")"
+
+class QueryHistogram:
+    """Latency and row counts for one query site, with percentiles from a bounded reservoir sample."""
+
+    def __init__(self, max_samples=1024):
+        self.max_samples = max_samples
+        self.count = 0
+        self.rows = 0
+        self.total_seconds = 0.0
+        self.max_seconds = 0.0
+        self._samples = []
+
+    def add(self, seconds, rows):
+        """Record one statement's duration and row count."""
+        self.count += 1
+        self.rows += rows
+        self.total_seconds += seconds
+        self.max_seconds = max(self.max_seconds, seconds)
+
+        # Reservoir sampling keeps a uniform sample of every duration seen
+        if len(self._samples) < self.max_samples:
+            self._samples.append(seconds)
+        else:
+            slot = random.randrange(self.count)
+            if slot < self.max_samples:
+                self._samples[slot] = seconds
+
+    def snapshot(self):
+        """Get the histogram's counters and percentiles in milliseconds."""
+        samples = sorted(self._samples)
+
+        def percentile(fraction):
+            if not samples:
+                return 0.0
+            return samples[min(len(samples) - 1, int(fraction * len(samples)))] * 1000
+
+        return {
+            "count": self.count,
+            "rows": self.rows,
+            "total_ms": self.total_seconds * 1000,
+            "mean_ms": self.total_seconds * 1000 / self.count if self.count else 0.0,
+            "p50_ms": percentile(0.50),
+            "p95_ms": percentile(0.95),
+            "p99_ms": percentile(0.99),
+            "max_ms": self.max_seconds * 1000
+        }
+
+class QueryStats:
+    """Per-query-site histograms and the slow-query log."""
+
+    def __init__(self, slow_query_ms=100, max_samples=1024, slow_log_size=50, explain_interval=60):
+        """
+        Create a statistics collector.
+
+        Args:
+            slow_query_ms: Statements slower than this are logged with their query plan
+            max_samples: Durations kept per query site for percentiles
+            slow_log_size: Number of recent slow statements kept for snapshots
+            explain_interval: Minimum seconds between query plans for the same query site
+        """
+        self.slow_query_seconds = slow_query_ms / 1000
+        self.max_samples = max_samples
+        self.explain_interval = explain_interval
+
+        self._histograms = {}
+        self._slow_queries = collections.deque(maxlen=slow_log_size)
+        self._last_explained = {}
+
+    def record(self, site, seconds, rows):
+        """Add one statement to its query site's histogram."""
+        histogram = self._histograms.get(site)
+        if histogram is None:
+            histogram = self._histograms[site] = QueryHistogram(self.max_samples)
+        histogram.add(seconds, rows)
+
+    def is_slow(self, seconds):
+        """Whether a duration crosses the slow-query threshold."""
+        return seconds >= self.slow_query_seconds
+
+    async def record_slow(self, db, site, sql, parameters, shape, seconds):
+        """Log a slow statement with its query plan (explained at most once per interval per site)."""
+        now = time.monotonic()
+        plan = None
+        if now - self._last_explained.get(site, -self.explain_interval) >= self.explain_interval:
+            self._last_explained[site] = now
+            plan = await _explain(db, sql, parameters)
+
+        sql = re.sub(r"\s+", " ", sql).strip()
+        self._slow_queries.append({
+            "site": site,
+            "ms": seconds * 1000,
+            "sql": sql,
+            "parameters": shape,
+            "plan": plan,
+            "at": time.time()
+        })
+
+        message = f"Slow query at {site} ({seconds * 1000:.1f} ms, parameters {shape}): {sql}"
+        if plan:
+            message += "\n  " + "\n  ".join(plan)
+        logger.warning(message)
+
+    def snapshot(self):
+        """
+        Get every query site's statistics and the recent slow queries.
+
+        Returns:
+            dict: {"queries": {site: stats}, "slow_queries": [entry, ...]}, sites sorted by total time
+        """
+        queries = {site: histogram.snapshot() for site, histogram in self._histograms.items()}
+        return {
+            "queries": dict(sorted(queries.items(), key=lambda item: item[1]["total_ms"], reverse=True)),
+            "slow_queries": list(self._slow_queries)
+        }
+
+    def reset(self):
+        """Clear every histogram and the slow-query log."""
+        self._histograms.clear()
+        self._slow_queries.clear()
+        self._last_explained.clear()
+
+async def _explain(db, sql, parameters):
+    """Get EXPLAIN QUERY PLAN output on the connection a statement ran on (None if unavailable)."""
+    try:
+        cursor = await db.execute(f"EXPLAIN QUERY PLAN {sql}", parameters or ())
+        rows = await cursor.fetchall()
+    except Exception as e:
+        logger.debug(f"Could not explain query: {e}")
+        return None
+
+    return [row[3] for row in rows]
+
+class InstrumentedCursor:
+    """Cursor proxy that finishes timing a statement once its rows are fetched."""
+
+    def __init__(self, cursor, stats, db, site, sql, parameters, shape, elapsed):
+        self._cursor = cursor
+        self._stats = stats
+        self._db = db
+        self._site = site
+        self._sql = sql
+        self._parameters = parameters
+        self._shape = shape
+        self._elapsed = elapsed
+        self._rows = 0
+        self._finished = False
+
+    def __getattr__(self, name):
+        return getattr(self._cursor, name)
+
+    async def _finish(self):
+        """Record the statement (execute plus fetch time) once."""
+        if self._finished:
+            return
+        self._finished = True
+
+        self._stats.record(self._site, self._elapsed, self._rows)
+        if self._stats.is_slow(self._elapsed):
+            await self._stats.record_slow(
+                self._db, self._site, self._sql, self._parameters, self._shape, self._elapsed
+            )
+
+    async def _timed_fetch(self, fetch, *args):
+        started = time.perf_counter()
+        rows = await fetch(*args)
+        self._elapsed += time.perf_counter() - started
+        return rows
+
+    async def fetchone(self):
+        row = await self._timed_fetch(self._cursor.fetchone)
+        self._rows += row is not None
+        await self._finish()
+        return row
+
+    async def fetchall(self):
+        rows = await self._timed_fetch(self._cursor.fetchall)
+        self._rows += len(rows)
+        await self._finish()
+        return rows
+
+    async def fetchmany(self, size=None):
+        args = () if size is None else (size,)
+        rows = await self._timed_fetch(self._cursor.fetchmany, *args)
+        self._rows += len(rows)
+        if not rows:
+            await self._finish()
+        return rows
+
+    async def close(self):
+        await self._finish()
+        await self._cursor.close()
+
+class InstrumentedConnection:
+    """Connection proxy that times every statement by query site."""
+
+    def __init__(self, db, stats):
+        self._db = db
+        self._stats = stats
+
+    def __getattr__(self, name):
+        return getattr(self._db, name)
+
+    def __setattr__(self, name, value):
+        if name in ("_db", "_stats"):
+            object.__setattr__(self, name, value)
+        else:
+            setattr(self._db, name, value)
+
+    def execute(self, sql, parameters=None):
+        return self._run(self._db.execute, _query_site(), sql, parameters, many=False)
+
+    def executemany(self, sql, parameters):
+        return self._run(self._db.executemany, _query_site(), sql, parameters, many=True)
+
+    async def _run(self, execute, site, sql, parameters, many):
+        if many:
+            # Materialize generators so the batch can be both run and described
+            parameters = list(parameters)
+            args = (sql, parameters)
+        else:
+            args = (sql,) if parameters is None else (sql, parameters)
+
+        started = time.perf_counter()
+        cursor = await execute(*args)
+        elapsed = time.perf_counter() - started
+
+        shape = _parameter_shape(parameters, many)
+        explain_parameters = None if many else parameters
+        if many and parameters:
+            explain_parameters = parameters[0]
+
+        # Plans are explained on the underlying connection, so they aren't counted themselves
+        instrumented = InstrumentedCursor(
+            cursor, self._stats, self._db, site, sql, explain_parameters, shape, elapsed
+        )
+
+        # Statements without a result set are complete once executed
+        if cursor.description is None:
+            instrumented._rows = max(cursor.rowcount, 0)
+            await instrumented._finish()
+
+        return instrumented
+
+    async def commit(self):
+        started = time.perf_counter()
+        await self._db.commit()
+        self._stats.record(f"{_query_site()} (commit)", time.perf_counter() - started, 0)
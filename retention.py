@@ -0,0 +1,177 @@
+"""
+Tainment+ Discord Bot - Data Retention
+
+This module ages out old rows from the high-volume tables (raw usage events,
+game score history and replaced subscriptions), optionally copying them to an
+archive database first, and then returns the freed pages to the filesystem.
+Rows are removed in small chunks, one short write transaction each.
+"""
+
+import asyncio
+import logging
+
+import config
+import database
+
+logger = logging.getLogger("tainment_bot.retention")
+
+# Free pages released per incremental vacuum step
+VACUUM_STEP_PAGES = 1000
+
+async def get_policies():
+    """
+    Build the retention policies from config.
+
+    Raw usage events are only removed once they have been rolled up into
+    daily totals.
+
+    Returns:
+        list: (table, condition, cutoff) tuples, where condition selects rows older than cutoff
+    """
+    now = database.now_epoch()
+    policies = []
+
+    if config.USAGE_RETENTION_DAYS > 0:
+        rolled_up_to = await database.get_maintenance_state("usage_rolled_up_to") or 0
+        cutoff = min(now - config.USAGE_RETENTION_DAYS * database.SECONDS_PER_DAY, rolled_up_to)
+        policies.append(("usage_stats", "used_at < ?", cutoff))
+
+    if config.GAME_SCORE_RETENTION_DAYS > 0:
+        cutoff = now - config.GAME_SCORE_RETENTION_DAYS * database.SECONDS_PER_DAY
+        policies.append(("game_scores", "played_at < ?", cutoff))
+
+    if config.SUBSCRIPTION_RETENTION_DAYS > 0:
+        cutoff = now - config.SUBSCRIPTION_RETENTION_DAYS * database.SECONDS_PER_DAY
+        policies.append(("subscriptions", "active = FALSE AND start_date < ?", cutoff))
+
+    return policies
+
+async def _remove_chunk(table, condition, cutoff, chunk_size, archive_path):
+    """
+    Remove (and optionally archive) one chunk of old rows in a single transaction.
+
+    Returns:
+        int: Number of rows removed
+    """
+    async with database.pool.writer() as db:
+        # ATTACH and DETACH can't run inside a transaction
+        if archive_path:
+            await db.execute("ATTACH DATABASE ? AS archive", (archive_path,))
+
+        try:
+            await db.execute("BEGIN IMMEDIATE")
+            await db.execute("CREATE TEMP TABLE IF NOT EXISTS retention_chunk (id INTEGER PRIMARY KEY)")
+            await db.execute("DELETE FROM retention_chunk")
+            await db.execute(
+                f"INSERT INTO retention_chunk (id) SELECT id FROM main.{table} WHERE {condition} LIMIT ?",
+                (cutoff, chunk_size)
+            )
+
+            if archive_path:
+                await db.execute(
+                    f"CREATE TABLE IF NOT EXISTS archive.{table} AS SELECT * FROM main.{table} WHERE 0"
+                )
+                await db.execute(
+                    f"""
+                    INSERT INTO archive.{table}
+                    SELECT * FROM main.{table} WHERE id IN (SELECT id FROM retention_chunk)
+                    """
+                )
+
+            cursor = await db.execute(
+                f"DELETE FROM main.{table} WHERE id IN (SELECT id FROM retention_chunk)"
+            )
+            removed = cursor.rowcount
+            await db.commit()
+        except BaseException:
+            await db.rollback()
+            raise
+        finally:
+            if archive_path:
+                await db.execute("DETACH DATABASE archive")
+
+    return removed
+
+async def _get_pragma(name):
+    """Read an integer PRAGMA value."""
+    async with database.pool.reader() as db:
+        cursor = await db.execute(f"PRAGMA {name}")
+        return (await cursor.fetchone())[0]
+
+async def reclaim_space(full_vacuum=False):
+    """
+    Release free database pages back to the filesystem.
+
+    Incremental vacuum runs in small steps so other writes can interleave.
+    It only releases pages on databases created with auto_vacuum=INCREMENTAL;
+    a full VACUUM converts older files, but locks the database while it runs.
+
+    Args:
+        full_vacuum: Whether to run a full VACUUM instead
+
+    Returns:
+        int: Bytes released
+    """
+    page_size = await _get_pragma("page_size")
+    start_pages = await _get_pragma("page_count")
+
+    if full_vacuum:
+        async with database.pool.writer() as db:
+            await db.execute("PRAGMA auto_vacuum = INCREMENTAL")
+            await db.execute("VACUUM")
+    elif await _get_pragma("auto_vacuum") == 2:
+        while await _get_pragma("freelist_count") > 0:
+            async with database.pool.writer() as db:
+                cursor = await db.execute(f"PRAGMA incremental_vacuum({VACUUM_STEP_PAGES})")
+                await cursor.fetchall()
+            await asyncio.sleep(0)
+    else:
+        logger.info("Incremental vacuum is not enabled on this database; freed pages will be reused instead")
+
+    end_pages = await _get_pragma("page_count")
+    return (start_pages - end_pages) * page_size
+
+async def run_retention(chunk_size=None, archive_path=None, full_vacuum=None):
+    """
+    Apply every retention policy, then reclaim the freed space.
+
+    Args:
+        chunk_size: Rows removed per transaction (defaults to config.RETENTION_CHUNK_SIZE)
+        archive_path: Database file rows are copied to before removal
+            (defaults to config.RETENTION_ARCHIVE_PATH; empty deletes without archiving)
+        full_vacuum: Whether to run a full VACUUM (defaults to config.RETENTION_FULL_VACUUM)
+
+    Returns:
+        dict: Rows removed per table and bytes reclaimed
+    """
+    chunk_size = chunk_size or config.RETENTION_CHUNK_SIZE
+    archive_path = config.RETENTION_ARCHIVE_PATH if archive_path is None else archive_path
+    full_vacuum = config.RETENTION_FULL_VACUUM if full_vacuum is None else full_vacuum
+
+    rows_removed = {}
+    for table, condition, cutoff in await get_policies():
+        total = 0
+        while True:
+            removed = await _remove_chunk(table, condition, cutoff, chunk_size, archive_path)
+            total += removed
+            if removed < chunk_size:
+                break
+
+            # Let queued interactive writes through before the next chunk
+            await asyncio.sleep(0)
+
+        rows_removed[table] = total
+
+    bytes_reclaimed = await reclaim_space(full_vacuum)
+
+    report = {
+        "rows_removed": rows_removed,
+        "archived": bool(archive_path),
+        "bytes_reclaimed": bytes_reclaimed
+    }
+    logger.info(
+        f"Retention removed {sum(rows_removed.values())} rows "
+        f"({', '.join(f'{table}: {count}' for table, count in rows_removed.items()) or 'no policies'}), "
+        f"reclaimed {bytes_reclaimed} bytes"
+    )
+    return report
@@ -0,0 +1,310 @@
+"""
+Tainment+ Discord Bot - Content Rotation
+
+This module picks jokes and stories for each user from a shuffle bag per
+content kind and category, so nobody sees the same item twice until they
+have seen everything in the category their tier can access. What a user has
+seen is a bitset keyed by catalog index; bitsets for active users stay in an
+LRU cache and are written to storage in batches in the background.
+"""
+
+import asyncio
+import logging
+import random
+
+import config
+import storage
+from cache import LRUCache, MISSING
+
+logger = logging.getLogger("tainment_bot.rotation")
+
+# Random draws tried before scanning a bag for its remaining unseen items
+RANDOM_PROBES = 8
+
+# Set bits in every byte value
+_BYTE_BITS = bytes(bin(value).count("1") for value in range(256))
+
+class SeenBag:
+    """The items of one category a user has already seen, as a bitset."""
+
+    __slots__ = ("bits", "seen", "end")
+
+    def __init__(self, bits=b""):
+        self.bits = bytearray(bits)
+        # Number of set bits
+        self.seen = sum(_BYTE_BITS[value] for value in self.bits)
+        # One past the highest set bit (0 if none)
+        self.end = 0
+        for byte in range(len(self.bits) - 1, -1, -1):
+            if self.bits[byte]:
+                self.end = byte * 8 + self.bits[byte].bit_length()
+                break
+
+    def is_seen(self, index):
+        """Whether the item at index has been seen."""
+        byte = index >> 3
+        return byte < len(self.bits) and bool(self.bits[byte] >> (index & 7) & 1)
+
+    def mark(self, index):
+        """Mark the item at index as seen."""
+        byte = index >> 3
+        if byte >= len(self.bits):
+            self.bits.extend(bytes(byte + 1 - len(self.bits)))
+        if not self.bits[byte] >> (index & 7) & 1:
+            self.bits[byte] |= 1 << (index & 7)
+            self.seen += 1
+            self.end = max(self.end, index + 1)
+
+    def clear(self):
+        """Forget everything seen, starting the rotation over."""
+        self.bits = bytearray()
+        self.seen = 0
+        self.end = 0
+
+    def unseen(self, size):
+        """Count the unseen items among the first size."""
+        if self.end <= size:
+            return size - self.seen
+
+        # Items beyond size were seen on a higher tier; only count the ones below it
+        full, rest = divmod(size, 8)
+        bits = self.bits
+        seen = sum(_BYTE_BITS[value] for value in bits[:full])
+        if rest:
+            seen += _BYTE_BITS[bits[full] & ((1 << rest) - 1)]
+        return size - seen
+
+    def _nth_unseen(self, size, n):
+        """Find the index of the n-th (0-based) unseen item among the first size."""
+        bits = self.bits
+        for byte in range((size + 7) // 8):
+            value = bits[byte] if byte < len(bits) else 0
+            width = min(8, size - byte * 8)
+            unseen = width - _BYTE_BITS[value & ((1 << width) - 1)]
+            if n >= unseen:
+                n -= unseen
+                continue
+            for bit in range(width):
+                if not value >> bit & 1:
+                    if n == 0:
+                        return byte * 8 + bit
+                    n -= 1
+        raise IndexError(n)
+
+    def draw(self, size):
+        """
+        Pick a random unseen index below size and mark it seen.
+
+        Once every item below size has been seen, the bag is emptied and the
+        rotation starts over.
+
+        Returns:
+            int: The picked index
+        """
+        unseen = self.unseen(size)
+        if not unseen:
+            self.clear()
+            unseen = size
+
+        # Random probes are cheap while a good share of the bag is unseen
+        if unseen * 4 >= size:
+            for _ in range(RANDOM_PROBES):
+                index = random.randrange(size)
+                if not self.is_seen(index):
+                    self.mark(index)
+                    return index
+
+        index = self._nth_unseen(size, random.randrange(unseen))
+        self.mark(index)
+        return index
+
+class ContentRotation:
+    """Per-user shuffle bags for catalog content, cached in memory and saved in batches."""
+
+    def __init__(self, max_entries=20000, flush_interval=60):
+        """
+        Create a rotation.
+
+        Args:
+            max_entries: Maximum (user, kind, category) bags kept in memory
+            flush_interval: Seconds between background writes of changed bags
+        """
+        self.flush_interval = flush_interval
+
+        self._bags = LRUCache(max_entries, on_evict=self._evicted)
+        # Keys of cached bags changed since the last flush
+        self._dirty = set()
+        # Bitsets of changed bags evicted before they were written
+        self._pending = {}
+        self._task = None
+        # Set to end the flush loop (created with the task, so it binds to the running loop)
+        self._stopping = None
+
+    def _evicted(self, key, bag):
+        """Keep an evicted bag's changes until the next flush writes them."""
+        if key in self._dirty:
+            self._dirty.discard(key)
+            self._pending[key] = bytes(bag.bits)
+
+    async def _bag(self, user_id, kind, category):
+        """
+        Get a user's bag for a category, loading it from storage on a cache miss.
+
+        Returns:
+            SeenBag: The cached bag, or None if it couldn't be loaded
+        """
+        key = (user_id, kind, category)
+        bag = self._bags.get(key)
+        if bag is not MISSING:
+            return bag
+
+        # Unsaved bitsets win over stored ones (a flush may take them while we wait)
+        bits = self._pending.get(key)
+        if bits is None:
+            try:
+                stored = await storage.backend.get_content_seen(user_id, kind, category)
+            except Exception as e:
+                logger.error(f"Error loading seen {kind} content for user {user_id}: {e}")
+                return None
+            bits = self._pending.get(key, stored)
+
+        return self._cache_bag(key, bits)
+
+    async def _bags_for(self, user_id, kind, categories):
+        """
+        Get a user's bags for several categories, loading any cache misses in one query.
+
+        Returns:
+            dict: {category: SeenBag}, or None if the bags couldn't be loaded
+        """
+        bags = {category: self._bags.get((user_id, kind, category)) for category in categories}
+        missing = [category for category, bag in bags.items() if bag is MISSING]
+        if not missing:
+            return bags
+
+        # Unsaved bitsets win over stored ones (a flush may take them while we wait)
+        unsaved = {category: self._pending.get((user_id, kind, category)) for category in missing}
+        try:
+            stored = await storage.backend.get_all_content_seen(user_id, kind)
+        except Exception as e:
+            logger.error(f"Error loading seen {kind} content for user {user_id}: {e}")
+            return None
+
+        for category in missing:
+            key = (user_id, kind, category)
+            bits = self._pending.get(key, unsaved[category])
+            bags[category] = self._cache_bag(key, bits if bits is not None else stored.get(category))
+        return bags
+
+    def _cache_bag(self, key, bits):
+        """Cache a loaded bag, unless another command loaded the same bag while this one waited."""
+        bag = self._bags.get(key, count=False)
+        if bag is MISSING:
+            bag = SeenBag(bits or b"")
+            self._bags.set(key, bag)
+        return bag
+
+    async def pick(self, user_id, catalog, tier, category=None):
+        """
+        Pick an item the user hasn't seen yet.
+
+        Args:
+            user_id: Discord user ID
+            catalog: Catalog to pick from
+            tier: The user's subscription tier
+            category: Optional category key; if missing or empty for the tier, the category
+                is picked at random, weighted by how many of its items the user hasn't seen
+
+        Returns:
+            tuple: (category, item), or (None, None) if the tier has no content
+        """
+        view = catalog.tier(tier)
+        if not view.categories:
+            return None, None
+
+        if category in view.counts:
+            bag = await self._bag(user_id, catalog.kind, category)
+            if bag is None:
+                # Without the user's history, fall back to a plain random pick
+                # rather than starting a rotation that would overwrite it
+                return catalog.choice(tier, category)
+        else:
+            bags = await self._bags_for(user_id, catalog.kind, view.categories)
+            if bags is None:
+                return catalog.choice(tier)
+
+            # Weight categories by what is left in them, so they run out together
+            bags = list(bags.values())
+            weights = [bag.unseen(view.counts[name]) for name, bag in zip(view.categories, bags)]
+            if not any(weights):
+                weights = [view.counts[name] for name in view.categories]
+            position = random.choices(range(len(bags)), weights=weights)[0]
+            category, bag = view.categories[position], bags[position]
+
+        index = bag.draw(view.counts[category])
+        self._dirty.add((user_id, catalog.kind, category))
+
+        if self._task is None:
+            self.start()
+
+        return category, catalog.item(category, index)
+
+    def start(self):
+        """Start the background flush loop. Safe to call more than once."""
+        if self._task is not None and not self._task.done():
+            return
+
+        self._stopping = asyncio.Event()
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """Stop the flush loop and write every changed bag."""
+        if self._task is not None:
+            # Let a flush already writing finish rather than cancelling it mid-batch
+            self._stopping.set()
+            await self._task
+            self._task = None
+
+        await self.flush()
+
+    async def flush(self):
+        """Write every changed bag to storage in one batch."""
+        entries = self._pending
+        self._pending = {}
+        for key in self._dirty:
+            bag = self._bags.get(key, count=False)
+            if bag is not MISSING:
+                entries[key] = bytes(bag.bits)
+        self._dirty.clear()
+
+        if not entries:
+            return
+
+        try:
+            await storage.backend.save_content_seen(
+                [(user_id, kind, category, bits) for (user_id, kind, category), bits in entries.items()]
+            )
+        except asyncio.CancelledError:
+            # Saving again is harmless, losing the batch is not
+            self._retry_later(entries)
+            raise
+        except Exception as e:
+            logger.error(f"Error saving seen content for {len(entries)} bags: {e}")
+            self._retry_later(entries)
+
+    def _retry_later(self, entries):
+        """Keep unsaved bitsets for the next flush, unless the bag has changed again since."""
+        for key, bits in entries.items():
+            if key not in self._dirty:
+                self._pending.setdefault(key, bits)
+
+    async def _run(self):
+        """Flush loop: write changed bags every flush interval until stopped."""
+        while not self._stopping.is_set():
+            try:
+                await asyncio.wait_for(self._stopping.wait(), self.flush_interval)
+            except asyncio.TimeoutError:
+                await self.flush()
+
+# Shared rotation for every command
+content_rotation = ContentRotation(config.CONTENT_ROTATION_CACHE_SIZE, config.CONTENT_ROTATION_FLUSH_INTERVAL)
@@ -0,0 +1,134 @@
+"""
+Tainment+ Discord Bot - Unique User Sketches
+
+This module provides a HyperLogLog sketch for counting distinct users. Each
+daily usage rollup keeps one per feature, so unique users over any range of
+days is a merge of a few fixed-size sketches instead of a scan over every
+user of every day. Counts are exact in practice for small numbers of users
+and within about 1.6% (one standard error) for large ones.
+"""
+
+import hashlib
+import math
+
+# Registers are indexed by the top PRECISION bits of a 64-bit hash
+PRECISION = 12
+REGISTERS = 1 << PRECISION
+
+# Bias correction for the raw estimate (Flajolet et al.)
+_ALPHA = 0.7213 / (1 + 1.079 / REGISTERS)
+
+# The high bit of every register, for merging all registers at once as one integer
+# (ranks never exceed 64 - PRECISION + 1, so the high bit is always free)
+_HIGH_BITS = int.from_bytes(b"\x80" * REGISTERS, "big")
+
+class UserSketch:
+    """A mergeable, fixed-size (REGISTERS bytes) estimate of a set of user IDs."""
+
+    __slots__ = ("registers",)
+
+    def __init__(self, registers=None):
+        """
+        Create a sketch.
+
+        Args:
+            registers: Serialized sketch (from to_bytes()) to start from, or None for an empty one
+        """
+        if registers is None:
+            self.registers = bytearray(REGISTERS)
+        elif len(registers) == REGISTERS:
+            self.registers = bytearray(registers)
+        else:
+            raise ValueError(f"Sketch must be {REGISTERS} bytes, got {len(registers)}")
+
+    def add(self, user_id):
+        """Add a user ID to the sketch."""
+        digest = hashlib.blake2b(str(user_id).encode(), digest_size=8).digest()
+        value = int.from_bytes(digest, "big")
+        index = value >> (64 - PRECISION)
+        rest = value & ((1 << (64 - PRECISION)) - 1)
+        # Position of the first set bit in the remaining bits (1-based)
+        rank = 64 - PRECISION - rest.bit_length() + 1
+        if rank > self.registers[index]:
+            self.registers[index] = rank
+
+    def update(self, other):
+        """Merge another sketch into this one (the union of both sets)."""
+        mine = int.from_bytes(self.registers, "big")
+        theirs = int.from_bytes(other.registers, "big")
+        # Per register, the high bit of (mine | 0x80) - theirs survives where mine >= theirs
+        keep = (((mine | _HIGH_BITS) - theirs) & _HIGH_BITS) >> 7
+        keep *= 0xFF
+        merged = (mine & keep) | (theirs & ~keep)
+        self.registers = bytearray(merged.to_bytes(REGISTERS, "big"))
+
+    def count(self):
+        """
+        Estimate the number of distinct user IDs added.
+
+        Returns:
+            int: Estimated distinct count
+        """
+        zeros = self.registers.count(0)
+        if zeros == REGISTERS:
+            return 0
+
+        estimate = _ALPHA * REGISTERS * REGISTERS / sum(2.0 ** -rank for rank in self.registers)
+        if estimate <= 2.5 * REGISTERS and zeros:
+            # Linear counting is far more accurate while many registers are empty
+            estimate = REGISTERS * math.log(REGISTERS / zeros)
+        return round(estimate)
+
+    def to_bytes(self):
+        """Serialize the sketch for storage."""
+        return bytes(self.registers)
+
+def summarize_usage(rows):
+    """
+    Fold per-user usage into per-feature totals.
+
+    Args:
+        rows: (feature, user_id, uses) tuples, one per feature and user
+
+    Returns:
+        dict: {feature: (uses, distinct users, UserSketch of the users)}
+    """
+    totals = {}
+    for feature, user_id, uses in rows:
+        count, users, sketch = totals.get(feature) or (0, 0, UserSketch())
+        sketch.add(user_id)
+        totals[feature] = (count + uses, users + 1, sketch)
+    return totals
+
+def combine_usage(daily_rows, raw_rows):
+    """
+    Combine rolled-up days with not yet rolled-up events into feature stats.
+
+    Args:
+        daily_rows: (feature, count, users_sketch) tuples from the daily rollup
+        raw_rows: (feature, user_id, uses) tuples for events newer than the rollup
+
+    Returns:
+        dict: {feature: {"count", "unique_users"}}, most used feature first
+    """
+    counts = {}
+    sketches = {}
+    for feature, count, users_sketch in daily_rows:
+        counts[feature] = counts.get(feature, 0) + count
+        sketch = UserSketch(users_sketch)
+        if feature in sketches:
+            sketches[feature].update(sketch)
+        else:
+            sketches[feature] = sketch
+
+    for feature, (count, _, sketch) in summarize_usage(raw_rows).items():
+        counts[feature] = counts.get(feature, 0) + count
+        if feature in sketches:
+            sketches[feature].update(sketch)
+        else:
+            sketches[feature] = sketch
+
+    return {
+        feature: {"count": count, "unique_users": sketches[feature].count()}
+        for feature, count in sorted(counts.items(), key=lambda item: item[1], reverse=True)
+    }
@@ -0,0 +1,379 @@
+"""
+Tainment+ Discord Bot - Storage Backends
+
+This module defines the storage interface every persistence backend provides
+(users, subscriptions, history, usage, scores, story progress and payments)
+and selects the backend the bot runs on. The SQLite backend is the default
+and is implemented by the database module; a PostgreSQL backend lets several
+bot processes share one database.
+"""
+
+import logging
+from abc import ABC, abstractmethod
+
+import config
+
+logger = logging.getLogger("tainment_bot.storage")
+
+class StorageBackend(ABC):
+    """
+    Interface implemented by every storage backend.
+
+    Timestamps are integer UTC epoch seconds. Rows are returned as mappings
+    with the same keys on every backend.
+    """
+
+    # Short backend name, e.g. "sqlite" or "postgres"
+    name = None
+
+    # Lifecycle
+
+    @abstractmethod
+    async def open(self):
+        """Connect and bring the schema up to date. Safe to call more than once."""
+
+    @abstractmethod
+    async def close(self):
+        """Flush buffered writes and close all connections."""
+
+    # Users
+
+    @abstractmethod
+    async def get_user(self, user_id):
+        """Get a user row, or None if the user doesn't exist."""
+
+    @abstractmethod
+    async def add_user(self, user_id, username):
+        """Add a user with a Basic subscription. Returns False if the user already exists."""
+
+    @abstractmethod
+    async def resolve_user_context(self, user_id, username):
+        """
+        Get (creating if needed) a user and their active subscription.
+
+        Returns:
+            dict: The user's ID, username, effective tier and active subscription
+        """
+
+    # Subscriptions
+
+    @abstractmethod
+    async def get_subscription(self, user_id):
+        """Get a user's active subscription, or None."""
+
+    @abstractmethod
+    async def add_subscription(self, user_id, tier, duration_days=30, transaction_id=None, payment_method=None):
+        """Replace a user's active subscription without recording history. Returns True."""
+
+    @abstractmethod
+    async def change_subscription(self, user_id, new_tier, duration_days=30, transaction_id=None, payment_method=None, admin_id=None, reason=None):
+        """Atomically replace a user's subscription and record the change. Returns the previous tier."""
+
+    @abstractmethod
+    async def update_subscription(self, user_id, new_tier, duration_days=30, transaction_id=None, payment_method=None, admin_id=None, reason=None):
+        """Like change_subscription(), but returns True."""
+
+    @abstractmethod
+    async def extend_subscription(self, user_id, additional_days, admin_id=None, reason=None):
+        """Push a paid subscription's end date back. Returns False for Basic or missing subscriptions."""
+
+    @abstractmethod
+    async def check_expiring_subscriptions(self, days_threshold=3):
+        """Get paid subscriptions ending within the threshold that haven't been reminded."""
+
+    @abstractmethod
+    async def mark_renewal_reminder_sent(self, subscription_id):
+        """Record that a renewal reminder was sent. Returns True."""
+
+    @abstractmethod
+    async def check_expired_subscriptions(self):
+        """Get paid subscriptions that have ended but are still in their grace period."""
+
+    @abstractmethod
+    async def check_grace_period_expired_subscriptions(self):
+        """Get paid subscriptions whose grace period has ended."""
+
+    @abstractmethod
+    async def downgrade_expired_subscriptions(self, chunk_size=None):
+        """Move subscriptions past their grace period to Basic. Returns the affected user IDs."""
+
+    @abstractmethod
+    async def get_all_subscribers(self, tier=None, active_only=True):
+        """Get every subscriber (with username), newest first."""
+
+    @abstractmethod
+    async def count_subscribers(self, tier=None, active_only=True):
+        """Count subscribers."""
+
+    @abstractmethod
+    async def get_subscribers_page(self, tier=None, after=None, before=None, limit=10, active_only=True):
+        """
+        Get one keyset-paginated page of subscribers, newest first.
+
+        Returns:
+            tuple: (list, bool) - The page and whether more exist in the direction fetched
+        """
+
+    @abstractmethod
+    def iter_subscribers(self, tier=None, active_only=True, chunk_size=500):
+        """Stream subscribers as an async iterator of chunks (lists of dicts), newest first."""
+
+    @abstractmethod
+    async def get_subscription_metrics(self, days=30):
+        """Get active counts per tier and subscription changes per kind over whole UTC days."""
+
+    # History
+
+    @abstractmethod
+    async def log_subscription_change(self, user_id, previous_tier, new_tier, admin_id=None, reason=None):
+        """Record a subscription change. Returns True."""
+
+    @abstractmethod
+    async def get_subscription_history(self, user_id, limit=10):
+        """Get a user's most recent subscription changes, newest first."""
+
+    # Usage
+
+    @abstractmethod
+    async def log_feature_usage(self, user_id, feature):
+        """Record a feature use (may be buffered). Returns True."""
+
+    @abstractmethod
+    async def flush_usage_events(self):
+        """Write any buffered feature usage events now."""
+
+    @abstractmethod
+    async def get_feature_usage_stats(self, feature=None, days=30):
+        """Get use counts and unique users per feature over whole UTC days."""
+
+    @abstractmethod
+    async def rollup_usage_stats(self):
+        """Run any usage aggregation the backend needs. Returns the number of days rolled up."""
+
+    # Retention
+
+    @abstractmethod
+    async def apply_retention(self, chunk_size=None):
+        """Age out old usage events, score history and replaced subscriptions. Returns a report dict."""
+
+    # Game scores
+
+    @abstractmethod
+    async def update_game_score(self, user_id, game_name, score):
+        """
+        Record a score if it beats the user's best.
+
+        Returns:
+            tuple: (bool, int) - Whether the score was a new best and the user's best score
+        """
+
+    @abstractmethod
+    async def get_user_best_score(self, user_id, game_name):
+        """Get a user's best score for a game (0 if none)."""
+
+    @abstractmethod
+    async def get_user_game_standing(self, user_id, game_name):
+        """Get a user's (rank, best score) for a game, or (0, 0) if unranked. Ties share a rank."""
+
+    @abstractmethod
+    async def get_leaderboard(self, game_name, limit=10):
+        """Get the top (user_id, score) tuples for a game, best first and earliest first on ties."""
+
+    @abstractmethod
+    async def get_available_games(self):
+        """Get the names of all games with scores, sorted."""
+
+    # Story progress
+
+    @abstractmethod
+    async def update_story_progress(self, user_id, story_name, part):
+        """Save the part of a story a user is on. Returns True."""
+
+    @abstractmethod
+    async def get_story_progress(self, user_id, story_name):
+        """Get a user's story progress ({"current_part", "last_read"}), starting at part 1."""
+
+    # Content rotation
+
+    @abstractmethod
+    async def get_content_seen(self, user_id, kind, category):
+        """Get the bitset (bytes) of a category's content a user has seen, or None."""
+
+    @abstractmethod
+    async def get_all_content_seen(self, user_id, kind):
+        """Get {category: bitset} for every category of a kind with content the user has seen."""
+
+    @abstractmethod
+    async def save_content_seen(self, entries):
+        """Save (user_id, kind, category, seen) bitsets, replacing earlier ones, in one transaction."""
+
+    # Payments
+
+    @abstractmethod
+    async def record_payment_transaction(self, transaction_id, user_id, amount, status, tier, duration_days):
+        """Record a payment. Returns False if it couldn't be recorded (e.g. duplicate ID)."""
+
+    @abstractmethod
+    async def get_user_payment_history(self, user_id, limit=10):
+        """Get a user's most recent payments, newest first."""
+
+class SQLiteBackend(StorageBackend):
+    """Storage on a local SQLite file, implemented by the database module."""
+
+    name = "sqlite"
+
+    def __init__(self):
+        import database
+        self._db = database
+
+    async def open(self):
+        await self._db.init_db()
+
+    async def close(self):
+        await self._db.close_db()
+
+    async def get_user(self, user_id):
+        return await self._db.get_user(user_id)
+
+    async def add_user(self, user_id, username):
+        return await self._db.add_user(user_id, username)
+
+    async def resolve_user_context(self, user_id, username):
+        return await self._db.resolve_user_context(user_id, username)
+
+    async def get_subscription(self, user_id):
+        return await self._db.get_subscription(user_id)
+
+    async def add_subscription(self, user_id, tier, duration_days=30, transaction_id=None, payment_method=None):
+        return await self._db.add_subscription(user_id, tier, duration_days, transaction_id, payment_method)
+
+    async def change_subscription(self, user_id, new_tier, duration_days=30, transaction_id=None, payment_method=None, admin_id=None, reason=None):
+        return await self._db.change_subscription(
+            user_id, new_tier, duration_days, transaction_id, payment_method, admin_id, reason
+        )
+
+    async def update_subscription(self, user_id, new_tier, duration_days=30, transaction_id=None, payment_method=None, admin_id=None, reason=None):
+        return await self._db.update_subscription(
+            user_id, new_tier, duration_days, transaction_id, payment_method, admin_id, reason
+        )
+
+    async def extend_subscription(self, user_id, additional_days, admin_id=None, reason=None):
+        return await self._db.extend_subscription(user_id, additional_days, admin_id, reason)
+
+    async def check_expiring_subscriptions(self, days_threshold=3):
+        return await self._db.check_expiring_subscriptions(days_threshold)
+
+    async def mark_renewal_reminder_sent(self, subscription_id):
+        return await self._db.mark_renewal_reminder_sent(subscription_id)
+
+    async def check_expired_subscriptions(self):
+        return await self._db.check_expired_subscriptions()
+
+    async def check_grace_period_expired_subscriptions(self):
+        return await self._db.check_grace_period_expired_subscriptions()
+
+    async def downgrade_expired_subscriptions(self, chunk_size=None):
+        return await self._db.downgrade_expired_subscriptions(chunk_size)
+
+    async def get_all_subscribers(self, tier=None, active_only=True):
+        return await self._db.get_all_subscribers(tier, active_only)
+
+    async def count_subscribers(self, tier=None, active_only=True):
+        return await self._db.count_subscribers(tier, active_only)
+
+    async def get_subscribers_page(self, tier=None, after=None, before=None, limit=10, active_only=True):
+        return await self._db.get_subscribers_page(tier, after, before, limit, active_only)
+
+    def iter_subscribers(self, tier=None, active_only=True, chunk_size=500):
+        return self._db.iter_subscribers(tier, active_only, chunk_size)
+
+    async def get_subscription_metrics(self, days=30):
+        return await self._db.get_subscription_metrics(days)
+
+    async def log_subscription_change(self, user_id, previous_tier, new_tier, admin_id=None, reason=None):
+        return await self._db.log_subscription_change(user_id, previous_tier, new_tier, admin_id, reason)
+
+    async def get_subscription_history(self, user_id, limit=10):
+        return await self._db.get_subscription_history(user_id, limit)
+
+    async def log_feature_usage(self, user_id, feature):
+        return await self._db.log_feature_usage(user_id, feature)
+
+    async def flush_usage_events(self):
+        await self._db.usage_recorder.flush()
+
+    async def get_feature_usage_stats(self, feature=None, days=30):
+        return await self._db.get_feature_usage_stats(feature, days)
+
+    async def rollup_usage_stats(self):
+        return await self._db.rollup_usage_stats()
+
+    async def apply_retention(self, chunk_size=None):
+        import retention
+        return await retention.run_retention(chunk_size)
+
+    async def update_game_score(self, user_id, game_name, score):
+        return await self._db.update_game_score(user_id, game_name, score)
+
+    async def get_user_best_score(self, user_id, game_name):
+        return await self._db.get_user_best_score(user_id, game_name)
+
+    async def get_user_game_standing(self, user_id, game_name):
+        return await self._db.get_user_game_standing(user_id, game_name)
+
+    async def get_leaderboard(self, game_name, limit=10):
+        return await self._db.get_leaderboard(game_name, limit)
+
+    async def get_available_games(self):
+        return await self._db.get_available_games()
+
+    async def update_story_progress(self, user_id, story_name, part):
+        return await self._db.update_story_progress(user_id, story_name, part)
+
+    async def get_story_progress(self, user_id, story_name):
+        return await self._db.get_story_progress(user_id, story_name)
+
+    async def get_content_seen(self, user_id, kind, category):
+        return await self._db.get_content_seen(user_id, kind, category)
+
+    async def get_all_content_seen(self, user_id, kind):
+        return await self._db.get_all_content_seen(user_id, kind)
+
+    async def save_content_seen(self, entries):
+        await self._db.save_content_seen(entries)
+
+    async def record_payment_transaction(self, transaction_id, user_id, amount, status, tier, duration_days):
+        return await self._db.record_payment_transaction(
+            transaction_id, user_id, amount, status, tier, duration_days
+        )
+
+    async def get_user_payment_history(self, user_id, limit=10):
+        return await self._db.get_user_payment_history(user_id, limit)
+
+def create_backend(name=None, **options):
+    """
+    Create a (not yet opened) storage backend.
+
+    Args:
+        name: "sqlite" or "postgres" (defaults to config.STORAGE_BACKEND)
+        **options: Backend-specific options (see PostgresBackend)
+
+    Returns:
+        StorageBackend: The backend
+    """
+    name = (name or config.STORAGE_BACKEND).lower()
+
+    if name == "sqlite":
+        return SQLiteBackend()
+
+    if name in ("postgres", "postgresql"):
+        from storage_postgres import PostgresBackend
+        options.setdefault("dsn", config.POSTGRES_DSN)
+        options.setdefault("min_size", config.POSTGRES_POOL_MIN_SIZE)
+        options.setdefault("max_size", config.POSTGRES_POOL_MAX_SIZE)
+        return PostgresBackend(**options)
+
+    raise ValueError(f"Unknown storage backend: {name}")
+
+# The backend the bot runs on, opened in on_ready and closed on shutdown
+backend = create_backend()
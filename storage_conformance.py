@@ -0,0 +1,361 @@
+#!/usr/bin/env python3
+"""
+Tainment+ Discord Bot - Storage Conformance Suite
+
+This module runs the same behavioural checks against any storage backend, so
+every backend is held to the semantics the bot relies on. Run it against an
+empty database:
+
+    python storage_conformance.py sqlite
+    python storage_conformance.py postgres --dsn postgresql://localhost/tainment_test
+
+The SQLite run uses a temporary file. The PostgreSQL run works in a fresh
+schema, dropped afterwards unless --keep is given.
+"""
+
+import argparse
+import asyncio
+import logging
+import os
+import sys
+import tempfile
+import time
+import traceback
+import uuid
+
+import config
+
+logger = logging.getLogger("tainment_bot.storage_conformance")
+
+# Registered checks, run in definition order
+CHECKS = []
+
+DAY = 86400
+
+def conformance_check(func):
+    """Register a coroutine function taking a backend as a conformance check."""
+    CHECKS.append(func)
+    return func
+
+def expect(condition, message):
+    """Fail the current check unless condition holds."""
+    if not condition:
+        raise AssertionError(message)
+
+@conformance_check
+async def check_users(backend):
+    expect(await backend.get_user(1001) is None, "unknown user should be None")
+    expect(await backend.add_user(1001, "alice") is True, "first add_user should succeed")
+    expect(await backend.add_user(1001, "alice") is False, "second add_user should report an existing user")
+
+    user = await backend.get_user(1001)
+    expect(user["username"] == "alice", "get_user should return the username")
+
+    subscription = await backend.get_subscription(1001)
+    expect(subscription["tier"] == "Basic", "new users should start on Basic")
+    expect(subscription["end_date"] is None, "Basic subscriptions should not expire")
+
+@conformance_check
+async def check_resolve_user_context(backend):
+    context = await backend.resolve_user_context(1002, "bob")
+    expect(context["tier"] == "Basic", "new users should resolve to Basic")
+    expect(context["subscription"]["user_id"] == 1002, "context should carry the active subscription")
+
+    context = await backend.resolve_user_context(1002, "bobby")
+    expect((await backend.get_user(1002))["username"] == "bobby", "username changes should be saved")
+    expect(await backend.count_subscribers() >= 1, "subscribers should be countable")
+
+    await backend.change_subscription(1002, "Premium", duration_days=-1)
+    context = await backend.resolve_user_context(1002, "bobby")
+    expect(context["subscription"]["tier"] == "Premium", "context should return the stored tier")
+    expect(context["tier"] == "Basic", "lapsed paid subscriptions should grant Basic")
+
+@conformance_check
+async def check_change_subscription(backend):
+    await backend.add_user(1003, "carol")
+    before = int(time.time())
+
+    previous = await backend.change_subscription(1003, "Pro", duration_days=30, admin_id=1, reason="test")
+    expect(previous == "Basic", f"previous tier should be Basic, got {previous}")
+
+    subscription = await backend.get_subscription(1003)
+    expect(subscription["tier"] == "Pro", "active subscription should be Pro")
+    expect(abs(subscription["end_date"] - (before + 30 * DAY)) <= 5, "end date should be 30 days out")
+    expect(subscription["grace_period_end"] == subscription["end_date"] + 3 * DAY, "grace period should be 3 days")
+
+    all_rows = await backend.get_all_subscribers(active_only=False)
+    active = [row for row in all_rows if row["user_id"] == 1003 and row["active"]]
+    expect(len(active) == 1, "exactly one subscription should be active")
+
+    expect(await backend.update_subscription(1003, "Premium") is True, "update_subscription should return True")
+    history = await backend.get_subscription_history(1003)
+    kinds = sorted(row["change_kind"] for row in history)
+    expect(kinds == ["downgrade", "upgrade"], f"history should record an upgrade and a downgrade, got {kinds}")
+    expect(all(row["user_id"] == 1003 for row in history), "history should be per user")
+
+@conformance_check
+async def check_extend_subscription(backend):
+    await backend.add_user(1004, "dave")
+    expect(await backend.extend_subscription(1004, 5) is False, "Basic subscriptions can't be extended")
+
+    await backend.change_subscription(1004, "Premium", duration_days=10)
+    end_date = (await backend.get_subscription(1004))["end_date"]
+    expect(await backend.extend_subscription(1004, 5, admin_id=1) is True, "extension should succeed")
+
+    subscription = await backend.get_subscription(1004)
+    expect(subscription["end_date"] == end_date + 5 * DAY, "end date should move 5 days")
+    expect(subscription["grace_period_end"] == end_date + 8 * DAY, "grace period should follow the end date")
+
+    history = await backend.get_subscription_history(1004, limit=1)
+    expect(history[0]["change_kind"] == "renewal", "extensions should be recorded as renewals")
+
+@conformance_check
+async def check_expiry(backend):
+    for user_id in (1005, 1006, 1007):
+        await backend.add_user(user_id, f"user{user_id}")
+
+    await backend.change_subscription(1005, "Premium", duration_days=2)    # expiring soon
+    await backend.change_subscription(1006, "Premium", duration_days=-1)   # in grace period
+    await backend.change_subscription(1007, "Pro", duration_days=-10)      # past grace period
+
+    expiring = {row["user_id"]: row for row in await backend.check_expiring_subscriptions(3)}
+    expect(set(expiring) & {1005, 1006, 1007} == {1005}, "only 1005 should be expiring")
+    expect(expiring[1005]["username"] == "user1005", "expiring rows should include the username")
+
+    await backend.mark_renewal_reminder_sent(expiring[1005]["id"])
+    expiring = await backend.check_expiring_subscriptions(3)
+    expect(1005 not in {row["user_id"] for row in expiring}, "reminded subscriptions should not be returned")
+
+    expired = {row["user_id"] for row in await backend.check_expired_subscriptions()}
+    expect(expired & {1005, 1006, 1007} == {1006}, "only 1006 should be in its grace period")
+
+    lapsed = {row["user_id"] for row in await backend.check_grace_period_expired_subscriptions()}
+    expect(lapsed & {1005, 1006, 1007} == {1007}, "only 1007 should be past its grace period")
+
+    downgraded = await backend.downgrade_expired_subscriptions(chunk_size=1)
+    expect(1007 in downgraded and 1006 not in downgraded, "only lapsed subscriptions should be downgraded")
+    expect((await backend.get_subscription(1007))["tier"] == "Basic", "lapsed users should be on Basic")
+    expect(await backend.downgrade_expired_subscriptions() == [], "a second run should find nothing")
+
+    history = await backend.get_subscription_history(1007, limit=1)
+    expect(history[0]["change_kind"] == "expiration", "downgrades should be recorded as expirations")
+
+@conformance_check
+async def check_subscriber_listing(backend):
+    for user_id in range(1100, 1125):
+        await backend.add_user(user_id, f"sub{user_id}")
+        if user_id % 2:
+            await backend.change_subscription(user_id, "Pro")
+
+    everyone = await backend.get_all_subscribers()
+    expect(len(everyone) == await backend.count_subscribers(), "count should match the listing")
+    expect(all("username" in row for row in everyone), "listings should include usernames")
+
+    pro = await backend.get_all_subscribers(tier="Pro")
+    expect(len(pro) == await backend.count_subscribers(tier="Pro"), "tier counts should match")
+    expect(all(row["tier"] == "Pro" for row in pro), "tier filter should apply")
+
+    # Walk forwards and back again through every page
+    pages = []
+    rows, has_more = await backend.get_subscribers_page(limit=7)
+    pages.append(rows)
+    while has_more:
+        last = pages[-1][-1]
+        rows, has_more = await backend.get_subscribers_page(after=(last["start_date"], last["id"]), limit=7)
+        pages.append(rows)
+
+    ids = [row["id"] for page in pages for row in page]
+    expect(sorted(ids) == sorted(row["id"] for row in everyone), "pages should cover every subscriber once")
+    keys = [(row["start_date"], row["id"]) for page in pages for row in page]
+    expect(keys == sorted(keys, reverse=True), "pages should be newest first")
+
+    first = pages[-1][0]
+    rows, has_more = await backend.get_subscribers_page(before=(first["start_date"], first["id"]), limit=7)
+    expect([row["id"] for row in rows] == [row["id"] for row in pages[-2]], "paging back should return the previous page")
+
+    streamed = []
+    async for chunk in backend.iter_subscribers(chunk_size=4):
+        expect(len(chunk) <= 4, "chunks should respect chunk_size")
+        streamed.extend(row["id"] for row in chunk)
+    expect(sorted(streamed) == sorted(ids), "streaming should return every subscriber")
+
+@conformance_check
+async def check_subscription_metrics(backend):
+    metrics = await backend.get_subscription_metrics(days=30)
+    by_tier = metrics["subscribers_by_tier"]
+
+    expect(by_tier == {
+        tier: await backend.count_subscribers(tier=tier) for tier in by_tier
+    }, "tier counts should match the active subscriptions")
+    expect(metrics["total_subscribers"] == await backend.count_subscribers(), "total should match")
+    expect(metrics["upgrades"] >= 14 and metrics["expirations"] >= 1, "changes should be counted")
+    expect(metrics["period_days"] == 30, "period should be echoed")
+
+@conformance_check
+async def check_feature_usage(backend):
+    for user_id, feature in [(1200, "joke"), (1200, "joke"), (1201, "joke"), (1201, "story")]:
+        expect(await backend.log_feature_usage(user_id, feature) is True, "log_feature_usage should return True")
+
+    await backend.flush_usage_events()
+    await backend.rollup_usage_stats()
+
+    joke = await backend.get_feature_usage_stats("joke")
+    expect(joke == {"feature": "joke", "count": 3, "unique_users": 2}, f"unexpected joke stats {joke}")
+
+    stats = await backend.get_feature_usage_stats()
+    expect(stats["story"] == {"count": 1, "unique_users": 1}, f"unexpected story stats {stats}")
+    expect(list(stats)[0] == "joke", "features should be ordered by count")
+
+    missing = await backend.get_feature_usage_stats("nothing")
+    expect(missing["count"] == 0 and missing["unique_users"] == 0, "unused features should report zero")
+
+@conformance_check
+async def check_game_scores(backend):
+    expect(await backend.update_game_score(1300, "trivia", 0) == (False, 0), "zero scores never count")
+    expect(await backend.update_game_score(1300, "trivia", 10) == (True, 10), "first score should be a best")
+    expect(await backend.update_game_score(1300, "trivia", 5) == (False, 10), "lower scores should keep the best")
+    expect(await backend.update_game_score(1300, "trivia", 12) == (True, 12), "higher scores should replace the best")
+
+    await backend.update_game_score(1301, "trivia", 12)
+    await backend.update_game_score(1302, "trivia", 20)
+    await backend.update_game_score(1302, "riddle", 3)
+
+    leaderboard = await backend.get_leaderboard("trivia")
+    expect(leaderboard[0] == (1302, 20), f"unexpected leaderboard {leaderboard}")
+    expect(sorted(leaderboard[1:]) == [(1300, 12), (1301, 12)], f"unexpected leaderboard {leaderboard}")
+    expect(await backend.get_leaderboard("trivia", limit=1) == [(1302, 20)], "limit should apply")
+
+    expect(await backend.get_user_game_standing(1301, "trivia") == (2, 12), "tied players should share a rank")
+    expect(await backend.get_user_game_standing(1303, "trivia") == (0, 0), "unranked players should be (0, 0)")
+    expect(await backend.get_user_best_score(1300, "trivia") == 12, "best score should be returned")
+    expect(await backend.get_user_best_score(1300, "riddle") == 0, "missing scores should be 0")
+    expect(await backend.get_available_games() == ["riddle", "trivia"], "games should be listed sorted")
+
+@conformance_check
+async def check_story_progress(backend):
+    progress = await backend.get_story_progress(1400, "dragon")
+    expect(progress == {"current_part": 1, "last_read": None}, "stories should start at part 1")
+
+    expect(await backend.update_story_progress(1400, "dragon", 2) is True, "saving progress should succeed")
+    await backend.update_story_progress(1400, "dragon", 3)
+    progress = await backend.get_story_progress(1400, "dragon")
+    expect(progress["current_part"] == 3, "progress should be updated")
+    expect(type(progress["last_read"]) is int, f"last_read should be epoch seconds, got {progress['last_read']!r}")
+    expect(abs(progress["last_read"] - time.time()) < 60, "last_read should be the time of the update")
+    expect((await backend.get_story_progress(1401, "dragon"))["current_part"] == 1, "progress should be per user")
+
+@conformance_check
+async def check_content_seen(backend):
+    expect(await backend.get_content_seen(1450, "joke", "dad") is None, "nothing should be seen at first")
+
+    await backend.save_content_seen([(1450, "joke", "dad", b"\x05"), (1450, "story", "fable", b"\x01\x00")])
+    expect(await backend.get_content_seen(1450, "joke", "dad") == b"\x05", "bitsets should round-trip")
+    expect(await backend.get_content_seen(1450, "story", "fable") == b"\x01\x00", "bitsets should keep every byte")
+
+    await backend.save_content_seen([(1450, "joke", "dad", b"\x07\x01")])
+    expect(await backend.get_content_seen(1450, "joke", "dad") == b"\x07\x01", "saving should replace the bitset")
+    expect(await backend.get_content_seen(1451, "joke", "dad") is None, "bitsets should be per user")
+
+    seen = await backend.get_all_content_seen(1450, "joke")
+    expect(seen == {"dad": b"\x07\x01"}, f"all bitsets of a kind should load together, got {seen}")
+    expect(await backend.get_all_content_seen(1451, "joke") == {}, "users with nothing seen should get no bitsets")
+
+    await backend.save_content_seen([])
+
+@conformance_check
+async def check_payments(backend):
+    await backend.add_user(1500, "erin")
+    expect(await backend.record_payment_transaction("tx-1", 1500, 4.99, "completed", "Premium", 30) is True,
+           "payments should be recorded")
+    expect(await backend.record_payment_transaction("tx-1", 1500, 4.99, "completed", "Premium", 30) is False,
+           "duplicate transaction IDs should be rejected")
+
+    await backend.change_subscription(1500, "Pro", duration_days=30, transaction_id="tx-2", payment_method="card")
+    history = await backend.get_user_payment_history(1500)
+    expect({row["transaction_id"] for row in history} == {"tx-1", "tx-2"}, "subscription payments should be recorded")
+    expect(all(row["completed_at"] is not None for row in history), "payments should be completed")
+    expect(len(await backend.get_user_payment_history(1500, limit=1)) == 1, "limit should apply")
+
+    subscription = await backend.get_subscription(1500)
+    expect(subscription["transaction_id"] == "tx-2", "subscription should reference its payment")
+    expect(subscription["payment_method"] == "card", "subscription should keep the payment method")
+
+@conformance_check
+async def check_retention(backend):
+    report = await backend.apply_retention(chunk_size=2)
+    expect(isinstance(report["rows_removed"], dict), f"unexpected retention report {report}")
+
+    # Everything written by the checks above is recent, so nothing is aged out
+    joke = await backend.get_feature_usage_stats("joke")
+    expect(joke["count"] == 3, f"recent usage should be kept, got {joke}")
+    expect(await backend.get_user_best_score(1300, "trivia") == 12, "recent scores should be kept")
+    expect(len(await backend.get_subscription_history(1500)) >= 1, "history should be kept")
+
+async def run_checks(backend):
+    """
+    Run every conformance check against an opened backend.
+
+    Returns:
+        list: Names of the checks that failed
+    """
+    failed = []
+    for check in CHECKS:
+        name = check.__name__[len("check_"):]
+        try:
+            await check(backend)
+        except Exception:
+            failed.append(name)
+            print(f"FAIL  {name}")
+            traceback.print_exc()
+        else:
+            print(f"ok    {name}")
+    return failed
+
+async def main():
+    parser = argparse.ArgumentParser(description="Run the storage conformance suite against a backend.")
+    parser.add_argument("backend", choices=["sqlite", "postgres"])
+    parser.add_argument("--dsn", default=config.POSTGRES_DSN, help="PostgreSQL connection string")
+    parser.add_argument("--keep", action="store_true", help="Keep the test database or schema afterwards")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.WARNING)
+
+    if args.backend == "sqlite":
+        # The database module binds its connection pool to DB_PATH on import
+        workdir = tempfile.mkdtemp(prefix="tainment_conformance_")
+        config.DB_PATH = os.path.join(workdir, "conformance.db")
+        options = {}
+    else:
+        options = {"dsn": args.dsn, "schema": f"conformance_{uuid.uuid4().hex[:8]}"}
+
+    import storage
+    backend = storage.create_backend(args.backend, **options)
+
+    await backend.open()
+    try:
+        failed = await run_checks(backend)
+    finally:
+        await backend.close()
+        if not args.keep:
+            await _cleanup(args.backend, options)
+
+    print(f"{len(CHECKS) - len(failed)}/{len(CHECKS)} checks passed on {backend.name}")
+    return 1 if failed else 0
+
+async def _cleanup(backend_name, options):
+    """Remove the database file or schema a run created."""
+    if backend_name == "sqlite":
+        for suffix in ("", "-wal", "-shm"):
+            if os.path.exists(config.DB_PATH + suffix):
+                os.remove(config.DB_PATH + suffix)
+        os.rmdir(os.path.dirname(config.DB_PATH))
+    else:
+        import asyncpg
+        conn = await asyncpg.connect(options["dsn"])
+        try:
+            await conn.execute(f'DROP SCHEMA IF EXISTS "{options["schema"]}" CASCADE')
+        finally:
+            await conn.close()
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(main()))
@@ -0,0 +1,1116 @@
+"""
+Tainment+ Discord Bot - PostgreSQL Storage Backend
+
+This module implements the storage interface on PostgreSQL using asyncpg, so
+several bot processes can share one database. Timestamps are stored as
+BIGINT UTC epoch seconds, the same as the SQLite schema, and rows are
+returned as dicts with the same keys.
+"""
+
+import logging
+from contextlib import asynccontextmanager
+
+import config
+from database import (
+    GRACE_PERIOD_DAYS, SECONDS_PER_DAY, day_start, get_change_kind,
+    get_effective_tier, now_epoch
+)
+from sketch import combine_usage, summarize_usage
+from storage import StorageBackend
+from usage_recorder import UsageRecorder
+
+try:
+    import asyncpg
+except ImportError:
+    asyncpg = None
+
+logger = logging.getLogger("tainment_bot.storage_postgres")
+
+# Advisory lock keys serializing schema setup and the usage rollup between processes
+SCHEMA_LOCK_KEY = 0x7461696E
+ROLLUP_LOCK_KEY = 0x7461696F
+
+# Schema, created on open(); every statement is idempotent
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS users (
+    user_id BIGINT PRIMARY KEY,
+    username TEXT NOT NULL,
+    joined_at BIGINT NOT NULL DEFAULT EXTRACT(EPOCH FROM now())::BIGINT
+);
+
+CREATE TABLE IF NOT EXISTS subscriptions (
+    id BIGSERIAL PRIMARY KEY,
+    user_id BIGINT NOT NULL,
+    tier TEXT NOT NULL,
+    start_date BIGINT NOT NULL DEFAULT EXTRACT(EPOCH FROM now())::BIGINT,
+    end_date BIGINT,
+    active BOOLEAN NOT NULL DEFAULT TRUE,
+    transaction_id TEXT,
+    payment_method TEXT,
+    grace_period_end BIGINT,
+    renewal_reminder_sent BOOLEAN NOT NULL DEFAULT FALSE
+);
+CREATE UNIQUE INDEX IF NOT EXISTS idx_subscriptions_one_active
+    ON subscriptions (user_id) WHERE active;
+CREATE INDEX IF NOT EXISTS idx_subscriptions_paid_end_date
+    ON subscriptions (end_date) WHERE active AND tier <> 'Basic';
+CREATE INDEX IF NOT EXISTS idx_subscriptions_paid_grace_end
+    ON subscriptions (grace_period_end) WHERE active AND tier <> 'Basic';
+CREATE INDEX IF NOT EXISTS idx_subscriptions_active_start
+    ON subscriptions (start_date, id) WHERE active;
+CREATE INDEX IF NOT EXISTS idx_subscriptions_active_tier_start
+    ON subscriptions (tier, start_date, id) WHERE active;
+
+CREATE TABLE IF NOT EXISTS subscription_history (
+    id BIGSERIAL PRIMARY KEY,
+    user_id BIGINT NOT NULL,
+    previous_tier TEXT NOT NULL,
+    new_tier TEXT NOT NULL,
+    changed_at BIGINT NOT NULL DEFAULT EXTRACT(EPOCH FROM now())::BIGINT,
+    reason TEXT,
+    admin_id BIGINT,
+    change_kind TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_subscription_history_user
+    ON subscription_history (user_id, changed_at);
+CREATE INDEX IF NOT EXISTS idx_subscription_history_changed
+    ON subscription_history (changed_at, change_kind);
+CREATE INDEX IF NOT EXISTS idx_subscriptions_inactive_start
+    ON subscriptions (start_date) WHERE NOT active;
+
+CREATE TABLE IF NOT EXISTS subscription_daily_metrics (
+    day BIGINT NOT NULL,
+    kind TEXT NOT NULL,
+    count BIGINT NOT NULL,
+    PRIMARY KEY (day, kind)
+);
+
+CREATE TABLE IF NOT EXISTS subscription_tier_counts (
+    tier TEXT PRIMARY KEY,
+    count BIGINT NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS maintenance_state (
+    name TEXT PRIMARY KEY,
+    value BIGINT NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS usage_stats (
+    id BIGSERIAL PRIMARY KEY,
+    user_id BIGINT NOT NULL,
+    feature TEXT NOT NULL,
+    used_at BIGINT NOT NULL DEFAULT EXTRACT(EPOCH FROM now())::BIGINT
+);
+CREATE INDEX IF NOT EXISTS idx_usage_stats_used_at
+    ON usage_stats (used_at, feature, user_id);
+
+CREATE TABLE IF NOT EXISTS usage_daily (
+    feature TEXT NOT NULL,
+    day BIGINT NOT NULL,
+    count BIGINT NOT NULL,
+    unique_users BIGINT NOT NULL,
+    users_sketch BYTEA NOT NULL,
+    PRIMARY KEY (day, feature)
+);
+
+CREATE TABLE IF NOT EXISTS game_scores (
+    id BIGSERIAL PRIMARY KEY,
+    user_id BIGINT NOT NULL,
+    game_name TEXT NOT NULL,
+    score INTEGER NOT NULL,
+    played_at BIGINT NOT NULL DEFAULT EXTRACT(EPOCH FROM now())::BIGINT
+);
+CREATE INDEX IF NOT EXISTS idx_game_scores_played
+    ON game_scores (played_at);
+
+CREATE TABLE IF NOT EXISTS best_scores (
+    game_name TEXT NOT NULL,
+    user_id BIGINT NOT NULL,
+    best_score INTEGER NOT NULL,
+    achieved_at BIGINT NOT NULL,
+    PRIMARY KEY (game_name, user_id)
+);
+CREATE INDEX IF NOT EXISTS idx_best_scores_game_score
+    ON best_scores (game_name, best_score DESC, achieved_at);
+
+CREATE TABLE IF NOT EXISTS story_progress (
+    id BIGSERIAL PRIMARY KEY,
+    user_id BIGINT NOT NULL,
+    story_name TEXT NOT NULL,
+    current_part INTEGER NOT NULL DEFAULT 1,
+    last_read BIGINT NOT NULL DEFAULT EXTRACT(EPOCH FROM now())::BIGINT,
+    UNIQUE (user_id, story_name)
+);
+
+CREATE TABLE IF NOT EXISTS content_seen (
+    user_id BIGINT NOT NULL,
+    kind TEXT NOT NULL,
+    category TEXT NOT NULL,
+    seen BYTEA NOT NULL,
+    updated_at BIGINT NOT NULL,
+    PRIMARY KEY (user_id, kind, category)
+);
+
+CREATE TABLE IF NOT EXISTS payment_transactions (
+    id BIGSERIAL PRIMARY KEY,
+    transaction_id TEXT UNIQUE NOT NULL,
+    user_id BIGINT NOT NULL,
+    amount DOUBLE PRECISION NOT NULL,
+    currency TEXT NOT NULL DEFAULT 'USD',
+    status TEXT NOT NULL,
+    tier TEXT NOT NULL,
+    duration_days INTEGER NOT NULL,
+    created_at BIGINT NOT NULL DEFAULT EXTRACT(EPOCH FROM now())::BIGINT,
+    completed_at BIGINT
+);
+CREATE INDEX IF NOT EXISTS idx_payment_transactions_user
+    ON payment_transactions (user_id, created_at);
+"""
+
+# Seeds the metrics counters from the rows written before they existed (run once)
+SEED_COUNTERS = """
+LOCK TABLE subscriptions, subscription_history IN SHARE MODE;
+
+INSERT INTO subscription_tier_counts (tier, count)
+SELECT tier, COUNT(*) FROM subscriptions
+WHERE active
+GROUP BY tier
+ON CONFLICT (tier) DO NOTHING;
+
+INSERT INTO subscription_daily_metrics (day, kind, count)
+SELECT changed_at - changed_at % 86400, change_kind, COUNT(*)
+FROM subscription_history
+GROUP BY 1, 2
+ON CONFLICT (day, kind) DO NOTHING;
+
+INSERT INTO maintenance_state (name, value) VALUES ('counters_seeded', 1);
+"""
+
+# User plus their active subscription (the partial unique index allows at most one)
+USER_CONTEXT_QUERY = """
+    SELECT u.username AS current_username, s.*
+    FROM users u
+    LEFT JOIN subscriptions s ON s.user_id = u.user_id AND s.active
+    WHERE u.user_id = $1
+"""
+
+def _subscriber_query(columns, tier=None, active_only=True):
+    """Build the subscriber listing query and its parameters."""
+    query = f"""
+        SELECT {columns}
+        FROM subscriptions s
+        JOIN users u ON s.user_id = u.user_id
+        WHERE TRUE
+    """
+    params = []
+
+    if active_only:
+        query += " AND s.active"
+
+    if tier:
+        params.append(tier)
+        query += f" AND s.tier = ${len(params)}"
+
+    return query, params
+
+class PostgresBackend(StorageBackend):
+    """
+    Storage on a shared PostgreSQL database.
+
+    Nothing is cached in-process, since other processes may change the same
+    rows. Subscription changes for a user are serialized across processes
+    with a transaction-scoped advisory lock on the user ID.
+    """
+
+    name = "postgres"
+
+    def __init__(self, dsn, min_size=1, max_size=10, schema=None):
+        """
+        Create a (not yet opened) PostgreSQL backend.
+
+        Args:
+            dsn: libpq connection string or URI
+            min_size: Connections kept open in the pool
+            max_size: Maximum pool connections
+            schema: Optional schema to create and use instead of the default search path
+        """
+        self.dsn = dsn
+        self.min_size = min_size
+        self.max_size = max(min_size, max_size)
+        self.schema = schema
+
+        self._pool = None
+
+        # Write-behind buffer for feature usage events, flushed in batches
+        self.usage_recorder = UsageRecorder(
+            self._write_usage_events,
+            flush_interval_ms=config.USAGE_FLUSH_INTERVAL_MS,
+            batch_size=config.USAGE_FLUSH_BATCH_SIZE,
+            max_queue=config.USAGE_QUEUE_SIZE
+        )
+
+    # Lifecycle
+
+    async def open(self):
+        if self._pool is not None:
+            return
+
+        if asyncpg is None:
+            raise RuntimeError("The PostgreSQL storage backend requires the asyncpg package")
+
+        server_settings = {"search_path": self.schema} if self.schema else None
+        pool = await asyncpg.create_pool(
+            self.dsn,
+            min_size=self.min_size,
+            max_size=self.max_size,
+            server_settings=server_settings
+        )
+
+        async with pool.acquire() as conn:
+            async with conn.transaction():
+                await conn.execute("SELECT pg_advisory_xact_lock($1)", SCHEMA_LOCK_KEY)
+                if self.schema:
+                    await conn.execute(f'CREATE SCHEMA IF NOT EXISTS "{self.schema}"')
+                await conn.execute(SCHEMA)
+                if await self._get_state(conn, "counters_seeded") is None:
+                    await conn.execute(SEED_COUNTERS)
+
+        self._pool = pool
+        self.usage_recorder.start()
+        logger.info(f"Opened PostgreSQL storage ({self.min_size}-{self.max_size} connections)")
+
+    async def close(self):
+        if self._pool is None:
+            return
+
+        await self.usage_recorder.stop()
+        await self._pool.close()
+        self._pool = None
+        logger.info("Closed PostgreSQL storage")
+
+    @asynccontextmanager
+    async def _connection(self):
+        """Borrow a pooled connection for the duration of the block."""
+        await self.open()
+        async with self._pool.acquire() as conn:
+            yield conn
+
+    @asynccontextmanager
+    async def _transaction(self, user_id=None):
+        """
+        Run the block as one transaction.
+
+        Args:
+            user_id: Serialize against other changes to this user's subscription
+        """
+        async with self._connection() as conn:
+            async with conn.transaction():
+                if user_id is not None:
+                    await conn.execute("SELECT pg_advisory_xact_lock($1)", user_id)
+                yield conn
+
+    async def _fetch(self, query, *args):
+        """Run a query and return its rows as dicts."""
+        async with self._connection() as conn:
+            return [dict(row) for row in await conn.fetch(query, *args)]
+
+    async def _fetchrow(self, query, *args):
+        """Run a query and return its first row as a dict (or None)."""
+        async with self._connection() as conn:
+            row = await conn.fetchrow(query, *args)
+            return dict(row) if row else None
+
+    # Users
+
+    async def get_user(self, user_id):
+        return await self._fetchrow("SELECT * FROM users WHERE user_id = $1", user_id)
+
+    async def add_user(self, user_id, username):
+        async with self._transaction(user_id) as conn:
+            added = await conn.fetchval(
+                """
+                INSERT INTO users (user_id, username) VALUES ($1, $2)
+                ON CONFLICT (user_id) DO NOTHING
+                RETURNING user_id
+                """,
+                user_id, username
+            )
+            if added is None:
+                return False
+
+            await self._insert_subscription(conn, user_id, "Basic")
+
+        logger.info(f"Added new user: {username} (ID: {user_id})")
+        return True
+
+    async def resolve_user_context(self, user_id, username):
+        async with self._connection() as conn:
+            row = await conn.fetchrow(USER_CONTEXT_QUERY, user_id)
+
+            if not row or row["id"] is None or row["current_username"] != username:
+                async with conn.transaction():
+                    await conn.execute("SELECT pg_advisory_xact_lock($1)", user_id)
+                    await conn.execute(
+                        """
+                        INSERT INTO users (user_id, username) VALUES ($1, $2)
+                        ON CONFLICT (user_id) DO UPDATE SET username = excluded.username
+                        WHERE users.username <> excluded.username
+                        """,
+                        user_id, username
+                    )
+
+                    row = await conn.fetchrow(USER_CONTEXT_QUERY, user_id)
+                    if row["id"] is None:
+                        await self._insert_subscription(conn, user_id, "Basic")
+                        row = await conn.fetchrow(USER_CONTEXT_QUERY, user_id)
+                        logger.info(f"Added new user: {username} (ID: {user_id})")
+
+        subscription = dict(row)
+        del subscription["current_username"]
+
+        return {
+            "user_id": user_id,
+            "username": username,
+            "tier": get_effective_tier(subscription),
+            "subscription": subscription
+        }
+
+    # Subscriptions
+
+    async def get_subscription(self, user_id):
+        return await self._fetchrow(
+            "SELECT * FROM subscriptions WHERE user_id = $1 AND active",
+            user_id
+        )
+
+    async def _insert_subscription(self, conn, user_id, tier, duration_days=30, transaction_id=None, payment_method=None):
+        """
+        Deactivate a user's current subscription and insert a new one in an open transaction.
+
+        Returns:
+            str: The tier of the replaced subscription ("None" if there was none)
+        """
+        end_date = None
+        grace_period_end = None
+
+        if tier != "Basic":  # Basic tier doesn't expire
+            end_date = now_epoch() + duration_days * SECONDS_PER_DAY
+            grace_period_end = end_date + GRACE_PERIOD_DAYS * SECONDS_PER_DAY
+
+        previous_tier = await conn.fetchval(
+            "UPDATE subscriptions SET active = FALSE WHERE user_id = $1 AND active RETURNING tier",
+            user_id
+        )
+
+        # Keep the active-per-tier counters in step
+        if previous_tier is not None:
+            await self._adjust_tier_count(conn, previous_tier, -1)
+        await self._adjust_tier_count(conn, tier, 1)
+
+        await conn.execute(
+            """
+            INSERT INTO subscriptions (
+                user_id, tier, end_date, active,
+                transaction_id, payment_method, grace_period_end
+            )
+            VALUES ($1, $2, $3, TRUE, $4, $5, $6)
+            """,
+            user_id, tier, end_date, transaction_id, payment_method, grace_period_end
+        )
+
+        if transaction_id and tier != "Basic":
+            price = config.SUBSCRIPTION_TIERS[tier]["price"] * (duration_days / 30)
+
+            await conn.execute(
+                """
+                INSERT INTO payment_transactions (
+                    transaction_id, user_id, amount, status,
+                    tier, duration_days, completed_at
+                )
+                VALUES ($1, $2, $3, 'completed', $4, $5, $6)
+                """,
+                transaction_id, user_id, float(price), tier, duration_days, now_epoch()
+            )
+
+        return previous_tier or "None"
+
+    async def _adjust_tier_count(self, conn, tier, delta):
+        """Add delta to a tier's active subscription counter in an open transaction."""
+        await conn.execute(
+            """
+            INSERT INTO subscription_tier_counts (tier, count) VALUES ($1, $2)
+            ON CONFLICT (tier) DO UPDATE SET count = subscription_tier_counts.count + excluded.count
+            """,
+            tier, delta
+        )
+
+    async def _count_change(self, conn, kind, count=1):
+        """Add to today's counter for a kind of subscription change in an open transaction."""
+        await conn.execute(
+            """
+            INSERT INTO subscription_daily_metrics (day, kind, count) VALUES ($1, $2, $3)
+            ON CONFLICT (day, kind) DO UPDATE SET count = subscription_daily_metrics.count + excluded.count
+            """,
+            day_start(now_epoch()), kind, count
+        )
+
+    async def _insert_history(self, conn, user_id, previous_tier, new_tier, admin_id=None, reason=None, change_kind=None):
+        """Insert a subscription_history row in an open transaction."""
+        change_kind = change_kind or get_change_kind(previous_tier, new_tier)
+        await conn.execute(
+            """
+            INSERT INTO subscription_history (
+                user_id, previous_tier, new_tier, admin_id, reason, change_kind
+            )
+            VALUES ($1, $2, $3, $4, $5, $6)
+            """,
+            user_id, previous_tier, new_tier, admin_id, reason, change_kind
+        )
+        await self._count_change(conn, change_kind)
+
+    async def add_subscription(self, user_id, tier, duration_days=30, transaction_id=None, payment_method=None):
+        async with self._transaction(user_id) as conn:
+            await self._insert_subscription(conn, user_id, tier, duration_days, transaction_id, payment_method)
+
+        logger.info(f"Added {tier} subscription for user ID: {user_id}")
+        return True
+
+    async def change_subscription(self, user_id, new_tier, duration_days=30, transaction_id=None, payment_method=None, admin_id=None, reason=None):
+        async with self._transaction(user_id) as conn:
+            previous_tier = await self._insert_subscription(
+                conn, user_id, new_tier, duration_days, transaction_id, payment_method
+            )
+            await self._insert_history(conn, user_id, previous_tier, new_tier, admin_id, reason)
+
+        logger.info(f"Changed subscription for user {user_id}: {previous_tier} -> {new_tier}")
+        return previous_tier
+
+    async def update_subscription(self, user_id, new_tier, duration_days=30, transaction_id=None, payment_method=None, admin_id=None, reason=None):
+        await self.change_subscription(
+            user_id, new_tier, duration_days, transaction_id, payment_method, admin_id, reason
+        )
+        return True
+
+    async def extend_subscription(self, user_id, additional_days, admin_id=None, reason=None):
+        async with self._transaction(user_id) as conn:
+            subscription = await conn.fetchrow(
+                "SELECT * FROM subscriptions WHERE user_id = $1 AND active",
+                user_id
+            )
+
+            if not subscription or subscription["tier"] == "Basic":
+                logger.warning(f"Cannot extend Basic subscription for user {user_id}")
+                return False
+
+            new_end_date = subscription["end_date"] + additional_days * SECONDS_PER_DAY
+            new_grace_period_end = new_end_date + GRACE_PERIOD_DAYS * SECONDS_PER_DAY
+
+            await conn.execute(
+                "UPDATE subscriptions SET end_date = $1, grace_period_end = $2 WHERE id = $3",
+                new_end_date, new_grace_period_end, subscription["id"]
+            )
+            await self._insert_history(
+                conn, user_id, subscription["tier"], subscription["tier"], admin_id,
+                reason or f"Extended subscription by {additional_days} days"
+            )
+
+        logger.info(f"Extended subscription for user {user_id} by {additional_days} days")
+        return True
+
+    async def check_expiring_subscriptions(self, days_threshold=3):
+        current_time = now_epoch()
+        return await self._fetch(
+            """
+            SELECT s.*, u.username
+            FROM subscriptions s
+            JOIN users u ON s.user_id = u.user_id
+            WHERE s.active
+            AND s.tier <> 'Basic'
+            AND s.end_date <= $1
+            AND s.end_date > $2
+            AND NOT s.renewal_reminder_sent
+            """,
+            current_time + days_threshold * SECONDS_PER_DAY, current_time
+        )
+
+    async def mark_renewal_reminder_sent(self, subscription_id):
+        async with self._connection() as conn:
+            await conn.execute(
+                "UPDATE subscriptions SET renewal_reminder_sent = TRUE WHERE id = $1",
+                subscription_id
+            )
+        return True
+
+    async def check_expired_subscriptions(self):
+        current_time = now_epoch()
+        return await self._fetch(
+            """
+            SELECT s.*, u.username
+            FROM subscriptions s
+            JOIN users u ON s.user_id = u.user_id
+            WHERE s.active
+            AND s.tier <> 'Basic'
+            AND s.end_date < $1
+            AND s.grace_period_end > $1
+            """,
+            current_time
+        )
+
+    async def check_grace_period_expired_subscriptions(self):
+        return await self._fetch(
+            """
+            SELECT s.*, u.username
+            FROM subscriptions s
+            JOIN users u ON s.user_id = u.user_id
+            WHERE s.active
+            AND s.tier <> 'Basic'
+            AND s.grace_period_end < $1
+            """,
+            now_epoch()
+        )
+
+    async def downgrade_expired_subscriptions(self, chunk_size=None):
+        chunk_size = chunk_size or config.DOWNGRADE_CHUNK_SIZE
+        current_time = now_epoch()
+        reason = "Subscription expired beyond grace period"
+        downgraded_user_ids = []
+        # Subscriptions skipped because another process is changing them; picked up next run
+        skipped_ids = []
+
+        while True:
+            async with self._transaction() as conn:
+                # Lock a chunk of candidate rows, skipping rows another transaction holds.
+                # The user's advisory lock is only tried on the locked candidates (the CTE
+                # is materialized), so no unrelated user is ever locked.
+                candidates = await conn.fetch(
+                    """
+                    WITH candidates AS MATERIALIZED (
+                        SELECT id, user_id FROM subscriptions
+                        WHERE active
+                        AND tier <> 'Basic'
+                        AND grace_period_end < $1
+                        AND id <> ALL($3::BIGINT[])
+                        LIMIT $2
+                        FOR UPDATE SKIP LOCKED
+                    )
+                    SELECT id, pg_try_advisory_xact_lock(user_id) AS locked FROM candidates
+                    """,
+                    current_time, chunk_size, skipped_ids
+                )
+                skipped_ids.extend(row["id"] for row in candidates if not row["locked"])
+
+                # Re-check under the locks, in case a change committed meanwhile
+                expired = await conn.fetch(
+                    """
+                    UPDATE subscriptions SET active = FALSE
+                    WHERE id = ANY($1::BIGINT[]) AND active
+                    RETURNING user_id, tier
+                    """,
+                    [row["id"] for row in candidates if row["locked"]]
+                )
+                user_ids = [row["user_id"] for row in expired]
+
+                if user_ids:
+                    await conn.execute(
+                        """
+                        INSERT INTO subscriptions (user_id, tier, active)
+                        SELECT user_id, 'Basic', TRUE FROM unnest($1::BIGINT[]) AS user_id
+                        """,
+                        user_ids
+                    )
+                    await conn.execute(
+                        """
+                        INSERT INTO subscription_history (user_id, previous_tier, new_tier, reason, change_kind)
+                        SELECT e.user_id, e.tier, 'Basic', $3, 'expiration'
+                        FROM unnest($1::BIGINT[], $2::TEXT[]) AS e (user_id, tier)
+                        """,
+                        user_ids, [row["tier"] for row in expired], reason
+                    )
+
+                    # Keep the metrics counters in step
+                    await conn.execute(
+                        """
+                        INSERT INTO subscription_tier_counts (tier, count)
+                        SELECT tier, -COUNT(*) FROM unnest($1::TEXT[]) AS tier GROUP BY tier
+                        ON CONFLICT (tier) DO UPDATE SET count = subscription_tier_counts.count + excluded.count
+                        """,
+                        [row["tier"] for row in expired]
+                    )
+                    await self._adjust_tier_count(conn, "Basic", len(user_ids))
+                    await self._count_change(conn, "expiration", len(user_ids))
+
+            if user_ids:
+                downgraded_user_ids.extend(user_ids)
+                logger.info(f"Downgraded {len(user_ids)} expired subscriptions to Basic")
+
+            if len(candidates) < chunk_size:
+                break
+
+        return downgraded_user_ids
+
+    async def get_all_subscribers(self, tier=None, active_only=True):
+        query, params = _subscriber_query("s.*, u.username", tier, active_only)
+        query += " ORDER BY s.start_date DESC, s.id DESC"
+        return await self._fetch(query, *params)
+
+    async def count_subscribers(self, tier=None, active_only=True):
+        query, params = _subscriber_query("COUNT(*)", tier, active_only)
+        async with self._connection() as conn:
+            return await conn.fetchval(query, *params)
+
+    async def get_subscribers_page(self, tier=None, after=None, before=None, limit=10, active_only=True):
+        query, params = _subscriber_query("s.*, u.username", tier, active_only)
+        key = f"(${len(params) + 1}, ${len(params) + 2})"
+
+        if after is not None:
+            query += f" AND (s.start_date, s.id) < {key} ORDER BY s.start_date DESC, s.id DESC"
+            params.extend(after)
+        elif before is not None:
+            query += f" AND (s.start_date, s.id) > {key} ORDER BY s.start_date ASC, s.id ASC"
+            params.extend(before)
+        else:
+            query += " ORDER BY s.start_date DESC, s.id DESC"
+
+        # One extra row tells us whether another page exists
+        params.append(limit + 1)
+        query += f" LIMIT ${len(params)}"
+
+        rows = await self._fetch(query, *params)
+
+        has_more = len(rows) > limit
+        rows = rows[:limit]
+        if before is not None:
+            rows.reverse()
+
+        return rows, has_more
+
+    async def iter_subscribers(self, tier=None, active_only=True, chunk_size=500):
+        query, params = _subscriber_query("s.*, u.username", tier, active_only)
+        query += " ORDER BY s.start_date DESC, s.id DESC"
+
+        async with self._connection() as conn:
+            # Server-side cursors only live inside a transaction
+            async with conn.transaction(readonly=True):
+                cursor = await conn.cursor(query, *params)
+                while True:
+                    rows = await cursor.fetch(chunk_size)
+                    if not rows:
+                        break
+                    yield [dict(row) for row in rows]
+
+    async def get_subscription_metrics(self, days=30):
+        start_day = day_start(now_epoch() - days * SECONDS_PER_DAY)
+
+        # Read the counters maintained by each subscription change
+        async with self._connection() as conn:
+            rows = await conn.fetch(
+                """
+                SELECT tier, count
+                FROM subscription_tier_counts
+                WHERE count > 0
+                ORDER BY tier
+                """
+            )
+            tier_counts = {row["tier"]: row["count"] for row in rows}
+
+            rows = await conn.fetch(
+                """
+                SELECT kind, SUM(count)::BIGINT AS count
+                FROM subscription_daily_metrics
+                WHERE day >= $1
+                GROUP BY kind
+                """,
+                start_day
+            )
+            changes = {row["kind"]: row["count"] for row in rows}
+
+        return {
+            "subscribers_by_tier": tier_counts,
+            "total_subscribers": sum(tier_counts.values()),
+            "new_subscribers": changes.get("new", 0),
+            "upgrades": changes.get("upgrade", 0),
+            "downgrades": changes.get("downgrade", 0),
+            "renewals": changes.get("renewal", 0),
+            "expirations": changes.get("expiration", 0),
+            "period_days": days
+        }
+
+    # History
+
+    async def log_subscription_change(self, user_id, previous_tier, new_tier, admin_id=None, reason=None):
+        async with self._transaction() as conn:
+            await self._insert_history(conn, user_id, previous_tier, new_tier, admin_id, reason)
+
+        logger.info(f"Logged subscription change for user {user_id}: {previous_tier} -> {new_tier}")
+        return True
+
+    async def get_subscription_history(self, user_id, limit=10):
+        return await self._fetch(
+            """
+            SELECT * FROM subscription_history
+            WHERE user_id = $1
+            ORDER BY changed_at DESC, id DESC
+            LIMIT $2
+            """,
+            user_id, limit
+        )
+
+    # Usage
+
+    async def log_feature_usage(self, user_id, feature):
+        await self.usage_recorder.record(user_id, feature)
+        return True
+
+    async def flush_usage_events(self):
+        await self.usage_recorder.flush()
+
+    async def _write_usage_events(self, events):
+        """Insert a batch of (user_id, feature, used_at) usage events in one transaction."""
+        async with self._transaction() as conn:
+            await conn.executemany(
+                "INSERT INTO usage_stats (user_id, feature, used_at) VALUES ($1, $2, $3)",
+                events
+            )
+
+    async def _get_state(self, conn, name):
+        """Get a maintenance_state value on an open connection (None if unset)."""
+        return await conn.fetchval("SELECT value FROM maintenance_state WHERE name = $1", name)
+
+    async def _set_state(self, conn, name, value):
+        """Set a maintenance_state value in an open transaction."""
+        await conn.execute(
+            """
+            INSERT INTO maintenance_state (name, value) VALUES ($1, $2)
+            ON CONFLICT (name) DO UPDATE SET value = excluded.value
+            """,
+            name, value
+        )
+
+    async def get_feature_usage_stats(self, feature=None, days=30):
+        start_day = day_start(now_epoch() - days * SECONDS_PER_DAY)
+        feature_params = (feature,) if feature else ()
+
+        async with self._connection() as conn:
+            # One snapshot, so a concurrent rollup can't count a day twice
+            async with conn.transaction(isolation="repeatable_read", readonly=True):
+                rolled_up_to = await self._get_state(conn, "usage_rolled_up_to")
+                raw_start = max(start_day, rolled_up_to or start_day)
+
+                daily_rows = await conn.fetch(
+                    f"""
+                    SELECT feature, count, users_sketch
+                    FROM usage_daily
+                    WHERE day >= $1 AND day < $2 {"AND feature = $3" if feature else ""}
+                    """,
+                    start_day, raw_start, *feature_params
+                )
+                raw_rows = await conn.fetch(
+                    f"""
+                    SELECT feature, user_id, COUNT(*) AS uses
+                    FROM usage_stats
+                    WHERE used_at >= $1 {"AND feature = $2" if feature else ""}
+                    GROUP BY feature, user_id
+                    """,
+                    raw_start, *feature_params
+                )
+
+        stats = combine_usage(daily_rows, raw_rows)
+
+        if feature:
+            result = stats.get(feature)
+            return {
+                "feature": feature,
+                "count": result["count"] if result else 0,
+                "unique_users": result["unique_users"] if result else 0
+            }
+
+        return stats
+
+    async def rollup_usage_stats(self):
+        cutoff = day_start(now_epoch() - config.USAGE_ROLLUP_DELAY)
+        days_rolled_up = 0
+
+        while True:
+            async with self._transaction() as conn:
+                # Only one process rolls up at a time
+                await conn.execute("SELECT pg_advisory_xact_lock($1)", ROLLUP_LOCK_KEY)
+                day = await self._get_state(conn, "usage_rolled_up_to")
+
+                if day is None:
+                    # First run: start from the day of the oldest event
+                    first_used = await conn.fetchval("SELECT MIN(used_at) FROM usage_stats")
+                    day = day_start(first_used) if first_used is not None else cutoff
+
+                if day >= cutoff:
+                    await self._set_state(conn, "usage_rolled_up_to", day)
+                    break
+
+                next_day = day + SECONDS_PER_DAY
+                rows = await conn.fetch(
+                    """
+                    SELECT feature, user_id, COUNT(*) AS uses
+                    FROM usage_stats
+                    WHERE used_at >= $1 AND used_at < $2
+                    GROUP BY feature, user_id
+                    """,
+                    day, next_day
+                )
+                totals = summarize_usage(rows)
+                await conn.executemany(
+                    """
+                    INSERT INTO usage_daily (feature, day, count, unique_users, users_sketch)
+                    VALUES ($1, $2, $3, $4, $5)
+                    ON CONFLICT (day, feature) DO UPDATE
+                    SET count = excluded.count, unique_users = excluded.unique_users,
+                        users_sketch = excluded.users_sketch
+                    """,
+                    [
+                        (feature, day, count, users, sketch.to_bytes())
+                        for feature, (count, users, sketch) in totals.items()
+                    ]
+                )
+                await self._set_state(conn, "usage_rolled_up_to", next_day)
+
+            days_rolled_up += 1
+
+        if days_rolled_up:
+            logger.info(f"Rolled up {days_rolled_up} days of usage stats")
+
+        return days_rolled_up
+
+    # Retention
+
+    async def apply_retention(self, chunk_size=None):
+        chunk_size = chunk_size or config.RETENTION_CHUNK_SIZE
+        archive = bool(config.RETENTION_ARCHIVE_PATH)
+        now = now_epoch()
+        policies = []
+
+        if config.USAGE_RETENTION_DAYS > 0:
+            # Raw usage events are only removed once they have been rolled up
+            async with self._connection() as conn:
+                rolled_up_to = await self._get_state(conn, "usage_rolled_up_to") or 0
+            cutoff = min(now - config.USAGE_RETENTION_DAYS * SECONDS_PER_DAY, rolled_up_to)
+            policies.append(("usage_stats", "used_at < $1", cutoff))
+
+        if config.GAME_SCORE_RETENTION_DAYS > 0:
+            cutoff = now - config.GAME_SCORE_RETENTION_DAYS * SECONDS_PER_DAY
+            policies.append(("game_scores", "played_at < $1", cutoff))
+
+        if config.SUBSCRIPTION_RETENTION_DAYS > 0:
+            cutoff = now - config.SUBSCRIPTION_RETENTION_DAYS * SECONDS_PER_DAY
+            policies.append(("subscriptions", "NOT active AND start_date < $1", cutoff))
+
+        rows_removed = {}
+        for table, condition, cutoff in policies:
+            if archive:
+                # Archived rows are moved to a table alongside the live one
+                async with self._connection() as conn:
+                    await conn.execute(f"CREATE TABLE IF NOT EXISTS {table}_archive (LIKE {table})")
+
+            chunk = f"SELECT id FROM {table} WHERE {condition} LIMIT $2 FOR UPDATE SKIP LOCKED"
+            if archive:
+                query = f"""
+                    WITH removed AS (
+                        DELETE FROM {table} WHERE id IN ({chunk}) RETURNING *
+                    )
+                    INSERT INTO {table}_archive SELECT * FROM removed
+                """
+            else:
+                query = f"DELETE FROM {table} WHERE id IN ({chunk})"
+
+            total = 0
+            while True:
+                async with self._transaction() as conn:
+                    status = await conn.execute(query, cutoff, chunk_size)
+                removed = int(status.split()[-1])
+                total += removed
+                if removed < chunk_size:
+                    break
+
+            rows_removed[table] = total
+
+        logger.info(
+            f"Retention removed {sum(rows_removed.values())} rows "
+            f"({', '.join(f'{table}: {count}' for table, count in rows_removed.items()) or 'no policies'})"
+        )
+        return {"rows_removed": rows_removed, "archived": archive, "bytes_reclaimed": 0}
+
+    # Game scores
+
+    async def update_game_score(self, user_id, game_name, score):
+        async with self._transaction() as conn:
+            improved = False
+
+            # Scores must beat the implicit starting best of 0
+            if score > 0:
+                improved = await conn.fetchval(
+                    """
+                    INSERT INTO best_scores (game_name, user_id, best_score, achieved_at)
+                    VALUES ($1, $2, $3, $4)
+                    ON CONFLICT (game_name, user_id) DO UPDATE
+                    SET best_score = excluded.best_score, achieved_at = excluded.achieved_at
+                    WHERE excluded.best_score > best_scores.best_score
+                    RETURNING TRUE
+                    """,
+                    game_name, user_id, score, now_epoch()
+                ) or False
+
+            if improved:
+                await conn.execute(
+                    "INSERT INTO game_scores (user_id, game_name, score) VALUES ($1, $2, $3)",
+                    user_id, game_name, score
+                )
+            else:
+                best_score = await conn.fetchval(
+                    "SELECT best_score FROM best_scores WHERE game_name = $1 AND user_id = $2",
+                    game_name, user_id
+                ) or 0
+
+        if improved:
+            logger.info(f"Updated score for user {user_id} in game {game_name}: {score}")
+            return True, score
+
+        return False, best_score
+
+    async def get_user_best_score(self, user_id, game_name):
+        async with self._connection() as conn:
+            return await conn.fetchval(
+                "SELECT best_score FROM best_scores WHERE game_name = $1 AND user_id = $2",
+                game_name, user_id
+            ) or 0
+
+    async def get_user_game_standing(self, user_id, game_name):
+        result = await self._fetchrow(
+            """
+            SELECT b.best_score AS best_score,
+                   (
+                       SELECT COUNT(*)
+                       FROM best_scores
+                       WHERE game_name = b.game_name AND best_score > b.best_score
+                   ) + 1 AS rank
+            FROM best_scores b
+            WHERE b.game_name = $1 AND b.user_id = $2
+            """,
+            game_name, user_id
+        )
+
+        if not result:
+            return 0, 0
+
+        return result["rank"], result["best_score"]
+
+    async def get_leaderboard(self, game_name, limit=10):
+        rows = await self._fetch(
+            """
+            SELECT user_id, best_score
+            FROM best_scores
+            WHERE game_name = $1
+            ORDER BY best_score DESC, achieved_at ASC
+            LIMIT $2
+            """,
+            game_name, limit
+        )
+        return [(row["user_id"], row["best_score"]) for row in rows]
+
+    async def get_available_games(self):
+        rows = await self._fetch("SELECT DISTINCT game_name FROM best_scores ORDER BY game_name")
+        return [row["game_name"] for row in rows]
+
+    # Story progress
+
+    async def update_story_progress(self, user_id, story_name, part):
+        async with self._connection() as conn:
+            await conn.execute(
+                """
+                INSERT INTO story_progress (user_id, story_name, current_part, last_read)
+                VALUES ($1, $2, $3, $4)
+                ON CONFLICT (user_id, story_name) DO UPDATE
+                SET current_part = excluded.current_part, last_read = excluded.last_read
+                """,
+                user_id, story_name, part, now_epoch()
+            )
+        return True
+
+    async def get_story_progress(self, user_id, story_name):
+        result = await self._fetchrow(
+            """
+            SELECT current_part, last_read
+            FROM story_progress
+            WHERE user_id = $1 AND story_name = $2
+            """,
+            user_id, story_name
+        )
+        return result or {"current_part": 1, "last_read": None}
+
+    # Content rotation
+
+    async def get_content_seen(self, user_id, kind, category):
+        result = await self._fetchrow(
+            """
+            SELECT seen FROM content_seen
+            WHERE user_id = $1 AND kind = $2 AND category = $3
+            """,
+            user_id, kind, category
+        )
+        return bytes(result["seen"]) if result else None
+
+    async def get_all_content_seen(self, user_id, kind):
+        rows = await self._fetch(
+            """
+            SELECT category, seen FROM content_seen
+            WHERE user_id = $1 AND kind = $2
+            """,
+            user_id, kind
+        )
+        return {row["category"]: bytes(row["seen"]) for row in rows}
+
+    async def save_content_seen(self, entries):
+        if not entries:
+            return
+
+        updated_at = now_epoch()
+        async with self._transaction() as conn:
+            await conn.executemany(
+                """
+                INSERT INTO content_seen (user_id, kind, category, seen, updated_at)
+                VALUES ($1, $2, $3, $4, $5)
+                ON CONFLICT (user_id, kind, category) DO UPDATE
+                SET seen = excluded.seen, updated_at = excluded.updated_at
+                """,
+                [(user_id, kind, category, seen, updated_at) for user_id, kind, category, seen in entries]
+            )
+
+    # Payments
+
+    async def record_payment_transaction(self, transaction_id, user_id, amount, status, tier, duration_days):
+        try:
+            async with self._connection() as conn:
+                await conn.execute(
+                    """
+                    INSERT INTO payment_transactions (
+                        transaction_id, user_id, amount, status,
+                        tier, duration_days, completed_at
+                    )
+                    VALUES ($1, $2, $3, $4, $5, $6, $7)
+                    """,
+                    transaction_id, user_id, float(amount), status, tier, duration_days, now_epoch()
+                )
+        except Exception as e:
+            logger.error(f"Error recording payment transaction: {e}")
+            return False
+
+        logger.info(f"Recorded payment transaction: {transaction_id}")
+        return True
+
+    async def get_user_payment_history(self, user_id, limit=10):
+        return await self._fetch(
+            """
+            SELECT *
+            FROM payment_transactions
+            WHERE user_id = $1
+            ORDER BY created_at DESC, id DESC
+            LIMIT $2
+            """,
+            user_id, limit
+        )
@@ -12,23 +12,18 @@ from datetime import datetime, timedelta
 
 import config
 import database
+import storage
 import payment
+import utils
 
 logger = logging.getLogger("tainment_bot.subscription")
 
 @commands.command(name="subscribe")
 async def subscribe(ctx):
     """View available subscription options."""
-    user_id = ctx.author.id
-    username = ctx.author.name
-    
-    # Ensure user exists in database
-    user = await database.get_user(user_id)
-    if not user:
-        await database.add_user(user_id, username)
-    
-    # Get current subscription
-    subscription = await database.get_subscription(user_id)
+    # Get current subscription (resolved once per command)
+    user_context = await utils.get_user_context(ctx)
+    subscription = user_context["subscription"]
     current_tier = subscription["tier"] if subscription else "None"
     
     # Create embed with subscription options
@@ -73,15 +68,10 @@ async def subscribe(ctx):
 async def tier(ctx):
     """Check your current subscription tier."""
     user_id = ctx.author.id
-    username = ctx.author.name
-    
-    # Ensure user exists in database
-    user = await database.get_user(user_id)
-    if not user:
-        await database.add_user(user_id, username)
     
-    # Get current subscription
-    subscription = await database.get_subscription(user_id)
+    # Get current subscription (resolved once per command)
+    user_context = await utils.get_user_context(ctx)
+    subscription = user_context["subscription"]
     
     if not subscription:
         await ctx.send(f"You don't have an active subscription. Use `{ctx.prefix}subscribe` to view options.")
@@ -107,13 +97,13 @@ async def tier(ctx):
     
     # Add subscription dates if applicable
     if subscription["end_date"] and tier_name != "Basic":
-        end_date = datetime.fromisoformat(subscription["end_date"])
-        start_date = datetime.fromisoformat(subscription["start_date"])
+        end_date = database.from_epoch(subscription["end_date"])
+        start_date = database.from_epoch(subscription["start_date"])
         
         # Check if subscription is expired or in grace period
         if end_date < datetime.now():
-            if subscription.get("grace_period_end") and datetime.fromisoformat(subscription["grace_period_end"]) > datetime.now():
-                grace_end = datetime.fromisoformat(subscription["grace_period_end"])
+            if subscription.get("grace_period_end") and database.from_epoch(subscription["grace_period_end"]) > datetime.now():
+                grace_end = database.from_epoch(subscription["grace_period_end"])
                 hours_left = int((grace_end - datetime.now()).total_seconds() / 3600)
                 
                 embed.add_field(
@@ -144,7 +134,7 @@ async def tier(ctx):
             value=f"Use `{ctx.prefix}upgrade <tier>` to upgrade your subscription.",
             inline=False
         )
-    elif subscription["end_date"] and datetime.fromisoformat(subscription["end_date"]) < datetime.now() + timedelta(days=7):
+    elif subscription["end_date"] and database.from_epoch(subscription["end_date"]) < datetime.now() + timedelta(days=7):
         embed.add_field(
             name="Renew Your Subscription",
             value=f"Use `{ctx.prefix}renew` to renew your subscription.",
@@ -152,12 +142,12 @@ async def tier(ctx):
         )
     
     # Add payment history if available
-    payment_history = await database.get_user_payment_history(user_id, limit=1)
+    payment_history = await storage.backend.get_user_payment_history(user_id, limit=1)
     if payment_history:
         latest_payment = payment_history[0]
         embed.add_field(
             name="Latest Payment",
-            value=f"Amount: ${latest_payment['amount']:.2f}\nDate: {datetime.fromisoformat(latest_payment['created_at']).strftime('%Y-%m-%d')}\nTransaction ID: {latest_payment['transaction_id']}",
+            value=f"Amount: ${latest_payment['amount']:.2f}\nDate: {database.from_epoch(latest_payment['created_at']).strftime('%Y-%m-%d')}\nTransaction ID: {latest_payment['transaction_id']}",
             inline=False
         )
     
@@ -169,13 +159,9 @@ async def upgrade(ctx, tier=None):
     user_id = ctx.author.id
     username = ctx.author.name
     
-    # Ensure user exists in database
-    user = await database.get_user(user_id)
-    if not user:
-        await database.add_user(user_id, username)
-    
-    # Get current subscription
-    subscription = await database.get_subscription(user_id)
+    # Get current subscription (resolved once per command)
+    user_context = await utils.get_user_context(ctx)
+    subscription = user_context["subscription"]
     current_tier = subscription["tier"] if subscription else "Basic"
     
     # Check if tier is provided
@@ -325,16 +311,9 @@ async def subscription_benefits(ctx, tier=None):
 @commands.command(name="simulate_upgrade")
 async def simulate_upgrade(ctx, tier=None):
     """Simulate upgrading to a different tier to see the benefits and cost."""
-    user_id = ctx.author.id
-    username = ctx.author.name
-    
-    # Ensure user exists in database
-    user = await database.get_user(user_id)
-    if not user:
-        await database.add_user(user_id, username)
-    
-    # Get current subscription
-    subscription = await database.get_subscription(user_id)
+    # Get current subscription (resolved once per command)
+    user_context = await utils.get_user_context(ctx)
+    subscription = user_context["subscription"]
     current_tier = subscription["tier"] if subscription else "Basic"
     
     # Check if tier is provided
@@ -432,16 +411,9 @@ async def simulate_upgrade(ctx, tier=None):
 @commands.command(name="subscription_status")
 async def subscription_status(ctx):
     """Check your subscription status and expiration date."""
-    user_id = ctx.author.id
-    username = ctx.author.name
-    
-    # Ensure user exists in database
-    user = await database.get_user(user_id)
-    if not user:
-        await database.add_user(user_id, username)
-    
-    # Get current subscription
-    subscription = await database.get_subscription(user_id)
+    # Get current subscription (resolved once per command)
+    user_context = await utils.get_user_context(ctx)
+    subscription = user_context["subscription"]
     
     if not subscription:
         await ctx.send(f"You don't have an active subscription. Use `{ctx.prefix}subscribe` to view options.")
@@ -469,7 +441,7 @@ async def subscription_status(ctx):
     )
     
     # Add dates
-    start_date = datetime.fromisoformat(subscription["start_date"])
+    start_date = database.from_epoch(subscription["start_date"])
     embed.add_field(
         name="Start Date",
         value=start_date.strftime("%Y-%m-%d"),
@@ -478,7 +450,7 @@ async def subscription_status(ctx):
     
     # Add expiration info if applicable
     if subscription["end_date"] and tier_name != "Basic":
-        end_date = datetime.fromisoformat(subscription["end_date"])
+        end_date = database.from_epoch(subscription["end_date"])
         days_left = (end_date - datetime.now()).days
         
         status_color = discord.Color.green()
@@ -487,7 +459,7 @@ async def subscription_status(ctx):
         if days_left < 0:
             # Check if in grace period
             if subscription.get("grace_period_end"):
-                grace_end = datetime.fromisoformat(subscription["grace_period_end"])
+                grace_end = database.from_epoch(subscription["grace_period_end"])
                 if grace_end > datetime.now():
                     hours_left = int((grace_end - datetime.now()).total_seconds() / 3600)
                     status_text = f"Grace Period ({hours_left} hours left)"
@@ -554,13 +526,9 @@ async def renew(ctx, duration_months: int = 1):
     user_id = ctx.author.id
     username = ctx.author.name
     
-    # Ensure user exists in database
-    user = await database.get_user(user_id)
-    if not user:
-        await database.add_user(user_id, username)
-    
-    # Get current subscription
-    subscription = await database.get_subscription(user_id)
+    # Get current subscription (resolved once per command)
+    user_context = await utils.get_user_context(ctx)
+    subscription = user_context["subscription"]
     
     if not subscription:
         await ctx.send(f"You don't have an active subscription to renew. Use `{ctx.prefix}subscribe` to view options.")
@@ -628,7 +596,7 @@ async def payment_history(ctx, limit: int = 5):
     user_id = ctx.author.id
     
     # Get payment history
-    payment_history = await database.get_user_payment_history(user_id, limit=limit)
+    payment_history = await storage.backend.get_user_payment_history(user_id, limit=limit)
     
     if not payment_history:
         await ctx.send("You don't have any payment history.")
@@ -643,8 +611,8 @@ async def payment_history(ctx, limit: int = 5):
     
     # Add each payment as a field
     for i, payment in enumerate(payment_history):
-        created_at = datetime.fromisoformat(payment["created_at"])
-        completed_at = datetime.fromisoformat(payment["completed_at"]) if payment["completed_at"] else None
+        created_at = database.from_epoch(payment["created_at"])
+        completed_at = database.from_epoch(payment["completed_at"]) if payment["completed_at"] else None
         
         embed.add_field(
             name=f"Payment {i+1} - {created_at.strftime('%Y-%m-%d')}",
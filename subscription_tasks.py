@@ -11,6 +11,7 @@ from discord.ext import tasks, commands
 from datetime import datetime, timedelta
 
 import database
+import storage
 import config
 
 logger = logging.getLogger("tainment_bot.subscription_tasks")
@@ -22,12 +23,16 @@ class SubscriptionTasks(commands.Cog):
         self.bot = bot
         self.check_expiring_subscriptions.start()
         self.check_expired_subscriptions.start()
+        self.rollup_usage_stats.start()
+        self.apply_retention.start()
         logger.info("Subscription tasks initialized")
     
     def cog_unload(self):
         """Clean up when the cog is unloaded."""
         self.check_expiring_subscriptions.cancel()
         self.check_expired_subscriptions.cancel()
+        self.rollup_usage_stats.cancel()
+        self.apply_retention.cancel()
     
     @tasks.loop(hours=24)
     async def check_expiring_subscriptions(self):
@@ -38,13 +43,13 @@ class SubscriptionTasks(commands.Cog):
         logger.info("Checking for expiring subscriptions...")
         
         # Get subscriptions expiring in the next 3 days
-        expiring_subscriptions = await database.check_expiring_subscriptions(days_threshold=3)
+        expiring_subscriptions = await storage.backend.check_expiring_subscriptions(days_threshold=3)
         
         for subscription in expiring_subscriptions:
             user_id = subscription["user_id"]
             username = subscription["username"]
             tier = subscription["tier"]
-            end_date = datetime.fromisoformat(subscription["end_date"])
+            end_date = database.from_epoch(subscription["end_date"])
             days_left = (end_date - datetime.now()).days + 1
             
             try:
@@ -82,7 +87,7 @@ class SubscriptionTasks(commands.Cog):
                     logger.info(f"Sent expiration notification to {username} (ID: {user_id})")
                     
                     # Mark the reminder as sent
-                    await database.mark_renewal_reminder_sent(subscription["id"])
+                    await storage.backend.mark_renewal_reminder_sent(subscription["id"])
                 else:
                     logger.warning(f"Could not find user {username} (ID: {user_id}) to send expiration notification")
             
@@ -103,28 +108,61 @@ class SubscriptionTasks(commands.Cog):
         logger.info("Checking for expired subscriptions...")
         
         # Check for subscriptions in grace period
-        grace_period_subscriptions = await database.check_expired_subscriptions()
+        grace_period_subscriptions = await storage.backend.check_expired_subscriptions()
         
         for subscription in grace_period_subscriptions:
             user_id = subscription["user_id"]
             username = subscription["username"]
             tier = subscription["tier"]
-            grace_end = datetime.fromisoformat(subscription["grace_period_end"])
+            grace_end = database.from_epoch(subscription["grace_period_end"])
             hours_left = int((grace_end - datetime.now()).total_seconds() / 3600)
             
             logger.info(f"Subscription for {username} (ID: {user_id}) is in grace period. {hours_left} hours left.")
         
         # Check for and downgrade subscriptions with expired grace periods
-        downgraded_count = await database.downgrade_expired_subscriptions()
+        downgraded_user_ids = await storage.backend.downgrade_expired_subscriptions()
         
-        if downgraded_count > 0:
-            logger.info(f"Downgraded {downgraded_count} expired subscriptions to Basic tier")
+        if downgraded_user_ids:
+            logger.info(f"Downgraded {len(downgraded_user_ids)} expired subscriptions to Basic tier")
     
     @check_expired_subscriptions.before_loop
     async def before_check_expired_subscriptions(self):
         """Wait until the bot is ready before starting the task."""
         await self.bot.wait_until_ready()
 
+    @tasks.loop(hours=1)
+    async def rollup_usage_stats(self):
+        """
+        Roll up completed days of raw usage events into daily totals.
+        Runs once per hour.
+        """
+        try:
+            await storage.backend.rollup_usage_stats()
+        except Exception as e:
+            logger.error(f"Error rolling up usage stats: {e}")
+    
+    @rollup_usage_stats.before_loop
+    async def before_rollup_usage_stats(self):
+        """Wait until the bot is ready before starting the task."""
+        await self.bot.wait_until_ready()
+
+    @tasks.loop(hours=24)
+    async def apply_retention(self):
+        """
+        Age out old usage events, score history and replaced subscriptions.
+        Runs once per day, after the usage rollup has caught up.
+        """
+        try:
+            await storage.backend.rollup_usage_stats()
+            await storage.backend.apply_retention()
+        except Exception as e:
+            logger.error(f"Error applying data retention: {e}")
+    
+    @apply_retention.before_loop
+    async def before_apply_retention(self):
+        """Wait until the bot is ready before starting the task."""
+        await self.bot.wait_until_ready()
+
 def setup(bot):
     """Add the subscription tasks cog to the bot."""
     bot.add_cog(SubscriptionTasks(bot))
@@ -0,0 +1,43 @@
+"""
+Tainment+ Discord Bot - Database Test Support
+
+A test case base giving each test a fresh SQLite database, opened through
+the database module with its own connection pool and usage recorder.
+"""
+
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+import config
+import database
+from cache import LRUCache
+from db_pool import ConnectionPool
+from usage_recorder import UsageRecorder
+
+class DatabaseTestCase(unittest.IsolatedAsyncioTestCase):
+    """Runs each test against a new, fully migrated database file."""
+
+    async def asyncSetUp(self):
+        self.workdir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.workdir.cleanup)
+        self.db_path = os.path.join(self.workdir.name, "tainment.db")
+
+        for name, value in (
+            ("pool", ConnectionPool(self.db_path, reader_size=2, query_stats=database.query_stats)),
+            ("usage_recorder", UsageRecorder(database._write_usage_events, flush_interval_ms=60000)),
+            ("_entitlements", LRUCache(config.ENTITLEMENT_CACHE_SIZE, ttl=config.ENTITLEMENT_CACHE_TTL))
+        ):
+            patch = mock.patch.object(database, name, value)
+            patch.start()
+            self.addCleanup(patch.stop)
+
+        await self.open_database()
+
+    async def open_database(self):
+        """Create (or migrate) the database and open the pool."""
+        await database.init_db()
+
+    async def asyncTearDown(self):
+        await database.close_db()
@@ -0,0 +1,205 @@
+"""
+Tainment+ Discord Bot - Cache Tests
+
+Covers eviction, expiry and hit counting of the bounded LRU cache, the
+entitlement cache in front of subscription reads, and the top-K scores
+behind in-memory leaderboards.
+"""
+
+import random
+import unittest
+from unittest import mock
+
+import cache
+import database
+import leaderboard
+import storage
+from cache import MISSING, LRUCache, TopScores
+from db_support import DatabaseTestCase
+
+class LRUCacheTests(unittest.TestCase):
+    def test_missing_keys_return_the_sentinel(self):
+        entries = LRUCache(max_entries=2)
+        self.assertIs(entries.get("absent"), MISSING)
+
+        # Falsy values are still cached values
+        entries.set("none", None)
+        self.assertIsNone(entries.get("none"))
+        self.assertIn("none", entries)
+
+    def test_least_recently_used_entry_is_evicted(self):
+        evicted = []
+        entries = LRUCache(max_entries=2, on_evict=lambda key, value: evicted.append((key, value)))
+        entries.set("a", 1)
+        entries.set("b", 2)
+        entries.get("a")
+        entries.set("c", 3)
+
+        self.assertEqual(evicted, [("b", 2)])
+        self.assertIs(entries.get("b"), MISSING)
+        self.assertEqual((entries.get("a"), entries.get("c")), (1, 3))
+        self.assertEqual(len(entries), 2)
+
+    def test_entries_expire_after_the_ttl(self):
+        entries = LRUCache(ttl=10)
+        with mock.patch.object(cache.time, "monotonic", return_value=100.0):
+            entries.set("a", 1)
+        with mock.patch.object(cache.time, "monotonic", return_value=109.0):
+            self.assertEqual(entries.get("a"), 1)
+        with mock.patch.object(cache.time, "monotonic", return_value=110.0):
+            self.assertIs(entries.get("a"), MISSING)
+        self.assertEqual(len(entries), 0)
+
+    def test_invalidation_removes_entries(self):
+        entries = LRUCache()
+        for key in "abcd":
+            entries.set(key, key.upper())
+
+        entries.invalidate("a")
+        entries.invalidate("missing")
+        entries.invalidate_many(["b", "c"])
+        self.assertEqual([key for key in "abcd" if key in entries], ["d"])
+
+        entries.clear()
+        self.assertEqual(len(entries), 0)
+
+    def test_stats_count_hits_misses_and_evictions(self):
+        entries = LRUCache(max_entries=1)
+        entries.set("a", 1)
+        entries.get("a")
+        entries.get("b")
+        "a" in entries
+        entries.set("b", 2)
+
+        stats = entries.stats()
+        self.assertEqual(
+            (stats["hits"], stats["misses"], stats["evictions"], stats["entries"]),
+            (1, 1, 1, 1)
+        )
+        self.assertEqual(stats["hit_rate"], 0.5)
+
+class EntitlementCacheTests(DatabaseTestCase):
+    async def test_known_users_are_served_from_the_cache(self):
+        first = await database.resolve_user_context(1, "ada")
+        second = await database.resolve_user_context(1, "ada")
+
+        self.assertEqual(first["tier"], "Basic")
+        self.assertEqual(second, first)
+        self.assertEqual(database.get_entitlement_cache_stats()["hits"], 1)
+
+    async def test_subscription_changes_invalidate_the_cache(self):
+        await database.resolve_user_context(1, "ada")
+        await database.change_subscription(1, "Pro", duration_days=30)
+
+        context = await database.resolve_user_context(1, "ada")
+        self.assertEqual(context["tier"], "Pro")
+        self.assertEqual((await database.get_subscription(1))["tier"], "Pro")
+
+    async def test_username_changes_are_written_through(self):
+        await database.resolve_user_context(1, "ada")
+        context = await database.resolve_user_context(1, "ada2")
+
+        self.assertEqual(context["username"], "ada2")
+        self.assertEqual((await database.get_user(1))["username"], "ada2")
+
+    async def test_reads_racing_a_change_are_not_cached(self):
+        await database.add_user(1, "ada")
+        generation = database._entitlement_generation
+        subscription = await database.get_subscription(1)
+        database.invalidate_entitlements(1)
+
+        # A read that started before the change must not repopulate the cache
+        database._cache_entitlement(1, "ada", subscription, generation)
+        self.assertNotIn(1, database._entitlements)
+
+class TopScoresTests(unittest.TestCase):
+    def test_orders_by_score_then_first_recorded(self):
+        top = TopScores(size=5)
+        for user_id, score in ((1, 10), (2, 30), (3, 10), (4, 20)):
+            top.record(user_id, score)
+
+        self.assertEqual(top.top(10), [(2, 30), (4, 20), (1, 10), (3, 10)])
+        self.assertEqual(top.top(2), [(2, 30), (4, 20)])
+
+    def test_ties_share_a_rank(self):
+        top = TopScores(size=5)
+        for user_id, score in ((1, 10), (2, 30), (3, 10), (4, 5)):
+            top.record(user_id, score)
+
+        self.assertEqual(top.standing(2), (1, 30))
+        self.assertEqual(top.standing(1), (2, 10))
+        self.assertEqual(top.standing(3), (2, 10))
+        self.assertEqual(top.standing(4), (4, 5))
+        self.assertIsNone(top.standing(99))
+
+    def test_only_improvements_move_a_player(self):
+        top = TopScores(size=3)
+        top.record(1, 10)
+        top.record(2, 20)
+
+        self.assertTrue(top.record(1, 5))
+        self.assertEqual(top.standing(1), (2, 10))
+        top.record(1, 25)
+        self.assertEqual(top.top(3), [(1, 25), (2, 20)])
+        self.assertEqual(len(top), 2)
+
+    def test_keeps_only_the_best_k(self):
+        top = TopScores(size=3)
+        for user_id in range(1, 6):
+            top.record(user_id, user_id * 10)
+
+        self.assertTrue(top.is_full)
+        self.assertEqual(top.top(5), [(5, 50), (4, 40), (3, 30)])
+        self.assertNotIn(1, top)
+        # Scores that can't make the top K are turned away
+        self.assertFalse(top.record(6, 30))
+        self.assertTrue(top.record(6, 35))
+        self.assertNotIn(3, top)
+
+    def test_matches_a_full_sort_under_random_updates(self):
+        rng = random.Random(42)
+        top = TopScores(size=10)
+        best = {}
+        for order in range(2000):
+            user_id, score = rng.randrange(50), rng.randrange(1000)
+            if score > best.get(user_id, (0,))[0]:
+                best[user_id] = (score, order)
+                top.record(user_id, score)
+
+        expected = sorted(best.items(), key=lambda item: (-item[1][0], item[1][1]))[:10]
+        self.assertEqual(top.top(10), [(user_id, score) for user_id, (score, _) in expected])
+
+class LeaderboardCacheTests(DatabaseTestCase):
+    async def asyncSetUp(self):
+        await super().asyncSetUp()
+        for target, name, value in (
+            (storage, "backend", storage.SQLiteBackend()),
+            (leaderboard, "leaderboard_cache", leaderboard.LeaderboardCache(size=3))
+        ):
+            patch = mock.patch.object(target, name, value)
+            patch.start()
+            self.addCleanup(patch.stop)
+
+    async def test_cached_reads_match_the_database(self):
+        rng = random.Random(7)
+        await leaderboard.update_score(1, "trivia", 5)
+        await leaderboard.leaderboard_cache.load()
+
+        # Scores recorded after loading are applied to the cached leaderboard
+        for _ in range(200):
+            await leaderboard.update_score(rng.randrange(1, 20), rng.choice(["trivia", "riddle"]), rng.randrange(1, 500))
+
+        for game_name in ("trivia", "riddle"):
+            self.assertEqual(
+                await leaderboard.get_leaderboard(game_name, 3),
+                await database.get_leaderboard(game_name, 3)
+            )
+            for user_id in range(1, 21):
+                self.assertEqual(
+                    await leaderboard.get_user_standing(user_id, game_name),
+                    await database.get_user_game_standing(user_id, game_name)
+                )
+        self.assertEqual(await leaderboard.get_available_games(), ["riddle", "trivia"])
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,173 @@
+"""
+Tainment+ Discord Bot - Connection Pool Tests
+
+Covers borrowing pooled reader, analytics and write connections, and how
+the writer task group-commits transactions, on a temporary database file.
+"""
+
+import asyncio
+import os
+import sqlite3
+import tempfile
+import unittest
+
+from db_pool import ConnectionPool
+
+class PoolTestCase(unittest.IsolatedAsyncioTestCase):
+    """Gives each test an open pool on a new database with one table."""
+
+    async def asyncSetUp(self):
+        self.workdir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.workdir.cleanup)
+        self.pool = ConnectionPool(os.path.join(self.workdir.name, "pool.db"), reader_size=2, write_batch_size=8)
+
+        async with self.pool.writer() as db:
+            await db.execute("CREATE TABLE items (id INTEGER PRIMARY KEY, name TEXT NOT NULL)")
+            await db.commit()
+
+    async def asyncTearDown(self):
+        await self.pool.close()
+
+    async def names(self):
+        async with self.pool.reader() as db:
+            cursor = await db.execute("SELECT name FROM items ORDER BY id")
+            return [row["name"] for row in await cursor.fetchall()]
+
+class ConnectionPoolTests(PoolTestCase):
+    async def test_connections_are_reused(self):
+        borrowed = set()
+        for _ in range(5):
+            async with self.pool.reader() as db:
+                borrowed.add(id(db))
+        self.assertEqual(borrowed, {id(db) for db in self.pool._reader_connections})
+        self.assertEqual(self.pool.stats()["readers_idle"], 2)
+
+    async def test_readers_are_limited_to_the_pool_size(self):
+        held = asyncio.Event()
+        release = asyncio.Event()
+
+        async def hold():
+            async with self.pool.reader():
+                held.set()
+                await release.wait()
+
+        holders = [asyncio.create_task(hold()) for _ in range(2)]
+        await held.wait()
+        await asyncio.sleep(0)
+        self.assertEqual(self.pool.stats()["readers_idle"], 0)
+
+        waiting = asyncio.create_task(self.names())
+        await asyncio.sleep(0.01)
+        self.assertFalse(waiting.done())
+
+        release.set()
+        await asyncio.gather(*holders)
+        self.assertEqual(await waiting, [])
+
+    async def test_readers_see_committed_writes(self):
+        async with self.pool.transaction() as db:
+            await db.execute("INSERT INTO items (name) VALUES ('a')")
+        self.assertEqual(await self.names(), ["a"])
+
+    async def test_analytics_connections_are_read_only(self):
+        async with self.pool.analytics() as db:
+            with self.assertRaises(sqlite3.OperationalError):
+                await db.execute("INSERT INTO items (name) VALUES ('a')")
+        self.assertEqual(self.pool.stats()["analytics_acquired"], 1)
+
+    async def test_the_pool_reopens_after_closing(self):
+        await self.pool.close()
+        self.assertFalse(self.pool.is_open)
+
+        async with self.pool.transaction() as db:
+            await db.execute("INSERT INTO items (name) VALUES ('a')")
+        self.assertTrue(self.pool.is_open)
+        self.assertEqual(await self.names(), ["a"])
+
+class GroupCommitTests(PoolTestCase):
+    async def insert(self, name, fail=False):
+        async with self.pool.transaction() as db:
+            await db.execute("INSERT INTO items (name) VALUES (?)", (name,))
+            if fail:
+                raise ValueError(name)
+
+    async def test_concurrent_transactions_share_commits(self):
+        await asyncio.gather(*(self.insert(f"item{index:02}") for index in range(20)))
+
+        stats = self.pool.stats()
+        self.assertEqual(stats["transactions_committed"], 20)
+        self.assertLess(stats["group_commits"], 20)
+        self.assertLessEqual(stats["largest_group"], 8)
+        self.assertEqual(await self.names(), [f"item{index:02}" for index in range(20)])
+
+    async def test_a_failing_transaction_only_rolls_back_itself(self):
+        results = await asyncio.gather(
+            self.insert("a"), self.insert("b", fail=True), self.insert("c"),
+            return_exceptions=True
+        )
+
+        self.assertIsInstance(results[1], ValueError)
+        self.assertEqual(await self.names(), ["a", "c"])
+        self.assertEqual(self.pool.stats()["transactions_failed"], 1)
+
+    async def test_transactions_see_their_own_writes(self):
+        async with self.pool.transaction() as db:
+            await db.execute("INSERT INTO items (name) VALUES ('a')")
+            cursor = await db.execute("SELECT COUNT(*) FROM items")
+            self.assertEqual((await cursor.fetchone())[0], 1)
+
+    async def test_a_failed_commit_fails_every_member(self):
+        # Defer the foreign key check to COMMIT, so the group itself fails to commit
+        async with self.pool.writer() as db:
+            await db.execute("DROP TABLE items")
+            await db.execute(
+                """
+                CREATE TABLE items (
+                    id INTEGER PRIMARY KEY, name TEXT NOT NULL,
+                    parent INTEGER REFERENCES items (id) DEFERRABLE INITIALLY DEFERRED
+                )
+                """
+            )
+            await db.execute("PRAGMA foreign_keys = ON")
+            await db.commit()
+
+        async def orphan(name):
+            async with self.pool.transaction() as db:
+                await db.execute("INSERT INTO items (name, parent) VALUES (?, 99)", (name,))
+
+        results = await asyncio.gather(orphan("a"), orphan("b"), return_exceptions=True)
+        self.assertTrue(all(isinstance(result, sqlite3.IntegrityError) for result in results), results)
+        self.assertEqual(await self.names(), [])
+
+        # The writer keeps serving later transactions
+        await self.insert("c")
+        self.assertEqual(await self.names(), ["c"])
+
+    async def test_exclusive_writers_run_alone_and_leave_no_transaction_open(self):
+        async with self.pool.writer() as db:
+            await db.execute("BEGIN")
+            await db.execute("INSERT INTO items (name) VALUES ('uncommitted')")
+
+        await self.insert("a")
+        self.assertEqual(await self.names(), ["a"])
+
+    async def test_close_finishes_queued_transactions(self):
+        inserts = [asyncio.create_task(self.insert(f"item{index}")) for index in range(5)]
+        await asyncio.sleep(0)
+        await self.pool.close()
+        await asyncio.gather(*inserts)
+
+        with sqlite3.connect(self.pool.db_path) as db:
+            self.assertEqual(db.execute("SELECT COUNT(*) FROM items").fetchone()[0], 5)
+
+    async def test_cancelled_waiters_do_not_stall_the_writer(self):
+        async with self.pool.writer():
+            waiting = asyncio.create_task(self.insert("cancelled"))
+            await asyncio.sleep(0)
+            waiting.cancel()
+
+        await self.insert("a")
+        self.assertEqual(await self.names(), ["a"])
+
+if __name__ == "__main__":
+    unittest.main()
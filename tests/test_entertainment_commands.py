@@ -0,0 +1,140 @@
+"""
+Tainment+ Discord Bot - Entertainment Command Tests
+
+Invokes the joke and story commands as registered on a bot by
+entertainment.setup, against a content store built from content.json.
+"""
+
+import os
+import tempfile
+import unittest
+from types import SimpleNamespace
+from unittest import mock
+
+import discord
+from discord.ext import commands
+
+import catalog
+import config
+import content_store
+import entertainment
+import rotation
+
+class RecordingBackend:
+    """Storage backend stand-in recording feature usage, with nothing seen yet."""
+
+    name = "test"
+
+    def __init__(self):
+        self.features = []
+
+    async def log_feature_usage(self, user_id, feature):
+        self.features.append(feature)
+
+    async def get_all_content_seen(self, user_id, kind):
+        return {}
+
+    async def get_content_seen(self, user_id, kind, category):
+        return None
+
+    async def save_content_seen(self, entries):
+        pass
+
+def make_context(tier, invoked_with):
+    """A command context for a user of the given tier, recording what is sent."""
+    return SimpleNamespace(
+        author=SimpleNamespace(id=42, name="tester"),
+        prefix="t!",
+        invoked_with=invoked_with,
+        user_context={"tier": tier},
+        send=mock.AsyncMock()
+    )
+
+class EntertainmentCommandTests(unittest.IsolatedAsyncioTestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.workdir = tempfile.TemporaryDirectory()
+        cls.store = content_store.ContentStore(
+            os.path.join(cls.workdir.name, "content.db"), config.CONTENT_SOURCE_PATH
+        )
+        cls.store.open()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.store.close()
+        cls.workdir.cleanup()
+
+    async def asyncSetUp(self):
+        self.backend = RecordingBackend()
+        self.rotation = rotation.ContentRotation(100, 3600)
+
+        patches = [
+            mock.patch.object(entertainment.storage, "backend", self.backend),
+            mock.patch.object(content_store, "store", self.store),
+            mock.patch.object(entertainment, "JOKES", catalog.Catalog("joke", self.store)),
+            mock.patch.object(entertainment, "STORIES", catalog.Catalog("story", self.store)),
+            mock.patch.object(entertainment, "get_daily_joke", mock.AsyncMock(return_value="")),
+            mock.patch.object(rotation, "content_rotation", self.rotation)
+        ]
+        for patch in patches:
+            patch.start()
+            self.addCleanup(patch.stop)
+
+        self.bot = commands.Bot(command_prefix="t!", intents=discord.Intents.none(), help_command=None)
+        entertainment.setup(self.bot)
+
+    async def asyncTearDown(self):
+        await self.rotation.stop()
+
+    def sent_embed(self, ctx):
+        """The embed of the only message a command sent."""
+        ctx.send.assert_awaited_once()
+        return ctx.send.await_args.kwargs["embed"]
+
+    async def test_commands_are_registered(self):
+        for name in ("joke", "joke_categories", "daily_joke", "story", "story_genres", "story_continue", "game"):
+            self.assertIsInstance(self.bot.get_command(name), commands.Command, name)
+
+    async def test_joke_search(self):
+        ctx = make_context("Pro", "joke")
+        await self.bot.get_command("joke")(ctx, "search", terms="chicken")
+
+        embed = self.sent_embed(ctx)
+        self.assertEqual(embed.title, 'Jokes matching "chicken"')
+        self.assertTrue(embed.fields)
+        self.assertTrue(all("chicken" in field.value.lower() for field in embed.fields))
+        self.assertEqual(self.backend.features, ["joke_search"])
+
+    async def test_joke_search_without_terms(self):
+        ctx = make_context("Pro", "joke")
+        await self.bot.get_command("joke")(ctx, "search")
+
+        ctx.send.assert_awaited_once()
+        self.assertIn("t!joke search", ctx.send.await_args.args[0])
+
+    async def test_joke_from_category(self):
+        ctx = make_context("Basic", "joke")
+        await self.bot.get_command("joke")(ctx, "dad")
+
+        embed = self.sent_embed(ctx)
+        self.assertEqual(embed.title, "Tainment+ Joke - Dad Jokes")
+        self.assertEqual(self.backend.features, ["joke"])
+
+    async def test_story_search(self):
+        ctx = make_context("Pro", "story")
+        await self.bot.get_command("story")(ctx, "search", terms="quantum")
+
+        embed = self.sent_embed(ctx)
+        self.assertEqual(embed.title, 'Stories matching "quantum"')
+        self.assertTrue(embed.fields)
+        self.assertEqual(self.backend.features, ["story_search"])
+
+    async def test_story_search_only_covers_the_users_tier(self):
+        ctx = make_context("Basic", "story")
+        await self.bot.get_command("story")(ctx, "search", terms="quantum")
+
+        ctx.send.assert_awaited_once()
+        self.assertEqual(ctx.send.await_args.args[0], 'No results for "quantum" in your tier.')
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,141 @@
+"""
+Tainment+ Discord Bot - Schema Migration Tests
+
+Covers migrating a new database and upgrading one written by the original
+schema (text timestamps, duplicate active subscriptions, no derived tables).
+"""
+
+import calendar
+import unittest
+from datetime import datetime
+from unittest import mock
+
+import database
+import migrations
+from db_support import DatabaseTestCase
+
+LATEST_VERSION = migrations.MIGRATIONS[-1][0]
+
+# Leaderboard indexes on game_scores superseded by best_scores
+DROPPED_INDEXES = {"idx_game_scores_game_user_score", "idx_game_scores_game_score"}
+
+async def fetch_all(query, params=()):
+    async with database.pool.reader() as db:
+        cursor = await db.execute(query, params)
+        return [tuple(row) for row in await cursor.fetchall()]
+
+async def index_names():
+    return {name for (name,) in await fetch_all("SELECT name FROM sqlite_master WHERE type = 'index'")}
+
+class FreshDatabaseTests(DatabaseTestCase):
+    async def test_new_databases_get_every_migration(self):
+        versions = await fetch_all("SELECT version FROM schema_migrations ORDER BY version")
+        self.assertEqual([version for (version,) in versions], [entry[0] for entry in migrations.MIGRATIONS])
+
+        tables = {name for (name,) in await fetch_all("SELECT name FROM sqlite_master WHERE type = 'table'")}
+        for table in ("best_scores", "usage_daily", "maintenance_state", "subscription_daily_metrics",
+                      "subscription_tier_counts", "content_seen"):
+            self.assertIn(table, tables)
+
+        indexes = await index_names()
+        self.assertIn("idx_subscriptions_one_active", indexes)
+        self.assertFalse(indexes & DROPPED_INDEXES)
+
+    async def test_reopening_applies_nothing(self):
+        async with database.pool.writer() as db:
+            self.assertEqual(await migrations.apply_migrations(db), LATEST_VERSION)
+        self.assertEqual(len(await fetch_all("SELECT version FROM schema_migrations")), len(migrations.MIGRATIONS))
+
+    async def test_timestamp_columns_are_integers(self):
+        for table, column in (("subscriptions", "start_date"), ("story_progress", "last_read"),
+                              ("usage_stats", "used_at"), ("game_scores", "played_at")):
+            columns = {name: kind for _, name, kind, *_ in await fetch_all(f"PRAGMA table_info({table})")}
+            self.assertEqual(columns[column], "INTEGER", f"{table}.{column}")
+
+class UpgradeTests(DatabaseTestCase):
+    async def open_database(self):
+        # Create the original schema only, then fill it the way the old code did
+        with mock.patch.object(migrations, "MIGRATIONS", []):
+            await database.init_db()
+
+        async with database.pool.transaction() as db:
+            await db.executemany(
+                "INSERT INTO users (user_id, username) VALUES (?, ?)",
+                [(1, "ada"), (2, "bob"), (3, "cy")]
+            )
+            await db.executemany(
+                """
+                INSERT INTO subscriptions (user_id, tier, start_date, end_date, grace_period_end, active)
+                VALUES (?, ?, ?, ?, ?, TRUE)
+                """,
+                [
+                    (1, "Basic", "2024-01-01 00:00:00", None, None),
+                    (1, "Premium", "2024-02-01 00:00:00", "2030-01-01T12:00:00", "2030-01-04T12:00:00"),
+                    (2, "Pro", "2024-02-01 00:00:00", "2030-01-01T12:00:00", "2030-01-04T12:00:00"),
+                    (3, "Basic", "2024-02-01 00:00:00", None, None)
+                ]
+            )
+            await db.executemany(
+                "INSERT INTO subscription_history (user_id, previous_tier, new_tier, reason) VALUES (?, ?, ?, ?)",
+                [
+                    (1, "None", "Premium", None),
+                    (2, "Premium", "Pro", "Upgrade"),
+                    (3, "Pro", "Basic", "Subscription expired beyond grace period")
+                ]
+            )
+            await db.executemany(
+                "INSERT INTO game_scores (user_id, game_name, score) VALUES (?, ?, ?)",
+                [(1, "trivia", 10), (1, "trivia", 30), (2, "trivia", 20), (3, "trivia", 0)]
+            )
+            await db.execute(
+                "INSERT INTO story_progress (user_id, story_name, current_part, last_read) VALUES (1, 'dragon', 2, ?)",
+                ("2024-03-04 05:06:07",)
+            )
+            await db.execute(
+                "INSERT INTO usage_stats (user_id, feature, used_at) VALUES (1, 'joke', '2024-03-04 05:06:07')"
+            )
+
+        async with database.pool.writer() as db:
+            self.assertEqual(await migrations.apply_migrations(db), LATEST_VERSION)
+
+    async def test_timestamps_become_utc_epoch_seconds(self):
+        # CURRENT_TIMESTAMP text is UTC; isoformat() text was naive local time
+        start_date, end_date = (await fetch_all(
+            "SELECT start_date, end_date FROM subscriptions WHERE user_id = 2"
+        ))[0]
+        self.assertEqual(start_date, calendar.timegm((2024, 2, 1, 0, 0, 0)))
+        self.assertEqual(end_date, int(datetime(2030, 1, 1, 12).timestamp()))
+
+        progress = await database.get_story_progress(1, "dragon")
+        self.assertEqual(progress, {"current_part": 2, "last_read": calendar.timegm((2024, 3, 4, 5, 6, 7))})
+
+        (used_at,) = (await fetch_all("SELECT used_at FROM usage_stats"))[0]
+        self.assertEqual(used_at, calendar.timegm((2024, 3, 4, 5, 6, 7)))
+
+        kinds = await fetch_all("SELECT DISTINCT typeof(changed_at) FROM subscription_history")
+        self.assertEqual(kinds, [("integer",)])
+
+    async def test_duplicate_active_subscriptions_are_resolved(self):
+        active = await fetch_all("SELECT user_id, tier FROM subscriptions WHERE active = TRUE ORDER BY user_id")
+        self.assertEqual(active, [(1, "Premium"), (2, "Pro"), (3, "Basic")])
+        self.assertIn("idx_subscriptions_one_active", await index_names())
+
+    async def test_derived_tables_are_backfilled(self):
+        self.assertEqual(await database.get_leaderboard("trivia"), [(1, 30), (2, 20)])
+        self.assertEqual(await database.get_user_game_standing(3, "trivia"), (0, 0))
+
+        metrics = await database.get_subscription_metrics(days=30)
+        self.assertEqual(metrics["subscribers_by_tier"], {"Basic": 1, "Premium": 1, "Pro": 1})
+        self.assertEqual(
+            (metrics["new_subscribers"], metrics["upgrades"], metrics["expirations"]),
+            (1, 1, 1)
+        )
+
+    async def test_indexes_survive_table_rebuilds(self):
+        indexes = await index_names()
+        self.assertIn("idx_story_progress_user_story", indexes)
+        self.assertIn("idx_subscriptions_user_active", indexes)
+        self.assertFalse(indexes & DROPPED_INDEXES)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,116 @@
+"""
+Tainment+ Discord Bot - Data Retention Tests
+
+Covers which rows the retention policies remove, chunked removal, archiving
+and returning freed pages to the filesystem.
+"""
+
+import os
+import sqlite3
+import unittest
+from unittest import mock
+
+import config
+import database
+import retention
+from db_support import DatabaseTestCase
+
+DAY = database.SECONDS_PER_DAY
+
+class RetentionTests(DatabaseTestCase):
+    async def asyncSetUp(self):
+        await super().asyncSetUp()
+        for name, value in (
+            ("USAGE_RETENTION_DAYS", 90),
+            ("GAME_SCORE_RETENTION_DAYS", 180),
+            ("SUBSCRIPTION_RETENTION_DAYS", 365)
+        ):
+            patch = mock.patch.object(config, name, value)
+            patch.start()
+            self.addCleanup(patch.stop)
+
+        self.now = database.now_epoch()
+        async with database.pool.transaction() as db:
+            await db.executemany(
+                "INSERT INTO usage_stats (user_id, feature, used_at) VALUES (?, ?, ?)",
+                [(1, "joke", self.now - age * DAY) for age in (200, 150, 100, 10)]
+            )
+            await db.executemany(
+                "INSERT INTO game_scores (user_id, game_name, score, played_at) VALUES (?, ?, ?, ?)",
+                [(1, "trivia", age, self.now - age * DAY) for age in (400, 300, 200, 5)]
+            )
+            await db.executemany(
+                "INSERT INTO subscriptions (user_id, tier, start_date, active) VALUES (?, ?, ?, ?)",
+                [
+                    (1, "Pro", self.now - 500 * DAY, False),
+                    (1, "Premium", self.now - 30 * DAY, False),
+                    (1, "Basic", self.now - 600 * DAY, True)
+                ]
+            )
+
+    async def count(self, table, condition="TRUE"):
+        async with database.pool.reader() as db:
+            cursor = await db.execute(f"SELECT COUNT(*) FROM {table} WHERE {condition}")
+            return (await cursor.fetchone())[0]
+
+    async def test_old_rows_are_removed_in_chunks(self):
+        await database.rollup_usage_stats()
+        report = await retention.run_retention(chunk_size=1, archive_path="")
+
+        self.assertEqual(report["rows_removed"], {"usage_stats": 3, "game_scores": 3, "subscriptions": 1})
+        self.assertFalse(report["archived"])
+        self.assertEqual(await self.count("usage_stats"), 1)
+        self.assertEqual(await self.count("game_scores"), 1)
+        # Active subscriptions are kept however old they are
+        self.assertEqual(await self.count("subscriptions", "active = TRUE"), 1)
+        self.assertEqual(await self.count("subscriptions", "active = FALSE"), 1)
+
+        # Removed usage events stay counted in the daily rollup
+        stats = await database.get_feature_usage_stats("joke", days=365)
+        self.assertEqual(stats["count"], 4)
+
+    async def test_usage_events_wait_for_the_rollup(self):
+        report = await retention.run_retention(archive_path="")
+        self.assertEqual(report["rows_removed"]["usage_stats"], 0)
+
+        async with database.pool.transaction() as db:
+            await database._set_state(db, "usage_rolled_up_to", database.day_start(self.now - 120 * DAY))
+        report = await retention.run_retention(archive_path="")
+        self.assertEqual(report["rows_removed"]["usage_stats"], 2)
+
+    async def test_disabled_policies_keep_everything(self):
+        with mock.patch.object(config, "GAME_SCORE_RETENTION_DAYS", 0):
+            report = await retention.run_retention(archive_path="")
+        self.assertNotIn("game_scores", report["rows_removed"])
+        self.assertEqual(await self.count("game_scores"), 4)
+
+    async def test_removed_rows_are_archived(self):
+        archive_path = os.path.join(self.workdir.name, "archive.db")
+        await retention.run_retention(chunk_size=2, archive_path=archive_path)
+        await retention.run_retention(chunk_size=2, archive_path=archive_path)
+
+        with sqlite3.connect(archive_path) as archive:
+            scores = archive.execute("SELECT score FROM game_scores ORDER BY score").fetchall()
+            subscriptions = archive.execute("SELECT tier FROM subscriptions").fetchall()
+        self.assertEqual(scores, [(200,), (300,), (400,)])
+        self.assertEqual(subscriptions, [("Pro",)])
+
+        # The archive is detached again afterwards
+        async with database.pool.writer() as db:
+            cursor = await db.execute("PRAGMA database_list")
+            self.assertNotIn("archive", [row[1] for row in await cursor.fetchall()])
+
+    async def test_freed_pages_are_released(self):
+        async with database.pool.transaction() as db:
+            await db.executemany(
+                "INSERT INTO game_scores (user_id, game_name, score, played_at) VALUES (?, ?, ?, ?)",
+                [(user_id, "x" * 200, 1, self.now - 400 * DAY) for user_id in range(5000)]
+            )
+
+        report = await retention.run_retention(chunk_size=1000, archive_path="")
+        self.assertEqual(report["rows_removed"]["game_scores"], 5003)
+        self.assertGreater(report["bytes_reclaimed"], 0)
+        self.assertEqual(await retention._get_pragma("freelist_count"), 0)
+
+if __name__ == "__main__":
+    unittest.main()
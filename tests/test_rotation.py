@@ -0,0 +1,194 @@
+"""
+Tainment+ Discord Bot - Content Rotation Tests
+
+Covers the SeenBag bitset and how ContentRotation loads, falls back on and
+saves users' bags, with storage replaced by an in-memory stand-in.
+"""
+
+import asyncio
+import random
+import unittest
+from unittest import mock
+
+import rotation
+from rotation import ContentRotation, SeenBag
+
+class SeenBagTests(unittest.TestCase):
+    def test_round_trips_through_bytes(self):
+        bag = SeenBag()
+        for index in (0, 3, 9, 17):
+            bag.mark(index)
+
+        loaded = SeenBag(bytes(bag.bits))
+        self.assertEqual(loaded.seen, 4)
+        self.assertEqual(loaded.end, 18)
+        self.assertTrue(all(loaded.is_seen(index) for index in (0, 3, 9, 17)))
+        self.assertFalse(loaded.is_seen(1))
+        self.assertFalse(loaded.is_seen(500))
+
+    def test_marking_twice_counts_once(self):
+        bag = SeenBag()
+        bag.mark(5)
+        bag.mark(5)
+        self.assertEqual(bag.seen, 1)
+
+    def test_unseen_ignores_items_beyond_size(self):
+        bag = SeenBag()
+        for index in (1, 2, 10, 20):
+            bag.mark(index)
+
+        self.assertEqual(bag.unseen(30), 26)
+        # Items seen on a higher tier (10 and 20) don't count against a smaller view
+        self.assertEqual(bag.unseen(10), 8)
+        self.assertEqual(bag.unseen(3), 1)
+
+    def test_draw_covers_every_item_before_repeating(self):
+        random.seed(1234)
+        bag = SeenBag()
+        size = 37
+
+        first_round = [bag.draw(size) for _ in range(size)]
+        self.assertEqual(sorted(first_round), list(range(size)))
+        self.assertEqual(bag.unseen(size), 0)
+
+        # The next draw starts the rotation over
+        bag.draw(size)
+        self.assertEqual(bag.seen, 1)
+
+    def test_draw_finds_the_last_unseen_item(self):
+        bag = SeenBag()
+        for index in range(100):
+            if index != 63:
+                bag.mark(index)
+
+        self.assertEqual(bag.draw(100), 63)
+
+class MemoryBackend:
+    """Storage stand-in keeping seen bitsets in a dict, optionally failing reads."""
+
+    name = "test"
+
+    def __init__(self):
+        self.seen = {}
+        self.fail_reads = False
+        self.saves = []
+
+    async def get_content_seen(self, user_id, kind, category):
+        if self.fail_reads:
+            raise ConnectionError("storage unavailable")
+        return self.seen.get((user_id, kind, category))
+
+    async def get_all_content_seen(self, user_id, kind):
+        if self.fail_reads:
+            raise ConnectionError("storage unavailable")
+        return {
+            category: bits for (stored_user, stored_kind, category), bits in self.seen.items()
+            if stored_user == user_id and stored_kind == kind
+        }
+
+    async def save_content_seen(self, entries):
+        self.saves.append(entries)
+        for user_id, kind, category, bits in entries:
+            self.seen[(user_id, kind, category)] = bits
+
+class FakeView:
+    def __init__(self, counts):
+        self.counts = counts
+        self.categories = tuple(counts)
+
+class FakeCatalog:
+    """Catalog stand-in whose items are (category, index) pairs."""
+
+    kind = "joke"
+
+    def __init__(self, counts):
+        self.view = FakeView(counts)
+
+    def tier(self, tier):
+        return self.view
+
+    def item(self, category, index):
+        return category, index
+
+    def choice(self, tier, category=None):
+        if category not in self.view.counts:
+            category = random.choice(self.view.categories)
+        return category, self.item(category, random.randrange(self.view.counts[category]))
+
+class ContentRotationTests(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.backend = MemoryBackend()
+        patch = mock.patch.object(rotation.storage, "backend", self.backend)
+        patch.start()
+        self.addCleanup(patch.stop)
+
+        self.rotation = ContentRotation(max_entries=100, flush_interval=3600)
+        self.catalog = FakeCatalog({"dad": 4, "pun": 3})
+
+    async def asyncTearDown(self):
+        await self.rotation.stop()
+
+    async def test_no_repeats_until_everything_is_seen(self):
+        picks = [await self.rotation.pick(1, self.catalog, "Basic") for _ in range(7)]
+        self.assertEqual(len(set(picks)), 7)
+
+    async def test_seen_items_survive_a_restart(self):
+        first = [await self.rotation.pick(1, self.catalog, "Basic", "dad") for _ in range(2)]
+        await self.rotation.stop()
+
+        restarted = ContentRotation(max_entries=100, flush_interval=3600)
+        rest = [await restarted.pick(1, self.catalog, "Basic", "dad") for _ in range(2)]
+        await restarted.stop()
+
+        self.assertEqual(sorted(first + rest), [("dad", ("dad", index)) for index in range(4)])
+
+    async def test_load_failure_keeps_stored_history(self):
+        self.backend.seen[(1, "joke", "dad")] = b"\x07"
+        self.backend.fail_reads = True
+
+        category, item = await self.rotation.pick(1, self.catalog, "Basic", "dad")
+        self.assertEqual(category, "dad")
+        category, item = await self.rotation.pick(1, self.catalog, "Basic")
+        self.assertIsNotNone(item)
+
+        await self.rotation.flush()
+        self.assertEqual(self.backend.saves, [])
+        self.assertEqual(self.backend.seen[(1, "joke", "dad")], b"\x07")
+
+        # Once storage is back, the rotation continues from the stored history
+        self.backend.fail_reads = False
+        self.assertEqual(await self.rotation.pick(1, self.catalog, "Basic", "dad"), ("dad", ("dad", 3)))
+
+    async def test_bitset_evicted_during_a_load_wins_over_storage(self):
+        self.backend.seen[(1, "joke", "dad")] = b"\x01"
+        load = self.backend.get_content_seen
+
+        async def slow_load(*args):
+            bits = await load(*args)
+            # The bag was evicted with newer changes while the read was in flight
+            self.rotation._pending[(1, "joke", "dad")] = b"\x07"
+            return bits
+
+        with mock.patch.object(self.backend, "get_content_seen", slow_load):
+            self.assertEqual(await self.rotation.pick(1, self.catalog, "Basic", "dad"), ("dad", ("dad", 3)))
+
+    async def test_stop_waits_for_an_in_flight_flush(self):
+        saved = asyncio.Event()
+        save = self.backend.save_content_seen
+
+        async def slow_save(entries):
+            await asyncio.sleep(0.05)
+            await save(entries)
+            saved.set()
+
+        rotation_ = ContentRotation(max_entries=100, flush_interval=0.01)
+        with mock.patch.object(self.backend, "save_content_seen", slow_save):
+            await rotation_.pick(1, self.catalog, "Basic", "dad")
+            await asyncio.sleep(0.02)
+            await rotation_.stop()
+
+        self.assertTrue(saved.is_set())
+        self.assertIn((1, "joke", "dad"), self.backend.seen)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,76 @@
+"""
+Tainment+ Discord Bot - Subscriber Paging Tests
+
+Covers keyset pagination of the subscriber list in both directions,
+including rows sharing a start date.
+"""
+
+import unittest
+
+import database
+from db_support import DatabaseTestCase
+
+def page_key(row):
+    return row["start_date"], row["id"]
+
+class SubscriberPageTests(DatabaseTestCase):
+    async def asyncSetUp(self):
+        await super().asyncSetUp()
+        for user_id in range(1, 26):
+            await database.add_user(user_id, f"user{user_id}")
+            if user_id % 5 == 0:
+                await database.change_subscription(user_id, "Pro", duration_days=30)
+
+        # Several subscribers share each start date, so pages split ties by ID
+        async with database.pool.transaction() as db:
+            await db.execute("UPDATE subscriptions SET start_date = 1700000000 + (user_id % 4) * 60")
+
+    async def walk_forward(self, tier=None, limit=10):
+        pages = []
+        after = None
+        while True:
+            rows, has_more = await database.get_subscribers_page(tier=tier, after=after, limit=limit)
+            pages.append([row["user_id"] for row in rows])
+            if not has_more:
+                return pages
+            after = page_key(rows[-1])
+
+    async def test_pages_cover_every_subscriber_once_in_order(self):
+        pages = await self.walk_forward()
+        expected = [row["user_id"] for row in await database.get_all_subscribers()]
+
+        self.assertEqual([len(page) for page in pages], [10, 10, 5])
+        self.assertEqual([user_id for page in pages for user_id in page], expected)
+
+    async def test_paging_back_returns_the_previous_page(self):
+        first, has_more = await database.get_subscribers_page(limit=10)
+        second, _ = await database.get_subscribers_page(after=page_key(first[-1]), limit=10)
+        self.assertTrue(has_more)
+
+        previous, has_more = await database.get_subscribers_page(before=page_key(second[0]), limit=10)
+        self.assertEqual(previous, first)
+        # Nothing precedes the first page
+        self.assertFalse(has_more)
+
+    async def test_tier_filter_applies_to_every_page(self):
+        pages = await self.walk_forward(tier="Pro", limit=2)
+        self.assertEqual(sorted(user_id for page in pages for user_id in page), [5, 10, 15, 20, 25])
+        self.assertEqual([len(page) for page in pages], [2, 2, 1])
+
+    async def test_exact_multiple_reports_no_further_page(self):
+        rows, has_more = await database.get_subscribers_page(limit=25)
+        self.assertEqual(len(rows), 25)
+        self.assertFalse(has_more)
+
+    async def test_pages_are_read_in_index_order(self):
+        query, params = database._subscriber_query("s.*, u.username", None, True)
+        query += " AND (s.start_date, s.id) < (?, ?) ORDER BY s.start_date DESC, s.id DESC LIMIT ?"
+
+        async with database.pool.reader() as db:
+            cursor = await db.execute(f"EXPLAIN QUERY PLAN {query}", params + [1700000120, 10, 11])
+            plan = " ".join(row["detail"] for row in await cursor.fetchall())
+        self.assertIn("idx_subscriptions_active_start", plan)
+        self.assertNotIn("TEMP B-TREE", plan)
+
+if __name__ == "__main__":
+    unittest.main()
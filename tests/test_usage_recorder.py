@@ -0,0 +1,110 @@
+"""
+Tainment+ Discord Bot - Usage Recorder Tests
+
+Covers batching, in-place flushes and the shutdown flush of the buffered
+usage recorder, with writes captured in memory.
+"""
+
+import asyncio
+import unittest
+
+from usage_recorder import UsageRecorder
+
+class BatchLog:
+    """write_batch stand-in recording every batch, optionally slowly."""
+
+    def __init__(self, delay=0):
+        self.delay = delay
+        self.batches = []
+
+    async def __call__(self, batch):
+        if self.delay:
+            await asyncio.sleep(self.delay)
+        self.batches.append(list(batch))
+
+    @property
+    def features(self):
+        return sorted(feature for batch in self.batches for _, feature, _ in batch)
+
+class UsageRecorderTests(unittest.IsolatedAsyncioTestCase):
+    async def test_full_batches_are_written_without_waiting(self):
+        log = BatchLog()
+        recorder = UsageRecorder(log, flush_interval_ms=60000, batch_size=3)
+
+        for index in range(6):
+            await recorder.record(1, f"f{index}")
+        for _ in range(5):
+            await asyncio.sleep(0)
+
+        self.assertEqual([len(batch) for batch in log.batches], [3, 3])
+        await recorder.stop()
+
+    async def test_flush_writes_in_place_and_keeps_recording(self):
+        log = BatchLog()
+        recorder = UsageRecorder(log, flush_interval_ms=60000, batch_size=100)
+
+        for index in range(5):
+            await recorder.record(1, f"f{index}")
+        task = recorder._task
+        await recorder.flush()
+
+        self.assertEqual(log.features, [f"f{index}" for index in range(5)])
+        self.assertEqual(len(log.batches), 1)
+        self.assertIs(recorder._task, task)
+        self.assertFalse(task.done())
+
+        await recorder.record(2, "after")
+        await recorder.stop()
+        self.assertIn("after", log.features)
+
+    async def test_records_during_a_flush_stay_batched(self):
+        log = BatchLog(delay=0.02)
+        recorder = UsageRecorder(log, flush_interval_ms=60000, batch_size=100)
+
+        await recorder.record(1, "before")
+        flush = asyncio.create_task(recorder.flush())
+        await asyncio.sleep(0)
+        for index in range(10):
+            await recorder.record(1, f"during{index}")
+        await flush
+        await recorder.stop()
+
+        # Nothing was written through one event at a time
+        self.assertEqual(len(log.features), 11)
+        self.assertLessEqual(len(log.batches), 3)
+
+    async def test_stop_writes_events_blocked_on_a_full_queue(self):
+        log = BatchLog(delay=0.01)
+        recorder = UsageRecorder(log, flush_interval_ms=60000, batch_size=2, max_queue=2)
+
+        records = [asyncio.create_task(recorder.record(1, f"f{index:02}")) for index in range(20)]
+        await asyncio.sleep(0)
+        await recorder.stop()
+        await asyncio.gather(*records)
+
+        self.assertEqual(log.features, [f"f{index:02}" for index in range(20)])
+        self.assertEqual(recorder.pending, 0)
+
+    async def test_records_after_stop_are_written_through(self):
+        log = BatchLog()
+        recorder = UsageRecorder(log, flush_interval_ms=60000)
+
+        await recorder.record(1, "first")
+        await recorder.stop()
+        await recorder.record(1, "late")
+
+        self.assertEqual(log.features, ["first", "late"])
+
+    async def test_failed_writes_are_counted_not_raised(self):
+        async def failing(batch):
+            raise RuntimeError("database is locked")
+
+        recorder = UsageRecorder(failing, flush_interval_ms=60000)
+        await recorder.record(1, "lost")
+        await recorder.flush()
+
+        self.assertEqual(recorder.events_failed, 1)
+        await recorder.stop()
+
+if __name__ == "__main__":
+    unittest.main()
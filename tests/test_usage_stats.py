@@ -0,0 +1,104 @@
+"""
+Tainment+ Discord Bot - Usage Statistics Tests
+
+Covers the unique-user sketch and feature usage stats read from daily
+rollups merged with not yet rolled-up events.
+"""
+
+import random
+import unittest
+from unittest import mock
+
+import config
+import database
+from db_support import DatabaseTestCase
+from sketch import REGISTERS, UserSketch
+
+DAY = database.SECONDS_PER_DAY
+
+class UserSketchTests(unittest.TestCase):
+    def test_small_sets_count_exactly(self):
+        sketch = UserSketch()
+        self.assertEqual(sketch.count(), 0)
+        for user_id in (1, 2, 3, 2, 1):
+            sketch.add(user_id)
+        self.assertEqual(sketch.count(), 3)
+
+    def test_large_sets_are_close(self):
+        sketch = UserSketch()
+        for user_id in random.Random(7).sample(range(10 ** 12), 50000):
+            sketch.add(user_id)
+        self.assertAlmostEqual(sketch.count(), 50000, delta=50000 * 0.05)
+
+    def test_merge_is_the_union(self):
+        first, second, both = UserSketch(), UserSketch(), UserSketch()
+        for user_id in range(0, 3000):
+            first.add(user_id)
+            both.add(user_id)
+        for user_id in range(2000, 6000):
+            second.add(user_id)
+            both.add(user_id)
+
+        first.update(second)
+        self.assertEqual(first.to_bytes(), both.to_bytes())
+        self.assertEqual(first.registers, bytearray(map(max, first.registers, second.registers)))
+
+    def test_serializes_to_a_fixed_size(self):
+        sketch = UserSketch()
+        sketch.add(42)
+        self.assertEqual(len(sketch.to_bytes()), REGISTERS)
+        self.assertEqual(UserSketch(sketch.to_bytes()).count(), 1)
+        with self.assertRaises(ValueError):
+            UserSketch(b"\x00" * 10)
+
+class FeatureUsageStatsTests(DatabaseTestCase):
+    async def insert_events(self, events):
+        async with database.pool.transaction() as db:
+            await db.executemany(
+                "INSERT INTO usage_stats (user_id, feature, used_at) VALUES (?, ?, ?)",
+                events
+            )
+
+    async def test_unique_users_span_rolled_up_days_and_recent_events(self):
+        today = database.day_start(database.now_epoch())
+        await self.insert_events([
+            (1, "joke", today - 40 * DAY + 10),
+            (1, "joke", today - 3 * DAY + 10),
+            (2, "joke", today - 3 * DAY + 20),
+            (2, "story", today - 2 * DAY + 10),
+            (3, "joke", today - 2 * DAY + 30)
+        ])
+        self.assertEqual(await database.rollup_usage_stats(), 40)
+
+        # Not rolled up yet: today's events come from usage_stats
+        await self.insert_events([(1, "joke", today + 5), (4, "joke", today + 6)])
+
+        stats = await database.get_feature_usage_stats(days=60)
+        self.assertEqual(stats, {
+            "joke": {"count": 6, "unique_users": 4},
+            "story": {"count": 1, "unique_users": 1}
+        })
+
+        recent = await database.get_feature_usage_stats("joke", days=7)
+        self.assertEqual(recent, {"feature": "joke", "count": 5, "unique_users": 4})
+
+    async def test_rollup_stores_one_row_per_feature_and_day(self):
+        today = database.day_start(database.now_epoch())
+        await self.insert_events([(user_id, "joke", today - DAY + user_id) for user_id in range(50)])
+        await database.rollup_usage_stats()
+
+        async with database.pool.reader() as db:
+            cursor = await db.execute("SELECT day, count, unique_users, length(users_sketch) AS size FROM usage_daily")
+            rows = [tuple(row) for row in await cursor.fetchall()]
+        self.assertEqual(rows, [(today - DAY, 50, 50, REGISTERS)])
+
+    async def test_rollup_waits_for_the_delay_after_midnight(self):
+        today = database.day_start(database.now_epoch())
+        await self.insert_events([(1, "joke", today - DAY + 5)])
+
+        with mock.patch.object(config, "USAGE_ROLLUP_DELAY", database.now_epoch() - today + 60):
+            self.assertEqual(await database.rollup_usage_stats(), 0)
+        self.assertEqual(await database.rollup_usage_stats(), 1)
+
+if __name__ == "__main__":
+    unittest.main()
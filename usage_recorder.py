@@ -0,0 +1,180 @@
+"""
+Tainment+ Discord Bot - Buffered Usage Recorder
+
+This module buffers feature usage events in memory and writes them to the
+database in batches, so commands never wait on an analytics insert.
+"""
+
+import asyncio
+import logging
+import time
+
+logger = logging.getLogger("tainment_bot.usage_recorder")
+
+class UsageRecorder:
+    """Queues usage events and flushes them with one batched write."""
+
+    def __init__(self, write_batch, flush_interval_ms=1000, batch_size=200, max_queue=10000):
+        """
+        Create a usage recorder.
+
+        Args:
+            write_batch: Async callable taking a list of (user_id, feature, used_at) tuples,
+                with used_at in UTC epoch seconds
+            flush_interval_ms: Maximum time an event waits in memory before being written
+            batch_size: Number of queued events that triggers an immediate flush
+            max_queue: Maximum number of buffered events before record() blocks
+        """
+        self.write_batch = write_batch
+        self.flush_interval = flush_interval_ms / 1000
+        self.batch_size = max(1, batch_size)
+        self.max_queue = max(self.batch_size, max_queue)
+
+        self._queue = None
+        self._batch_ready = None
+        self._task = None
+        self._stopped = False
+
+        self.events_written = 0
+        self.batches_written = 0
+        self.events_failed = 0
+
+    @property
+    def pending(self):
+        """Number of events waiting to be written."""
+        return self._queue.qsize() if self._queue else 0
+
+    def start(self):
+        """Start the background flush loop. Safe to call more than once."""
+        if self._task is not None and not self._task.done():
+            return
+
+        self._queue = asyncio.Queue(maxsize=self.max_queue)
+        self._batch_ready = asyncio.Event()
+        self._stopped = False
+        self._task = asyncio.create_task(self._run())
+        logger.info("Usage recorder started")
+
+    async def stop(self):
+        """Flush every buffered event and stop the flush loop."""
+        if self._task is None:
+            return
+
+        # From here on record() writes through; the loop exits once the queue is empty
+        self._stopped = True
+        await self.flush()
+        await self._task
+        self._task = None
+
+        # Events that got into the queue after the loop's last look at it
+        remaining = self._take_queued()
+        if remaining:
+            await self._write(remaining)
+        logger.info(f"Usage recorder stopped ({self.events_written} events written)")
+
+    async def flush(self):
+        """Write every event recorded so far, without stopping the flush loop."""
+        if self._task is None or self._task.done():
+            return
+
+        # The loop writes everything queued ahead of this marker, then resolves it
+        written = asyncio.get_running_loop().create_future()
+        await self._queue.put(written)
+        self._batch_ready.set()
+        await written
+
+    async def record(self, user_id, feature):
+        """
+        Queue a usage event.
+
+        Blocks only when the buffer is full, until the flush loop catches up.
+        """
+        event = (user_id, feature, int(time.time()))
+
+        if self._stopped:
+            # Shutting down: write through so the event isn't lost
+            await self._write([event])
+            return
+
+        if self._task is None:
+            self.start()
+
+        await self._queue.put(event)
+        if self._stopped and (self._task is None or self._task.done()):
+            # Stopped while waiting for room in the queue: nothing reads it any more
+            remaining = self._take_queued()
+            if remaining:
+                await self._write(remaining)
+        elif self._queue.qsize() >= self.batch_size:
+            self._batch_ready.set()
+
+    def _take_queued(self):
+        """Remove and return every event left in the queue."""
+        events = []
+        while not self._queue.empty():
+            event = self._queue.get_nowait()
+            if isinstance(event, asyncio.Future):
+                event.set_result(None)
+            else:
+                events.append(event)
+        return events
+
+    def _drain(self, batch, flushes):
+        """
+        Move queued events into the batch, up to the batch size or a flush marker.
+
+        Returns:
+            bool: Whether the batch should be written now
+        """
+        while len(batch) < self.batch_size:
+            try:
+                event = self._queue.get_nowait()
+            except asyncio.QueueEmpty:
+                return False
+            if isinstance(event, asyncio.Future):
+                flushes.append(event)
+                return True
+            batch.append(event)
+        return True
+
+    async def _run(self):
+        """Flush loop: write a batch when it is full, flushed or the flush interval has passed."""
+        loop = asyncio.get_running_loop()
+        while True:
+            event = await self._queue.get()
+            batch, flushes = [], []
+            if isinstance(event, asyncio.Future):
+                flushes.append(event)
+            else:
+                batch.append(event)
+                deadline = loop.time() + self.flush_interval
+
+                while True:
+                    self._batch_ready.clear()
+                    ready = self._drain(batch, flushes)
+                    timeout = deadline - loop.time()
+                    if ready or timeout <= 0:
+                        break
+                    try:
+                        await asyncio.wait_for(self._batch_ready.wait(), timeout)
+                    except asyncio.TimeoutError:
+                        pass
+
+            if batch:
+                await self._write(batch)
+            for written in flushes:
+                if not written.done():
+                    written.set_result(None)
+
+            if self._stopped and self._queue.empty():
+                break
+
+    async def _write(self, batch):
+        """Write a batch of events, logging (not raising) on failure."""
+        try:
+            await self.write_batch(batch)
+            self.events_written += len(batch)
+            self.batches_written += 1
+        except Exception as e:
+            self.events_failed += len(batch)
+            logger.error(f"Error writing {len(batch)} usage events: {e}")
@@ -12,6 +12,8 @@ import os
 from discord.ext import commands
 
 import config
+import database
+import storage
 
 logger = logging.getLogger("tainment_bot.utils")
 
@@ -107,6 +109,19 @@ async def privacy(ctx):
         logger.error(f"Error displaying Privacy Policy: {e}")
         await ctx.send("An error occurred while retrieving the Privacy Policy. Please try again later.")
 
+async def get_user_context(ctx):
+    """
+    Get the invoking user's context (tier and subscription) for a command.
+    
+    The before_invoke hook resolves this once per command; commands invoked
+    outside the hook resolve it here instead.
+    """
+    user_context = getattr(ctx, "user_context", None)
+    if user_context is None:
+        user_context = await storage.backend.resolve_user_context(ctx.author.id, ctx.author.name)
+        ctx.user_context = user_context
+    return user_context
+
 def format_time(seconds):
     """Format seconds into a human-readable time string."""
     minutes, seconds = divmod(seconds, 60)
@@ -125,6 +140,12 @@ def format_time(seconds):
     
     return ", ".join(time_parts)
 
+def format_timestamp(timestamp, fmt="%Y-%m-%d %H:%M:%S"):
+    """Format a stored epoch timestamp as local time ("Never" if unset)."""
+    if timestamp is None:
+        return "Never"
+    return database.from_epoch(timestamp).strftime(fmt)
+
 def create_progress_bar(current, total, length=10):
     """Create a text-based progress bar."""
     filled_length = int(length * current / total)